@@ -1,7 +1,27 @@
 from django.contrib import admin
 
-from social_media.models import Post, Comment
+from social_media.models import Post, Comment, Like, ScheduledPost
+
+
+class LikeInline(admin.TabularInline):
+    """
+    Likes of the post. Rows are only added or deleted, so likes_count is
+    kept by the Like signals.
+    """
+
+    model = Like
+    extra = 0
+    raw_id_fields = ("user",)
+    readonly_fields = ("created_at",)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Post)
+class PostAdmin(admin.ModelAdmin):
+    inlines = (LikeInline,)
 
 
-admin.site.register(Post)
 admin.site.register(Comment)
+admin.site.register(ScheduledPost)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class SocialMediaConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "social_media"
+
+    def ready(self):
+        from social_media import profile_cache, signals  # noqa: F401
+        from social_media_api import settings
+
+        if settings.CONDITIONAL_GET:
+            profile_cache.check_shared_cache()
@@ -0,0 +1,138 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+from social_media.serializers import ImageVariantsField, variant_urls
+
+# plain DRF fields whose to_representation needs no serializer context
+SCALAR_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.DateTimeField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+# model properties read by serializers: (columns, row -> value)
+PROPERTIES = {
+    "full_name": (
+        ("first_name", "last_name"),
+        lambda row: f"{row['first_name']} {row['last_name']}".strip(),
+    ),
+}
+
+
+class Unsupported(Exception):
+    pass
+
+
+class RowConverter:
+    """
+    Serializes .values() rows exactly like serializer_class(many=True).data,
+    without serializer & model instances. Slugs of related objects
+    (ex. emails of post authors) are fetched with one query per relation.
+    """
+
+    def __init__(self, serializer_class, field_names: frozenset):
+        self.model = serializer_class.Meta.model
+        self.columns = []
+        self.slugs = []
+        self.converters = []
+        for name, field in serializer_class().fields.items():
+            if name in field_names:
+                self.converters.append((name, self.compile(field)))
+
+    def column(self, name: str) -> str:
+        if name not in self.columns:
+            self.columns.append(name)
+        return name
+
+    def model_field(self, source: str):
+        try:
+            return self.model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return None
+
+    def compile(self, field):
+        source = field.source
+        model_field = self.model_field(source)
+
+        if isinstance(field, serializers.SlugRelatedField):
+            if model_field is None or not model_field.many_to_one:
+                raise Unsupported(source)
+            column = self.column(model_field.attname)
+            self.slugs.append((column, model_field.related_model, field.slug_field))
+            return lambda row, slugs, request: (
+                None if row[column] is None else slugs[column][row[column]]
+            )
+
+        if isinstance(field, serializers.FileField):
+            if model_field is None:
+                raise Unsupported(source)
+            column = self.column(source)
+            storage = model_field.storage
+            use_url = getattr(field, "use_url", True)
+
+            def file_url(row, slugs, request):
+                if not row[column]:
+                    return None
+                if not use_url:
+                    return row[column]
+                url = storage.url(row[column])
+                return request.build_absolute_uri(url) if request else url
+
+            return file_url
+
+        if isinstance(field, ImageVariantsField):
+            column = self.column(source)
+            return lambda row, slugs, request: variant_urls(row[column], request)
+
+        if model_field is None and source in PROPERTIES:
+            columns, read = PROPERTIES[source]
+            for column in columns:
+                self.column(column)
+            return lambda row, slugs, request: read(row)
+
+        if isinstance(field, SCALAR_FIELDS) and "." not in source:
+            column = self.column(source)
+            represent = field.to_representation
+            return lambda row, slugs, request: (
+                None if row[column] is None else represent(row[column])
+            )
+
+        raise Unsupported(source)
+
+    def supports(self, queryset) -> bool:
+        """All columns are model fields or annotations of queryset"""
+        annotations = queryset.query.annotations
+        return all(
+            column in annotations or self.model_field(column) is not None
+            for column in self.columns
+        )
+
+    def values(self, queryset, *extra_columns):
+        columns = list(self.columns)
+        columns += [column for column in extra_columns if column not in columns]
+        return queryset.values(*columns)
+
+    def serialize(self, rows, request) -> list:
+        slugs = {}
+        for column, model, slug_field in self.slugs:
+            ids = {row[column] for row in rows} - {None}
+            slugs[column] = dict(
+                model._base_manager.filter(pk__in=ids).values_list("pk", slug_field)
+            )
+        return [
+            {name: convert(row, slugs, request) for name, convert in self.converters}
+            for row in rows
+        ]
+
+
+@lru_cache(maxsize=None)
+def row_converter(serializer_class, field_names: frozenset):
+    """Compiled converter of serializer fields or None if not supported"""
+    try:
+        return RowConverter(serializer_class, field_names)
+    except Unsupported:
+        return None
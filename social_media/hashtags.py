@@ -0,0 +1,52 @@
+import re
+
+from social_media.models import PostTag, Tag
+
+HASHTAG_PATTERN = re.compile(r"#(\w{1,100})")
+
+
+def normalize_hashtag(tag: str) -> str:
+    return tag.strip().lstrip("#").lower()
+
+
+def extract_hashtags(content: str) -> set:
+    return {normalize_hashtag(tag) for tag in HASHTAG_PATTERN.findall(content)}
+
+
+def sync_hashtags(posts) -> int:
+    """Store hashtags found in content of posts in the Tag / PostTag index"""
+    post_tags = {post.pk: extract_hashtags(post.content) for post in posts}
+
+    existing = PostTag.objects.filter(post__in=post_tags.keys()).values_list(
+        "id", "post_id", "tag__name"
+    )
+    stale, linked = [], set()
+    for link_id, post_id, name in existing:
+        if name in post_tags[post_id]:
+            linked.add((post_id, name))
+        else:
+            stale.append(link_id)
+    if stale:
+        PostTag.objects.filter(id__in=stale).delete()
+
+    missing = {
+        (post.pk, name, post.created_at)
+        for post in posts
+        for name in post_tags[post.pk]
+        if (post.pk, name) not in linked
+    }
+    if not missing:
+        return 0
+
+    names = {name for __, name, __ in missing}
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list("name", "id"))
+    PostTag.objects.bulk_create(
+        [
+            PostTag(post_id=post_id, tag_id=tag_ids[name], created_at=created_at)
+            for post_id, name, created_at in missing
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    return len(missing)
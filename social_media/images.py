@@ -0,0 +1,66 @@
+import io
+import pathlib
+
+from PIL import Image, ImageOps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from social_media_api import settings
+
+
+def variant_name(name: str, variant: str, extension: str) -> str:
+    path = pathlib.PurePosixPath(name)
+    return str(path.parent / "variants" / f"{path.stem}-{variant}.{extension}")
+
+
+def avif_supported() -> bool:
+    Image.init()
+    return "AVIF" in Image.SAVE
+
+
+def encode(image: Image.Image, image_format: str) -> ContentFile:
+    # no exif / xmp passed to save: metadata is stripped
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=settings.IMAGE_VARIANT_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def render_variants(name: str) -> dict:
+    """
+    Save size variants of stored image as WebP (+ AVIF of the largest one
+    when Pillow supports it). Returns {variant: storage name}.
+    """
+    sizes = settings.IMAGE_VARIANT_SIZES
+    largest = max(sizes, key=sizes.get)
+
+    with default_storage.open(name) as file, Image.open(file) as original:
+        # JPEG is decoded at the smallest scale covering the largest variant
+        original.draft("RGB", (sizes[largest], sizes[largest]))
+        image = ImageOps.exif_transpose(original)
+        transparent = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if transparent else "RGB")
+
+    variants = {}
+    for variant, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size))
+        target = variant_name(name, variant, "webp")
+        default_storage.delete(target)
+        variants[variant] = default_storage.save(target, encode(image, "WEBP"))
+        if variant == largest and avif_supported():
+            target = variant_name(name, "avif", "avif")
+            default_storage.delete(target)
+            variants["avif"] = default_storage.save(target, encode(image, "AVIF"))
+    return variants
+
+
+def delete_variants(variants: dict, keep: dict = None) -> None:
+    """
+    Drop stored variants not in keep. Content-addressed blobs are
+    released once per variant: equal variants share a counted blob.
+    """
+    if getattr(default_storage, "content_addressed", False):
+        names = list(variants.values())
+    else:
+        names = set(variants.values()) - set((keep or {}).values())
+    for name in names:
+        default_storage.delete(name)
@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from social_media.hashtags import sync_hashtags
+from social_media.models import Post
+
+
+class Command(BaseCommand):
+    """Django command to index hashtags of existing posts"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.order_by("id").only("id", "content", "created_at")
+
+        last_id, linked = 0, 0
+        while True:
+            batch = list(posts.filter(id__gt=last_id)[: options["batch_size"]])
+            if not batch:
+                break
+            linked += sync_hashtags(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"Posts up to #{last_id} processed")
+
+        self.stdout.write(self.style.SUCCESS(f"Hashtags indexed: {linked} links"))
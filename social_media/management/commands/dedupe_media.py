@@ -0,0 +1,74 @@
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import BaseCommand, CommandError
+
+from social_media.storage import MEDIA_FIELDS
+
+
+class Command(BaseCommand):
+    """Django command to move existing media files into content-addressed blobs"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--keep-files",
+            action="store_true",
+            help="Do not delete original files after moving them to blobs",
+        )
+
+    def migrate_name(self, name: str, moved: dict) -> str:
+        if not name or default_storage.is_blob(name):
+            return name
+        if name not in moved:
+            with self.legacy.open(name) as file:
+                moved[name] = default_storage.save(name, file)
+        else:
+            default_storage.retain_name(moved[name])
+        return moved[name]
+
+    def handle(self, *args, **options):
+        if not getattr(default_storage, "content_addressed", False):
+            raise CommandError("Default storage is not content-addressed")
+        self.legacy = FileSystemStorage(location=default_storage.location)
+
+        moved = {}
+        for model_label, field_name in MEDIA_FIELDS:
+            model = apps.get_model(model_label)
+            has_variants = any(
+                field.name == "image_variants" for field in model._meta.fields
+            )
+            rows = (
+                model.objects.exclude(**{field_name: ""})
+                .exclude(**{f"{field_name}__startswith": "blobs/"})
+                .order_by("pk")
+            )
+            last_pk = 0
+            while True:
+                batch = list(rows.filter(pk__gt=last_pk)[: options["batch_size"]])
+                if not batch:
+                    break
+                for instance in batch:
+                    file = getattr(instance, field_name)
+                    try:
+                        file.name = self.migrate_name(file.name, moved)
+                        if has_variants:
+                            instance.image_variants = {
+                                variant: self.migrate_name(name, moved)
+                                for variant, name in instance.image_variants.items()
+                            }
+                    except FileNotFoundError as error:
+                        self.stderr.write(f"{model_label} #{instance.pk}: {error}")
+                model.objects.bulk_update(
+                    batch,
+                    [field_name, "image_variants"] if has_variants else [field_name],
+                )
+                last_pk = batch[-1].pk
+                self.stdout.write(f"{model_label}: up to #{last_pk} moved")
+
+        if not options["keep_files"]:
+            for name in moved:
+                self.legacy.delete(name)
+        blobs = len(set(moved.values()))
+        self.stdout.write(
+            self.style.SUCCESS(f"Files moved: {len(moved)}, unique blobs: {blobs}")
+        )
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+
+from social_media.storage import collect_garbage
+from social_media_api import settings
+
+
+class Command(BaseCommand):
+    """Django command to delete unreferenced and untracked media blobs"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=settings.MEDIA_BLOB_GC_GRACE_PERIOD.total_seconds() / 3600,
+            help="Keep unreferenced blobs younger than that",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        deleted, swept = collect_garbage(
+            timedelta(hours=options["grace_hours"]), dry_run=options["dry_run"]
+        )
+        action = "to delete" if options["dry_run"] else "deleted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Unreferenced blobs {action}: {deleted}, untracked files: {swept}"
+            )
+        )
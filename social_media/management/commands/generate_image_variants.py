@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection
+
+from social_media.models import Post
+from social_media.tasks import generate_image_variants
+
+
+class Command(BaseCommand):
+    """Django command to generate image variants of existing media"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Regenerate variants of images that already have them",
+        )
+        parser.add_argument(
+            "--queue",
+            action="store_true",
+            help="Send jobs to Celery workers instead of local threads",
+        )
+
+    def jobs(self, regenerate: bool):
+        sources = (
+            (Post, "image"),
+            (get_user_model(), "profile_picture"),
+        )
+        for model, field_name in sources:
+            images = model.objects.exclude(**{field_name: ""}).exclude(
+                **{f"{field_name}__isnull": True}
+            )
+            if not regenerate:
+                images = images.filter(image_variants={})
+            for pk in images.values_list("pk", flat=True).iterator():
+                yield model._meta.label, pk, field_name
+
+    def handle(self, *args, **options):
+        jobs = self.jobs(options["all"])
+        if options["queue"]:
+            queued = 0
+            for job in jobs:
+                generate_image_variants.delay(*job)
+                queued += 1
+            self.stdout.write(self.style.SUCCESS(f"Images queued: {queued}"))
+            return
+
+        def run(job):
+            try:
+                return generate_image_variants(*job)
+            finally:
+                connection.close()
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = {executor.submit(run, job): job for job in list(jobs)}
+            for future in as_completed(futures):
+                try:
+                    self.stdout.write(future.result())
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {error}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, failed: {failed}"))
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from social_media import profile_cache
+
+
+class Command(BaseCommand):
+    """Django command to show hit / miss counters of the profile response cache"""
+
+    def handle(self, *args, **options):
+        stats = profile_cache.stats()
+        lookups = stats["hit"] + stats["miss"]
+        ratio = stats["hit"] / lookups if lookups else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Profile cache hits: {stats['hit']}, misses: {stats['miss']}, "
+                f"hit ratio: {ratio:.1%}"
+            )
+        )
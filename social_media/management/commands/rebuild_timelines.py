@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+
+from social_media.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    """Django command to rebuild materialized home timelines"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="Rebuild timeline of user id only (can be repeated)",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Max number of latest posts copied per followed author",
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("id")
+        if options["users"]:
+            users = users.filter(id__in=options["users"])
+
+        total = 0
+        for user in users.iterator(chunk_size=500):
+            total += rebuild_timeline(user, limit=options["limit"])
+        self.stdout.write(self.style.SUCCESS(f"Timelines rebuilt: {total} entries"))
@@ -0,0 +1,47 @@
+from django.core.management import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from social_media.models import Post
+
+
+class Command(BaseCommand):
+    """Django command to find and fix drift of post like & comment counters"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report posts with drifted counters",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = Post.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+
+        fixed = 0
+        for start in range(0, last_id, batch_size):
+            drifted = list(
+                Post.counters_drift().filter(id__gt=start, id__lte=start + batch_size)
+            )
+            now = timezone.now()
+            for post in drifted:
+                self.stdout.write(
+                    f"Post #{post.id}: "
+                    f"likes {post.likes_count} -> {post.real_likes_count}, "
+                    f"comments {post.comments_count} -> {post.real_comments_count}"
+                )
+                post.likes_count = post.real_likes_count
+                post.comments_count = post.real_comments_count
+                post.updated_at = now
+            if drifted and not options["dry_run"]:
+                Post.objects.bulk_update(
+                    drifted, ["likes_count", "comments_count", "updated_at"]
+                )
+            fixed += len(drifted)
+
+        action = "found" if options["dry_run"] else "fixed"
+        self.stdout.write(
+            self.style.SUCCESS(f"Posts with counter drift {action}: {fixed}")
+        )
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from social_media import profile_cache
+
+
+class Command(BaseCommand):
+    """Django command to recount stored follower / following counters"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        users = get_user_model()
+        last_id = users.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+
+        fixed = 0
+        for start in range(0, last_id, batch_size):
+            drifted = list(
+                users.follow_counters_drift().filter(
+                    id__gt=start, id__lte=start + batch_size
+                )
+            )
+            now = timezone.now()
+            for user in drifted:
+                user.followers_count = user.real_followers_count
+                user.followed_by_count = user.real_followed_by_count
+                user.updated_at = now
+            users.objects.bulk_update(
+                drifted, ["followers_count", "followed_by_count", "updated_at"]
+            )
+            if drifted:
+                profile_cache.invalidate(*(user.pk for user in drifted))
+            fixed += len(drifted)
+
+        self.stdout.write(self.style.SUCCESS(f"Users recounted: {fixed}"))
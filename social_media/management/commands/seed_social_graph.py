@@ -0,0 +1,416 @@
+import io
+import random
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from social_media import profile_cache
+from social_media.images import render_variants
+from social_media.models import (
+    Comment,
+    Like,
+    MediaBlob,
+    Post,
+    PostTag,
+    Tag,
+    TimelineEntry,
+)
+from social_media_api import settings
+from user.models import Follow
+from user.search import build_search_name
+
+FIRST_NAMES = (
+    "Anna", "Ben", "Chloe", "Dmytro", "Emma", "Felix", "Grace", "Hiro", "Ivy",
+    "Jonas", "Kira", "Liam", "Maya", "Noah", "Olga", "Pavlo", "Quinn", "Rosa",
+    "Sam", "Taras", "Uma", "Victor", "Wen", "Yana", "Zoe",
+)  # fmt: skip
+LAST_NAMES = (
+    "Adams", "Bondar", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Hughes",
+    "Ivanenko", "Jensen", "Kowalski", "Lopez", "Moreau", "Novak", "Okafor",
+    "Petrenko", "Rossi", "Schmidt", "Tanaka", "Weber",
+)  # fmt: skip
+WORDS = (
+    "today", "coffee", "morning", "city", "music", "great", "new", "project",
+    "weekend", "travel", "book", "photo", "friends", "work", "idea", "sunset",
+    "code", "release", "team", "run", "rain", "garden", "movie", "dinner",
+    "launch", "learning", "trip", "sea", "mountains", "concert", "game", "walk",
+)  # fmt: skip
+PLACEHOLDER_COLORS = (
+    "#e63946", "#f1c453", "#2a9d8f", "#264653", "#8ecae6", "#6d597a",
+    "#b5838d", "#90be6d",
+)  # fmt: skip
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create store given created_at / updated_at values"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def insert_rows(model, field_names, rows) -> int:
+    """
+    Insert rows (tuples of field_names values) without model instances:
+    COPY on PostgreSQL with psycopg 3, executemany elsewhere
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in field_names]
+    table = quote(model._meta.db_table)
+    columns = ", ".join(quote(field.column) for field in fields)
+    # related ids are inserted as they are
+    prepare = [
+        None if field.is_relation else field.get_db_prep_save for field in fields
+    ]
+    values = [
+        [
+            value if prep is None else prep(value, connection)
+            for prep, value in zip(prepare, row)
+        ]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql" and hasattr(cursor.cursor, "copy"):
+            with cursor.cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                for row in values:
+                    copy.write_row(row)
+        elif values:
+            placeholders = ", ".join(["%s"] * len(fields))
+            cursor.executemany(
+                f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", values
+            )
+    return len(values)
+
+
+class Command(BaseCommand):
+    """Django command to seed a synthetic social graph for local load testing"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument(
+            "--follows-avg", type=float, default=20, help="Mean followed users"
+        )
+        parser.add_argument(
+            "--alpha",
+            type=float,
+            default=1.0,
+            help="Exponent of the power-law popularity of users",
+        )
+        parser.add_argument("--likes-avg", type=float, default=5)
+        parser.add_argument("--comments-avg", type=float, default=1)
+        parser.add_argument("--tags", type=int, default=200)
+        parser.add_argument(
+            "--images",
+            type=float,
+            default=0.1,
+            help="Share of posts and profiles with a placeholder image",
+        )
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--password", default="password")
+        parser.add_argument(
+            "--no-timelines",
+            action="store_true",
+            help="Do not materialize home timelines of the posts",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.domain = f"seed{options['seed']}.example.com"
+        if get_user_model().objects.filter(email__endswith="@" + self.domain).exists():
+            raise CommandError(f"Users @{self.domain} exist: use another --seed")
+
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options["days"])
+        self.references, self.saved = Counter(), Counter()
+        self.placeholders = self.create_placeholders() if options["images"] else []
+
+        with explicit_timestamps(
+            get_user_model()._meta.get_field("updated_at"),
+            Post._meta.get_field("created_at"),
+            Post._meta.get_field("updated_at"),
+        ):
+            followers = self.generate_follows()
+            self.create_users(followers)
+            self.create_follows(followers)
+            self.create_tags()
+            self.create_posts(followers)
+        self.retain_placeholders()
+        # rows are inserted without signals
+        profile_cache.invalidate()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {options['users']} users, {self.follows} follows, "
+                f"{options['posts']} posts, {self.likes} likes, "
+                f"{self.comments} comments, {self.entries} timeline entries"
+            )
+        )
+
+    def moment_after(self, moment):
+        return moment + (self.now - moment) * self.rng.random()
+
+    def create_placeholders(self) -> list:
+        """Placeholder images (+ their variants) shared by seeded posts"""
+        placeholders = []
+        for index, color in enumerate(PLACEHOLDER_COLORS):
+            buffer = io.BytesIO()
+            Image.new("RGB", (640, 480), color).save(buffer, format="PNG")
+            name = default_storage.save(
+                f"upload/seed/placeholder-{index}.png", ContentFile(buffer.getvalue())
+            )
+            variants = render_variants(name)
+            self.saved.update([name, *variants.values()])
+            placeholders.append((name, variants))
+        return placeholders
+
+    def placeholder(self):
+        """(image name, variants) of a placeholder or ("", {})"""
+        if not self.placeholders or self.rng.random() >= self.options["images"]:
+            return "", {}
+        name, variants = self.rng.choice(self.placeholders)
+        self.references.update([name, *variants.values()])
+        return name, variants
+
+    def retain_placeholders(self) -> None:
+        """Content-addressed blobs: count the references of bulk inserted rows"""
+        if not getattr(default_storage, "content_addressed", False):
+            return
+        for blob, saved in self.saved.items():
+            # saving the placeholders already counted their own references
+            MediaBlob.objects.filter(name=blob).update(
+                ref_count=F("ref_count") + self.references[blob] - saved
+            )
+
+    def generate_follows(self) -> list:
+        """
+        followers[i]: indexes of users following user i. Followed users
+        are drawn by Zipf weights: follower counts follow a power law.
+        """
+        users = self.options["users"]
+        ranks = list(range(users))
+        self.rng.shuffle(ranks)
+        self.popularity = list(
+            accumulate(1 / (rank + 1) ** self.options["alpha"] for rank in ranks)
+        )
+        followers = [[] for __ in range(users)]
+        for follower in range(users):
+            count = min(
+                users - 1, round(self.rng.expovariate(1 / self.options["follows_avg"]))
+            )
+            targets = self.rng.choices(
+                range(users), cum_weights=self.popularity, k=count
+            )
+            for target in set(targets) - {follower}:
+                followers[target].append(follower)
+        return followers
+
+    def create_users(self, followers: list) -> None:
+        password = make_password(self.options["password"])
+        followed_by_counts = Counter(
+            follower for users in followers for follower in users
+        )
+        window = (self.now - self.start) / 2
+        users = []
+        for index in range(self.options["users"]):
+            first_name = self.rng.choice(FIRST_NAMES)
+            last_name = self.rng.choice(LAST_NAMES)
+            email = f"{first_name}.{last_name}.{index}@{self.domain}".lower()
+            joined = self.start + window * self.rng.random()
+            picture, variants = self.placeholder()
+            users.append(
+                get_user_model()(
+                    email=email,
+                    password=password,
+                    first_name=first_name,
+                    last_name=last_name,
+                    profile_picture=picture or None,
+                    image_variants=variants,
+                    search_name=build_search_name(first_name, last_name, email),
+                    followers_count=len(followers[index]),
+                    followed_by_count=followed_by_counts[index],
+                    date_joined=joined,
+                    updated_at=joined,
+                )
+            )
+        self.user_ids, self.joined = [], []
+        for start in range(0, len(users), self.batch_size):
+            batch = get_user_model().objects.bulk_create(
+                users[start : start + self.batch_size]
+            )
+            self.user_ids += [user.pk for user in batch]
+            self.joined += [user.date_joined for user in batch]
+        self.stdout.write(f"Users: {len(self.user_ids)}")
+
+    def create_follows(self, followers: list) -> None:
+        self.follows = 0
+        fields = ("from_user", "to_user", "created_at")
+        rows = []
+        for target, users in enumerate(followers):
+            rows += [
+                (
+                    self.user_ids[target],
+                    self.user_ids[follower],
+                    self.moment_after(max(self.joined[target], self.joined[follower])),
+                )
+                for follower in users
+            ]
+            if len(rows) >= self.batch_size:
+                self.follows += insert_rows(Follow, fields, rows)
+                rows = []
+        self.follows += insert_rows(Follow, fields, rows)
+        self.stdout.write(f"Follows: {self.follows}")
+
+    def create_tags(self) -> None:
+        names = [
+            f"{self.rng.choice(WORDS)}{index}" if index >= len(WORDS) else WORDS[index]
+            for index in range(self.options["tags"])
+        ]
+        Tag.objects.bulk_create(
+            [Tag(name=name) for name in names], ignore_conflicts=True
+        )
+        tag_ids = dict(Tag.objects.filter(name__in=names).values_list("name", "id"))
+        self.tags = [(name, tag_ids[name]) for name in names]
+        self.tag_popularity = list(
+            accumulate(1 / (rank + 1) for rank in range(len(self.tags)))
+        )
+
+    def post_content(self) -> tuple:
+        words = self.rng.choices(WORDS, k=self.rng.randint(3, 20))
+        tags = set(
+            self.rng.choices(
+                self.tags, cum_weights=self.tag_popularity, k=self.rng.randint(0, 3)
+            )
+        )
+        return " ".join(words + [f"#{name}" for name, __ in tags]), tags
+
+    def pick_users(self, followers: list, count: int) -> set:
+        """count users, followers of the author first"""
+        if count <= len(followers):
+            return set(self.rng.sample(followers, count))
+        picked = set(followers)
+        extra = self.rng.sample(range(len(self.user_ids)), count)
+        return picked | set(extra[: count - len(picked)])
+
+    def create_posts(self, followers: list) -> None:
+        self.likes = self.comments = self.entries = 0
+        users = len(self.user_ids)
+        activity = list(
+            accumulate(
+                1 / (rank + 1) ** (self.options["alpha"] / 2) for rank in range(users)
+            )
+        )
+        max_followers = settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+        remaining = self.options["posts"]
+        while remaining:
+            size = min(remaining, self.batch_size)
+            remaining -= size
+            authors = self.rng.choices(range(users), cum_weights=activity, k=size)
+
+            posts, extras = [], []
+            for author in authors:
+                created_at = self.moment_after(self.joined[author])
+                content, tags = self.post_content()
+                image, variants = self.placeholder()
+                likers = self.pick_users(
+                    followers[author],
+                    min(
+                        users,
+                        round(self.rng.expovariate(1 / self.options["likes_avg"])),
+                    ),
+                )
+                commenters = [
+                    self.rng.choice(followers[author] or range(users))
+                    for __ in range(
+                        round(self.rng.expovariate(1 / self.options["comments_avg"]))
+                    )
+                ]
+                posts.append(
+                    Post(
+                        user_id=self.user_ids[author],
+                        content=content,
+                        image=image or None,
+                        image_variants=variants,
+                        likes_count=len(likers),
+                        comments_count=len(commenters),
+                        fanned_out=not self.options["no_timelines"]
+                        and len(followers[author]) <= max_followers,
+                        created_at=created_at,
+                        updated_at=created_at,
+                    )
+                )
+                extras.append((author, tags, likers, commenters))
+
+            with transaction.atomic():
+                posts = Post.objects.bulk_create(posts)
+                likes, comments, post_tags, entries = [], [], [], []
+                for post, (author, tags, likers, commenters) in zip(posts, extras):
+                    likes += [
+                        (
+                            post.pk,
+                            self.user_ids[liker],
+                            self.moment_after(post.created_at),
+                        )
+                        for liker in likers
+                    ]
+                    for commenter in commenters:
+                        commented_at = self.moment_after(post.created_at)
+                        message = " ".join(self.rng.choices(WORDS, k=5))
+                        comments.append(
+                            (
+                                post.pk,
+                                self.user_ids[commenter],
+                                message,
+                                commented_at,
+                                commented_at,
+                            )
+                        )
+                    post_tags += [
+                        (post.pk, tag_id, post.created_at) for __, tag_id in tags
+                    ]
+                    if self.options["no_timelines"]:
+                        continue
+                    # fan-out on write like social_media.timeline
+                    owners = [author]
+                    if len(followers[author]) <= max_followers:
+                        owners += followers[author]
+                    entries += [
+                        (self.user_ids[owner], post.pk, post.user_id, post.created_at)
+                        for owner in owners
+                    ]
+                insert_rows(Like, ("post", "user", "created_at"), likes)
+                insert_rows(
+                    Comment,
+                    ("post", "user", "message", "created_at", "updated_at"),
+                    comments,
+                )
+                insert_rows(PostTag, ("post", "tag", "created_at"), post_tags)
+                insert_rows(
+                    TimelineEntry, ("owner", "post", "author", "created_at"), entries
+                )
+
+            self.likes += len(likes)
+            self.comments += len(comments)
+            self.entries += len(entries)
+            self.stdout.write(f"Posts: {self.options['posts'] - remaining}")
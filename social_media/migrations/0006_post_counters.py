@@ -0,0 +1,46 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:38
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_post_relations(apps, schema_editor):
+    Post = apps.get_model("social_media", "Post")
+    Comment = apps.get_model("social_media", "Comment")
+    likes = (
+        Post.likes.through.objects.filter(post=models.OuterRef("pk"))
+        .values("post")
+        .annotate(count=models.Count("*"))
+        .values("count")
+    )
+    comments = (
+        Comment.objects.filter(post=models.OuterRef("pk"))
+        .values("post")
+        .annotate(count=models.Count("*"))
+        .values("count")
+    )
+    Post.objects.update(
+        likes_count=Coalesce(models.Subquery(likes), 0),
+        comments_count=Coalesce(models.Subquery(comments), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social_media", "0005_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comments_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="likes_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_post_relations, migrations.RunPython.noop),
+    ]
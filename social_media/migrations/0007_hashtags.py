@@ -0,0 +1,85 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social_media", "0006_post_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PostTag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="post_tags",
+                        to="social_media.post",
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="post_tags",
+                        to="social_media.tag",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="tags",
+            field=models.ManyToManyField(
+                blank=True,
+                related_name="posts",
+                through="social_media.PostTag",
+                to="social_media.tag",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="posttag",
+            index=models.Index(
+                fields=["tag", "-created_at"], name="post_tag_recent_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="posttag",
+            constraint=models.UniqueConstraint(
+                fields=("post", "tag"), name="unique_post_tag"
+            ),
+        ),
+    ]
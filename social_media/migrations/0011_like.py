@@ -0,0 +1,87 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social_media", "0010_mediablob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # the table of the auto-created through model is kept as is:
+        # only the state gets an explicit model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="Like",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "post",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="post_likes",
+                                to="social_media.post",
+                            ),
+                        ),
+                        (
+                            "user",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="+",
+                                to=settings.AUTH_USER_MODEL,
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "social_media_post_likes",
+                        "unique_together": {("post", "user")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="post",
+                    name="likes",
+                    field=models.ManyToManyField(
+                        blank=True,
+                        related_name="user_likes",
+                        through="social_media.Like",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="like",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(
+                fields=["user", "-created_at"], name="like_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(
+                fields=["post", "-created_at"], name="like_post_created_idx"
+            ),
+        ),
+    ]
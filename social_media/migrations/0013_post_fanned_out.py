@@ -0,0 +1,38 @@
+# Generated by Django 5.0.4 on 2026-10-18 04:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_fanned_out(apps, schema_editor):
+    # posts of celebrities were not written into the timelines of followers
+    Post = apps.get_model("social_media", "Post")
+    Post.objects.filter(
+        user__followers_count__lte=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    ).update(fanned_out=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social_media", "0012_post_comment_updated_at"),
+        ("user", "0002_user_follow_counters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="fanned_out",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_fanned_out, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("fanned_out", False)),
+                fields=["user", "-created_at"],
+                name="post_fan_out_on_read_idx",
+            ),
+        ),
+    ]
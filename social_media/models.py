@@ -2,8 +2,10 @@ import pathlib
 import uuid
 
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils.text import slugify
 
+from social_media.staging import staged_image_path
 from social_media_api import settings
 from user.models import User
 
@@ -19,14 +21,81 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     image = models.ImageField(upload_to=post_picture_path, null=True, blank=True)
-    likes = models.ManyToManyField(User, related_name="user_likes", blank=True)
+    # {variant: storage name} of resized renditions of image
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    likes = models.ManyToManyField(
+        User, through="Like", related_name="user_likes", blank=True
+    )
+    tags = models.ManyToManyField(
+        "Tag", through="PostTag", related_name="posts", blank=True
+    )
+    # denormalized counters, kept in sync by social_media.signals
+    likes_count = models.IntegerField(default=0, editable=False)
+    comments_count = models.IntegerField(default=0, editable=False)
+    # bumped on counter and comment updates too: watermark of conditional GETs
+    updated_at = models.DateTimeField(auto_now=True)
+    # written into the timelines of the followers of its author: posts not
+    # fanned out (yet, or of a celebrity author) are read into feeds on read
+    fanned_out = models.BooleanField(default=False, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at"],
+                condition=models.Q(fanned_out=False),
+                name="post_fan_out_on_read_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"post id={self.id} | " f"{self.created_at} | {self.content[:15]} ..."
 
+    @classmethod
+    def counters_drift(cls):
+        """Posts annotated with real counts where stored counters differ"""
+        likes = (
+            cls.likes.through.objects.filter(post=models.OuterRef("pk"))
+            .values("post")
+            .annotate(count=models.Count("*"))
+            .values("count")
+        )
+        comments = (
+            Comment.objects.filter(post=models.OuterRef("pk"))
+            .values("post")
+            .annotate(count=models.Count("*"))
+            .values("count")
+        )
+        return cls.objects.annotate(
+            real_likes_count=Coalesce(models.Subquery(likes), 0),
+            real_comments_count=Coalesce(models.Subquery(comments), 0),
+        ).exclude(
+            likes_count=models.F("real_likes_count"),
+            comments_count=models.F("real_comments_count"),
+        )
+
+
+class Like(models.Model):
+    """Row of Post.likes: keeps the time of the like"""
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="post_likes")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # table & unique index of the former auto-created through model
+        db_table = "social_media_post_likes"
+        unique_together = ("post", "user")
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="like_user_created_idx"),
+            models.Index(fields=["post", "-created_at"], name="like_post_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"like post={self.post_id} | user={self.user_id}"
+
 
 class Comment(models.Model):
     user = models.ForeignKey(
@@ -35,9 +104,127 @@ class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-created_at"]
 
     def __str__(self):
         return f"comment id={self.id} | " f"{self.created_at} | {self.message[:15]}"
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return f"#{self.name}"
+
+
+class PostTag(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="post_tags")
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="post_tags")
+    # copy of post.created_at to read the latest posts of a tag from the index
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["post", "tag"], name="unique_post_tag"),
+        ]
+        indexes = [
+            models.Index(fields=["tag", "-created_at"], name="post_tag_recent_idx"),
+        ]
+
+    def __str__(self):
+        return f"post={self.post_id} | tag={self.tag_id}"
+
+
+class TimelineEntry(models.Model):
+    """Materialized home timeline row: `post` is shown in `owner`'s feed"""
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "post"], name="unique_timeline_entry"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "-created_at"], name="timeline_owner_created_idx"
+            ),
+            models.Index(fields=["owner", "author"], name="timeline_owner_author_idx"),
+        ]
+
+    def __str__(self):
+        return f"timeline owner={self.owner_id} | post={self.post_id}"
+
+
+class ScheduledPost(models.Model):
+    """Post to be published by the dispatcher at post_at"""
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        PUBLISHED = "published"
+        CANCELLED = "cancelled"
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="scheduled_posts",
+    )
+    content = models.TextField()
+    image = models.ImageField(upload_to=staged_image_path, null=True, blank=True)
+    # original name of the uploaded image
+    image_name = models.CharField(max_length=255, blank=True)
+    post_at = models.DateTimeField()
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    post = models.OneToOneField(
+        Post, null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["post_at"]
+        indexes = [
+            models.Index(
+                fields=["post_at"],
+                condition=models.Q(status="pending"),
+                name="scheduled_post_due_idx",
+            ),
+            models.Index(
+                fields=["user", "status", "post_at"],
+                name="scheduled_post_user_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"scheduled post id={self.id} | {self.post_at} | {self.status}"
+
+
+class MediaBlob(models.Model):
+    """Unique uploaded file of content-addressed media storage"""
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"blob {self.name} | refs={self.ref_count}"
@@ -0,0 +1,281 @@
+import base64
+import json
+from functools import reduce
+from operator import itemgetter
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from social_media.models import PostTag, TimelineEntry
+from social_media.timeline import home_timeline_sources
+from social_media_api import settings
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a unique composite key (ex. created_at, id).
+    Pages are fetched with a WHERE over the key and LIMIT only:
+    no COUNT query, no OFFSET scan, no page shifts on concurrent inserts.
+    """
+
+    ordering = ("-id",)
+    cursor_query_param = "cursor"
+    page_size = settings.PAGINATION_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        position, self.reverse = self.decode_cursor(
+            request, self.cursor_fields(queryset)
+        )
+        ordering = self.get_ordering(self.reverse)
+        results = self.fetch(queryset, ordering, position, self.page_size + 1)
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = position is not None and (has_more or not self.reverse)
+        return self.page
+
+    def fetch(self, queryset, ordering: tuple, position, limit: int) -> list:
+        """First limit items of queryset after position in ordering"""
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(ordering, position))
+        return list(queryset.order_by(*ordering)[:limit])
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, reverse: bool = False) -> tuple:
+        if not reverse:
+            return self.ordering
+        return tuple(
+            field[1:] if field.startswith("-") else "-" + field
+            for field in self.ordering
+        )
+
+    @staticmethod
+    def seek_filter(ordering: tuple, position: list) -> Q:
+        """(a, b) > (x, y) as (a > x) OR (a = x AND b > y) for any direction"""
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                prev.lstrip("-"): value
+                for prev, value in zip(ordering[:index], position[:index])
+            }
+            conditions.append(Q(**equal, **{f"{name}__{lookup}": position[index]}))
+        return reduce(lambda left, right: left | right, conditions)
+
+    @property
+    def key_fields(self) -> tuple:
+        """Fields of the listed items the pages are keyed by"""
+        return tuple(field.lstrip("-") for field in self.ordering)
+
+    @staticmethod
+    def get_item_value(item, name: str):
+        if isinstance(item, dict):
+            return item[name]
+        return getattr(item, name)
+
+    def get_position(self, item) -> list:
+        position = []
+        for field in self.ordering:
+            value = self.get_item_value(item, field.lstrip("-"))
+            position.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        return position
+
+    def cursor_fields(self, queryset) -> list:
+        """Model fields of the ordering: types of the cursor positions"""
+        fields = [
+            queryset.model._meta.get_field(field.lstrip("-")) for field in self.ordering
+        ]
+        # related ids: the primary key of the related model
+        return [getattr(field, "target_field", field) for field in fields]
+
+    def decode_cursor(self, request, fields: list) -> tuple:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            position, reverse = data["p"], bool(data["r"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            position = [
+                field.to_python(value) for field, value in zip(fields, position)
+            ]
+            for field, value in zip(fields, position):
+                # ex. the range of integers of the database
+                field.run_validators(value)
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position: list, reverse: bool) -> str:
+        data = json.dumps({"p": position, "r": int(reverse)}, separators=(",", ":"))
+        encoded = base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class PostPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class PostIndexPagination(KeysetPagination):
+    """
+    Posts of the view, newest first: the keys of a page are read from
+    (created_at, post_id) rows of indexes, then its posts are fetched by id
+    """
+
+    ordering = ("-created_at", "-post_id")
+    key_fields = ("id",)
+    ids = None
+
+    def index_rows(self, queryset, view) -> list:
+        """Querysets of (created_at, post_id) rows listing the posts"""
+        raise NotImplementedError
+
+    def cursor_fields(self, queryset) -> list:
+        return super().cursor_fields(TimelineEntry.objects)
+
+    def page_ids(self, queryset, request, view) -> list:
+        """Ids of the posts of the requested page, read once per request"""
+        if self.ids is None:
+            self.sources = self.index_rows(queryset, view)
+            self.ids = [
+                row["post_id"] for row in super().paginate_queryset(None, request, view)
+            ]
+        return self.ids
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ids = self.page_ids(queryset, request, view)
+        posts = {
+            self.get_item_value(post, "id"): post
+            for post in queryset.filter(pk__in=ids)
+        }
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def fetch(self, queryset, ordering: tuple, position, limit: int) -> list:
+        # a post listed by several sources is kept once
+        rows = {}
+        for source in self.sources:
+            for row in super().fetch(source, ordering, position, limit):
+                rows.setdefault(row["post_id"], row)
+        return sorted(
+            rows.values(),
+            key=itemgetter("created_at", "post_id"),
+            reverse=ordering[0].startswith("-"),
+        )[:limit]
+
+
+class TagPostPagination(PostIndexPagination):
+    """Posts of the hashtag of the view, from the PostTag index (tag, -created_at)"""
+
+    def index_rows(self, queryset, view) -> list:
+        return [
+            PostTag.objects.filter(
+                tag__name=view.tag, post__in=queryset.values("pk")
+            ).values("created_at", "post_id")
+        ]
+
+
+class TimelinePagination(PostIndexPagination):
+    """
+    Home timeline of the viewer: entries of the TimelineEntry index
+    (owner, -created_at) merged with the posts read on the fly
+    """
+
+    def index_rows(self, queryset, view) -> list:
+        return home_timeline_sources(view.request.user)
+
+
+class CommentPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class ScheduledPostPagination(KeysetPagination):
+    ordering = ("post_at", "id")
+
+
+class LikePagination(KeysetPagination):
+    """Like rows: newest like first"""
+
+    ordering = ("-created_at", "-id")
+
+
+class FollowPagination(KeysetPagination):
+    """Follow rows: newest follow first"""
+
+    ordering = ("-created_at", "-id")
@@ -0,0 +1,123 @@
+"""
+Short-TTL micro-cache of post detail payloads with request coalescing.
+
+Payloads are shared by all viewers (liked_by_me is set per request) and
+keyed by the post watermark, so likes, comments and edits, which bump
+Post.updated_at, start a new entry. One worker rebuilds an entry:
+threads of the same process wait on it, other processes wait on the
+shared cache lock or get the previous (stale) payload meanwhile.
+
+Post lists are not cached: their ETags are watermarks of the requested
+page (ids, updated_at of its posts and authors), read from the database.
+"""
+
+import hashlib
+import threading
+import time
+
+from django.core.cache import caches
+
+from social_media_api import metrics, settings
+
+
+class SingleFlight:
+    """Concurrent calls with the same key in the process share one result"""
+
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.failed = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key: str, compute, timeout: float) -> tuple:
+        """Returns (result, shared): shared results were computed by another call"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = self.Call()
+
+        if not leader:
+            if call.done.wait(timeout) and not call.failed:
+                return call.result, True
+            # the leader failed or is too slow
+            return compute(), False
+
+        try:
+            call.result = compute()
+            call.failed = False
+            return call.result, False
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+flights = SingleFlight()
+
+
+def post_cache():
+    return caches[settings.POST_CACHE_ALIAS]
+
+
+def request_fingerprint(request) -> str:
+    """Host (absolute urls), media type and query parameters, not the viewer"""
+    raw = repr(
+        (
+            request.get_host(),
+            request.accepted_media_type,
+            sorted(request.query_params.lists()),
+        )
+    )
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def load_or_build(key: str, latest_key: str, build) -> tuple:
+    """(payload, "HIT" | "STALE" | "MISS") with one builder across processes"""
+    cache = post_cache()
+    payload = cache.get(key)
+    if payload is not None:
+        return payload, "HIT"
+
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, True, settings.POST_CACHE_LOCK_TTL):
+        stale = cache.get(latest_key)
+        if stale is not None:
+            return stale, "STALE"
+        deadline = time.monotonic() + settings.POST_CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(settings.POST_CACHE_POLL_INTERVAL)
+            payload = cache.get(key)
+            if payload is not None:
+                return payload, "HIT"
+        # lock holder is too slow or died: build without the lock
+        return build(), "MISS"
+
+    try:
+        payload = build()
+        cache.set(key, payload, settings.POST_CACHE_TTL)
+        cache.set(latest_key, payload, settings.POST_CACHE_STALE_TTL)
+    finally:
+        cache.delete(lock_key)
+    return payload, "MISS"
+
+
+def cached_payload(pk, version, request, build) -> tuple:
+    """
+    (payload, source, shared) of post pk at version: shared / cached
+    payloads may be built for another viewer.
+    """
+    fingerprint = request_fingerprint(request)
+    key = f"post:{pk}:{version}:{fingerprint}"
+    latest_key = f"post:{pk}:latest:{fingerprint}"
+    (payload, source), shared = flights.do(
+        key,
+        lambda: load_or_build(key, latest_key, build),
+        settings.POST_CACHE_LOCK_WAIT,
+    )
+    metrics.record_cache_lookup("posts", "coalesced" if shared else source.lower())
+    return payload, source, shared
@@ -0,0 +1,115 @@
+import hashlib
+import time
+from functools import partial
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from rest_framework.response import Response
+
+from social_media_api import metrics, settings
+
+LIST_VERSION_KEY = "profile-version:list"
+STATS_KEYS = {"hit": "profile-cache:hits", "miss": "profile-cache:misses"}
+
+
+def profile_cache():
+    return caches[settings.PROFILE_CACHE_ALIAS]
+
+
+def check_shared_cache() -> None:
+    """
+    Versions of profile lists are ETag watermarks: a process-local cache
+    hides their bumps from other processes, which would serve stale 304s
+    """
+    if isinstance(profile_cache(), (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            "CONDITIONAL_GET needs a cache shared by all processes: "
+            "set PROFILE_CACHE_REDIS_URL (or CACHE_REDIS_URL)"
+        )
+
+
+def version_key(pk) -> str:
+    return f"profile-version:{pk}"
+
+
+def get_version(key: str) -> int:
+    cache = profile_cache()
+    version = cache.get(key)
+    if version is None:
+        # a new counter never reuses versions of an evicted one
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(pks) -> None:
+    cache = profile_cache()
+    for key in [LIST_VERSION_KEY, *(version_key(pk) for pk in set(pks))]:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(*pks) -> None:
+    """Cached responses of profiles pks and of profile lists expire on commit"""
+    transaction.on_commit(partial(bump_versions, pks))
+
+
+def request_fingerprint(request) -> str:
+    """Host (absolute urls), viewer (follow flags) and query parameters"""
+    raw = repr(
+        (
+            request.get_host(),
+            request.user.pk,
+            sorted(request.query_params.lists()),
+        )
+    )
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def retrieve_key(pk, request) -> str:
+    version = get_version(version_key(pk))
+    return f"profile:{pk}:{version}:{request_fingerprint(request)}"
+
+
+def list_version() -> int:
+    """Version of profile lists: bumped by every profile invalidation"""
+    return get_version(LIST_VERSION_KEY)
+
+
+def list_key(request) -> str:
+    return f"profiles:{list_version()}:{request_fingerprint(request)}"
+
+
+def record(result: str) -> None:
+    metrics.record_cache_lookup("profiles", result)
+    cache = profile_cache()
+    try:
+        cache.incr(STATS_KEYS[result])
+    except ValueError:
+        cache.add(STATS_KEYS[result], 1, timeout=None)
+
+
+def stats() -> dict:
+    counters = profile_cache().get_many(STATS_KEYS.values())
+    return {result: counters.get(key, 0) for result, key in STATS_KEYS.items()}
+
+
+def cached_response(key: str, compute) -> Response:
+    """Response data of key from the cache or computed & cached if 200 OK"""
+    cache = profile_cache()
+    data = cache.get(key)
+    if data is not None:
+        record("hit")
+        return Response(data, headers={"X-Cache": "HIT"})
+
+    record("miss")
+    response = compute()
+    if response.status_code == 200:
+        cache.set(key, response.data, settings.PROFILE_CACHE_TTL)
+    response["X-Cache"] = "MISS"
+    return response
@@ -0,0 +1,278 @@
+"""
+Lightweight like / follow writes straight on the M2M through tables.
+
+Rows are inserted and deleted without m2m_changed, post_save or
+post_delete signals, so counters and timeline updates are done here.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connections, transaction
+from django.db.models import BooleanField, Exists, F, OuterRef, Value
+from django.utils import timezone
+
+from social_media import profile_cache
+from social_media.models import Like, Post
+from social_media.tasks import backfill_timeline, prune_timeline
+from user.models import Follow
+
+
+class TargetNotFound(Exception):
+    pass
+
+
+def _insert(through, **fields) -> bool:
+    """Idempotent insert: False when the row already exists"""
+    try:
+        with transaction.atomic():
+            through.objects.bulk_create([through(**fields)])
+    except IntegrityError:
+        return False
+    return True
+
+
+def _delete(rows, key: str) -> list:
+    """
+    Delete rows without post_delete signals, returns key of each deleted row.
+    Rows are locked first: a concurrent delete of the same row waits,
+    then deletes nothing, so each removed row is counted once.
+    """
+    deleted = dict(rows.select_for_update().values_list("pk", key))
+    if deleted:
+        meta = rows.model._meta
+        connection = connections[rows.db]
+        quote = connection.ops.quote_name
+        placeholders = ", ".join(["%s"] * len(deleted))
+        with connection.cursor() as cursor:
+            # not rows.delete(): signal receivers would update counters again
+            cursor.execute(
+                f"DELETE FROM {quote(meta.db_table)} "
+                f"WHERE {quote(meta.pk.column)} IN ({placeholders})",
+                list(deleted),
+            )
+    return list(deleted.values())
+
+
+def _likes_count(post_id) -> int:
+    return Post.objects.filter(pk=post_id).values_list("likes_count", flat=True)[0]
+
+
+def _followers_count(user_id) -> int:
+    users = get_user_model().objects.filter(pk=user_id)
+    return users.values_list("followers_count", flat=True)[0]
+
+
+@transaction.atomic
+def like_post(user_id, post_id) -> tuple:
+    """Returns (liked, likes_count)"""
+    if _insert(Post.likes.through, post_id=post_id, user_id=user_id):
+        updated = Post.objects.filter(pk=post_id).update(
+            likes_count=F("likes_count") + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            raise TargetNotFound(post_id)
+    return True, _likes_count(post_id)
+
+
+@transaction.atomic
+def unlike_post(user_id, post_id) -> tuple:
+    """Returns (liked, likes_count)"""
+    deleted = _delete(
+        Post.likes.through.objects.filter(post_id=post_id, user_id=user_id),
+        "post_id",
+    )
+    if deleted:
+        Post.objects.filter(pk=post_id).update(
+            likes_count=F("likes_count") - 1, updated_at=timezone.now()
+        )
+    elif not Post.objects.filter(pk=post_id).exists():
+        raise TargetNotFound(post_id)
+    return False, _likes_count(post_id)
+
+
+@transaction.atomic
+def follow_user(follower_id, user_id) -> tuple:
+    """Returns (following, followers_count)"""
+    users = get_user_model().objects
+    follows = get_user_model().followers.through
+    if _insert(follows, from_user_id=user_id, to_user_id=follower_id):
+        updated = users.filter(pk=user_id).update(
+            followers_count=F("followers_count") + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            raise TargetNotFound(user_id)
+        users.filter(pk=follower_id).update(
+            followed_by_count=F("followed_by_count") + 1, updated_at=timezone.now()
+        )
+        profile_cache.invalidate(follower_id, user_id)
+        transaction.on_commit(lambda: backfill_timeline.delay(follower_id, user_id))
+    return True, _followers_count(user_id)
+
+
+@transaction.atomic
+def unfollow_user(follower_id, user_id) -> tuple:
+    """Returns (following, followers_count)"""
+    users = get_user_model().objects
+    deleted = _delete(
+        get_user_model().followers.through.objects.filter(
+            from_user_id=user_id, to_user_id=follower_id
+        ),
+        "from_user_id",
+    )
+    if deleted:
+        users.filter(pk=user_id).update(
+            followers_count=F("followers_count") - 1, updated_at=timezone.now()
+        )
+        users.filter(pk=follower_id).update(
+            followed_by_count=F("followed_by_count") - 1, updated_at=timezone.now()
+        )
+        profile_cache.invalidate(follower_id, user_id)
+        transaction.on_commit(lambda: prune_timeline.delay(follower_id, user_id))
+    elif not users.filter(pk=user_id).exists():
+        raise TargetNotFound(user_id)
+    return False, _followers_count(user_id)
+
+
+@transaction.atomic
+def batch_likes(user_id, like_ids, unlike_ids) -> dict:
+    """
+    Like / unlike many posts: counters change only for rows inserted
+    or deleted here, not by concurrent requests
+    """
+    through = Post.likes.through
+    like_ids, unlike_ids = set(like_ids), set(unlike_ids) - set(like_ids)
+    targets = like_ids | unlike_ids
+    existing = set(Post.objects.filter(pk__in=targets).values_list("pk", flat=True))
+    liked = set(
+        through.objects.filter(user_id=user_id, post_id__in=targets).values_list(
+            "post_id", flat=True
+        )
+    )
+
+    to_like = [
+        post_id
+        for post_id in sorted((like_ids & existing) - liked)
+        if _insert(through, post_id=post_id, user_id=user_id)
+    ]
+    Post.objects.filter(pk__in=to_like).update(
+        likes_count=F("likes_count") + 1, updated_at=timezone.now()
+    )
+
+    to_unlike = _delete(
+        through.objects.filter(user_id=user_id, post_id__in=unlike_ids & liked),
+        "post_id",
+    )
+    Post.objects.filter(pk__in=to_unlike).update(
+        likes_count=F("likes_count") - 1, updated_at=timezone.now()
+    )
+
+    counts = dict(Post.objects.filter(pk__in=existing).values_list("pk", "likes_count"))
+    return {
+        post_id: (post_id in like_ids, counts[post_id]) for post_id in sorted(counts)
+    }
+
+
+@transaction.atomic
+def batch_follows(follower_id, follow_ids, unfollow_ids) -> dict:
+    """
+    Follow / unfollow many users: counters change only for rows inserted
+    or deleted here, not by concurrent requests
+    """
+    users = get_user_model().objects
+    through = get_user_model().followers.through
+    follow_ids, unfollow_ids = set(follow_ids), set(unfollow_ids) - set(follow_ids)
+    targets = follow_ids | unfollow_ids
+    existing = set(users.filter(pk__in=targets).values_list("pk", flat=True))
+    followed = set(
+        through.objects.filter(
+            to_user_id=follower_id, from_user_id__in=targets
+        ).values_list("from_user_id", flat=True)
+    )
+
+    to_follow = [
+        pk
+        for pk in sorted((follow_ids & existing) - followed)
+        if _insert(through, from_user_id=pk, to_user_id=follower_id)
+    ]
+    users.filter(pk__in=to_follow).update(
+        followers_count=F("followers_count") + 1, updated_at=timezone.now()
+    )
+
+    to_unfollow = _delete(
+        through.objects.filter(
+            to_user_id=follower_id, from_user_id__in=unfollow_ids & followed
+        ),
+        "from_user_id",
+    )
+    users.filter(pk__in=to_unfollow).update(
+        followers_count=F("followers_count") - 1, updated_at=timezone.now()
+    )
+
+    delta = len(to_follow) - len(to_unfollow)
+    if delta:
+        users.filter(pk=follower_id).update(
+            followed_by_count=F("followed_by_count") + delta, updated_at=timezone.now()
+        )
+    if to_follow or to_unfollow:
+        profile_cache.invalidate(follower_id, *to_follow, *to_unfollow)
+    for pk in to_follow:
+        transaction.on_commit(lambda pk=pk: backfill_timeline.delay(follower_id, pk))
+    for pk in to_unfollow:
+        transaction.on_commit(lambda pk=pk: prune_timeline.delay(follower_id, pk))
+
+    counts = dict(users.filter(pk__in=existing).values_list("pk", "followers_count"))
+    return {pk: (pk in follow_ids, counts[pk]) for pk in sorted(counts)}
+
+
+def _flag(viewer, subquery):
+    if not viewer.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(subquery)
+
+
+def annotate_liked_by_me(posts, viewer):
+    """liked_by_me: correlated EXISTS over likes of viewer"""
+    return posts.annotate(
+        liked_by_me=_flag(
+            viewer, Like.objects.filter(post=OuterRef("pk"), user_id=viewer.id)
+        )
+    )
+
+
+def annotate_follow_flags(users, viewer):
+    """is_following: viewer follows user, follows_me: user follows viewer"""
+    return users.annotate(
+        is_following=_flag(
+            viewer,
+            Follow.objects.filter(from_user=OuterRef("pk"), to_user_id=viewer.id),
+        ),
+        follows_me=_flag(
+            viewer,
+            Follow.objects.filter(from_user_id=viewer.id, to_user=OuterRef("pk")),
+        ),
+    )
+
+
+def set_follow_flags(users: list, viewer) -> None:
+    """Follow flags of already fetched users with a single query"""
+    flags = relationships(viewer, [user.pk for user in users])
+    for user in users:
+        user.is_following, user.follows_me = flags.get(user.pk, (False, False))
+
+
+def relationships(viewer, user_ids) -> dict:
+    """{user id: (is_following, follows_me)} of existing users"""
+    users = annotate_follow_flags(
+        get_user_model().objects.filter(pk__in=user_ids), viewer
+    )
+    return {
+        pk: (is_following, follows_me)
+        for pk, is_following, follows_me in users.values_list(
+            "pk", "is_following", "follows_me"
+        )
+    }
+
+
+def like_statuses(viewer, post_ids) -> dict:
+    """{post id: liked_by_me} of existing posts"""
+    posts = annotate_liked_by_me(Post.objects.filter(pk__in=post_ids), viewer)
+    return dict(posts.values_list("pk", "liked_by_me"))
@@ -0,0 +1,60 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from social_media.hashtags import sync_hashtags
+from social_media.models import Post, ScheduledPost
+from social_media.staging import attach_staged_image
+from social_media_api import settings
+
+
+def claim_due_posts(batch_size: int) -> list:
+    """Lock a batch of due scheduled posts, skipping rows other workers hold"""
+    return list(
+        ScheduledPost.objects.select_for_update(
+            skip_locked=connection.features.has_select_for_update_skip_locked
+        )
+        .filter(status=ScheduledPost.Status.PENDING, post_at__lte=timezone.now())
+        .order_by("post_at")[:batch_size]
+    )
+
+
+def publish_scheduled_posts(scheduled_posts: list) -> list:
+    """Create posts of claimed scheduled posts with a single INSERT"""
+    posts = []
+    for scheduled in scheduled_posts:
+        post = Post(user_id=scheduled.user_id, content=scheduled.content)
+        if scheduled.image:
+            attach_staged_image(post, scheduled.image.name, scheduled.image_name)
+        posts.append(post)
+    Post.objects.bulk_create(posts)
+
+    for scheduled, post in zip(scheduled_posts, posts):
+        scheduled.status = ScheduledPost.Status.PUBLISHED
+        scheduled.post = post
+        scheduled.image = None
+    ScheduledPost.objects.bulk_update(scheduled_posts, ["status", "post", "image"])
+
+    # bulk_create sends no post_save: run its side effects here
+    sync_hashtags(posts)
+    return posts
+
+
+def dispatch_scheduled_posts(on_published=None) -> int:
+    """
+    Publish due scheduled posts batch by batch, one transaction per batch,
+    so memory stays bounded however many posts are pending
+    """
+    batch_size = settings.SCHEDULED_POSTS_BATCH_SIZE
+    published = 0
+    for __ in range(settings.SCHEDULED_POSTS_MAX_BATCHES):
+        with transaction.atomic():
+            due = claim_due_posts(batch_size)
+            if not due:
+                break
+            posts = publish_scheduled_posts(due)
+            if on_published:
+                transaction.on_commit(lambda posts=posts: on_published(posts))
+        published += len(posts)
+        if len(due) < batch_size:
+            break
+    return published
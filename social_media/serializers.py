@@ -1,7 +1,100 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from social_media import images
+from social_media.models import Post, Comment, ScheduledPost
+from social_media_api import settings
+
+
+def variant_urls(variants: dict, request) -> dict:
+    urls = {}
+    for variant, name in variants.items():
+        url = default_storage.url(name)
+        urls[variant] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+class ImageVariantsField(serializers.Field):
+    """{variant: url} of resized renditions of an image"""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        return variant_urls(variants, self.context.get("request"))
+
+
+class ReplacedImageMixin:
+    """
+    Updates release the replaced image on commit (a file or a blob reference),
+    a cleared image its variants too. New variants replace the old ones.
+    """
+
+    image_field = "image"
+
+    def update(self, instance, validated_data):
+        if self.image_field not in validated_data:
+            return super().update(instance, validated_data)
+        replaced = getattr(instance, self.image_field).name
+        instance = super().update(instance, validated_data)
+        if replaced:
+            transaction.on_commit(partial(default_storage.delete, replaced))
+        if not getattr(instance, self.image_field) and instance.image_variants:
+            variants, instance.image_variants = instance.image_variants, {}
+            instance.save(update_fields=["image_variants"])
+            transaction.on_commit(partial(images.delete_variants, variants))
+        return instance
+
 
-from social_media.models import Post, Comment
+class RelatedEmailsField(serializers.Field):
+    """Emails of users of relation rows (Like, Follow), ex. ["a@b.com"]"""
+
+    def __init__(self, user_attr: str, **kwargs):
+        self.user_attr = user_attr
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, rows):
+        return [getattr(row, self.user_attr).email for row in rows]
+
+
+def field_names_param(value: str) -> set:
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets of read responses: ?fields=a,b keeps only listed fields,
+    ?exclude=a,b drops them, ?embed=0 drops embedded relation previews
+    """
+
+    embedded_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is not None and request.method in SAFE_METHODS:
+            kept = self.sparse_fields(request)
+            for field_name in set(self.fields) - kept:
+                self.fields.pop(field_name)
+
+    @classmethod
+    def sparse_fields(cls, request) -> set:
+        """Names of fields serialized for the request"""
+        names = set(cls.Meta.fields)
+        params = request.query_params
+        if params.get("fields"):
+            names &= field_names_param(params["fields"])
+        names -= field_names_param(params.get("exclude", ""))
+        if params.get("embed", "1").lower() in ("0", "false"):
+            names -= set(cls.embedded_fields)
+        return names
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -18,26 +111,40 @@ class UserProfileSerializer(serializers.ModelSerializer):
             "followers",
             "profile_picture",
         )
+        # followers are changed by follow / unfollow only, see relations
         read_only_fields = (
             "email",
             "full_name",
+            "followers",
             "profile_picture",
         )
 
 
-class UserProfilePictureSerializer(serializers.ModelSerializer):
+class UserProfilePictureSerializer(ReplacedImageMixin, serializers.ModelSerializer):
+    image_field = "profile_picture"
+    profile_picture_variants = ImageVariantsField(source="image_variants")
+
     class Meta:
         model = get_user_model()
-        fields = ("id", "email", "full_name", "profile_picture")
+        fields = (
+            "id",
+            "email",
+            "full_name",
+            "profile_picture",
+            "profile_picture_variants",
+        )
         read_only_fields = (
             "email",
             "full_name",
         )
 
 
-class UserProfileListSerializer(serializers.ModelSerializer):
+class UserProfileListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     followers_count = serializers.IntegerField(read_only=True)
     followed_by_count = serializers.IntegerField(read_only=True)
+    is_following = serializers.BooleanField(read_only=True)
+    follows_me = serializers.BooleanField(read_only=True)
+    profile_picture_variants = ImageVariantsField(source="image_variants")
 
     class Meta:
         model = get_user_model()
@@ -48,19 +155,31 @@ class UserProfileListSerializer(serializers.ModelSerializer):
             "location",
             "followers_count",
             "followed_by_count",
+            "is_following",
+            "follows_me",
             "profile_picture",
+            "profile_picture_variants",
         )
 
 
-class UserProfileDetailSerializer(serializers.ModelSerializer):
+class UserProfileDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     followers_count = serializers.IntegerField(read_only=True)
-    followers = serializers.SlugRelatedField(
-        slug_field="email", read_only=True, many=True
+    followers = RelatedEmailsField(source="followers_preview", user_attr="to_user")
+    followers_url = serializers.HyperlinkedIdentityField(
+        view_name="social_media:profiles-get-followers"
     )
     followed_by_count = serializers.IntegerField(read_only=True)
-    followed_by = serializers.SlugRelatedField(
-        slug_field="email", read_only=True, many=True
+    followed_by = RelatedEmailsField(
+        source="followed_by_preview", user_attr="from_user"
+    )
+    followed_by_url = serializers.HyperlinkedIdentityField(
+        view_name="social_media:profiles-get-followed-by"
     )
+    is_following = serializers.BooleanField(read_only=True)
+    follows_me = serializers.BooleanField(read_only=True)
+    profile_picture_variants = ImageVariantsField(source="image_variants")
+
+    embedded_fields = ("followers", "followed_by")
 
     class Meta:
         model = get_user_model()
@@ -72,13 +191,20 @@ class UserProfileDetailSerializer(serializers.ModelSerializer):
             "location",
             "followers_count",
             "followers",
+            "followers_url",
             "followed_by_count",
             "followed_by",
+            "followed_by_url",
+            "is_following",
+            "follows_me",
             "profile_picture",
+            "profile_picture_variants",
         )
 
 
-class UserFollowSerializer(serializers.ModelSerializer):
+class UserFollowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    profile_picture_variants = ImageVariantsField(source="image_variants")
+
     class Meta:
         model = get_user_model()
         fields = (
@@ -86,6 +212,7 @@ class UserFollowSerializer(serializers.ModelSerializer):
             "email",
             "full_name",
             "profile_picture",
+            "profile_picture_variants",
         )
         read_only_fields = (
             "email",
@@ -94,7 +221,7 @@ class UserFollowSerializer(serializers.ModelSerializer):
         )
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.SlugRelatedField(slug_field="email", read_only=True)
 
     class Meta:
@@ -110,12 +237,14 @@ class CommentSerializer(serializers.ModelSerializer):
         ordering = ("-created_at",)
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(ReplacedImageMixin, serializers.ModelSerializer):
     post_at = serializers.DateTimeField(write_only=False, required=False)
 
     class Meta:
         model = Post
         fields = ("id", "content", "created_at", "post_at", "image", "likes")
+        # likes are changed by like / unlike only, see relations
+        read_only_fields = ("likes",)
 
 
 class PostUpdateSerializer(serializers.ModelSerializer):
@@ -128,13 +257,16 @@ class PostUpdateSerializer(serializers.ModelSerializer):
         )
 
 
-class PostImageSerializer(serializers.ModelSerializer):
+class PostImageSerializer(ReplacedImageMixin, serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Post
         fields = (
             "id",
             "user",
             "image",
+            "image_variants",
         )
         read_only_fields = ("user",)
 
@@ -145,10 +277,12 @@ class PostLikeSerializer(serializers.ModelSerializer):
         fields = ("id",)
 
 
-class PostListSerializer(serializers.ModelSerializer):
+class PostListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.SlugRelatedField(slug_field="email", read_only=True)
     likes_count = serializers.IntegerField(read_only=True)
     comments_count = serializers.IntegerField(read_only=True)
+    liked_by_me = serializers.BooleanField(read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Post
@@ -159,17 +293,29 @@ class PostListSerializer(serializers.ModelSerializer):
             "created_at",
             "likes_count",
             "comments_count",
+            "liked_by_me",
             "image",
+            "image_variants",
         )
         ordering = ("created_at",)
 
 
-class PostDetailSerializer(serializers.ModelSerializer):
+class PostDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.SlugRelatedField(slug_field="email", read_only=True)
-    likes = serializers.SlugRelatedField(slug_field="email", read_only=True, many=True)
+    likes = RelatedEmailsField(source="likes_preview", user_attr="user")
+    likes_url = serializers.HyperlinkedIdentityField(
+        view_name="social_media:posts-likers"
+    )
     likes_count = serializers.IntegerField(read_only=True)
+    liked_by_me = serializers.BooleanField(read_only=True)
     comments_count = serializers.IntegerField(read_only=True)
-    comments = CommentSerializer(read_only=True, many=True)
+    comments = CommentSerializer(source="comments_preview", read_only=True, many=True)
+    comments_url = serializers.HyperlinkedIdentityField(
+        view_name="social_media:posts-comments"
+    )
+    image_variants = ImageVariantsField()
+
+    embedded_fields = ("likes", "comments")
 
     class Meta:
         model = Post
@@ -179,9 +325,45 @@ class PostDetailSerializer(serializers.ModelSerializer):
             "content",
             "created_at",
             "image",
+            "image_variants",
             "likes_count",
+            "liked_by_me",
             "likes",
+            "likes_url",
             "comments_count",
             "comments",
+            "comments_url",
         )
         read_only_fields = ("image",)
+
+
+class ScheduledPostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ScheduledPost
+        fields = ("id", "content", "image", "post_at", "status", "created_at")
+        read_only_fields = fields
+
+
+def relation_ids_field(**kwargs):
+    kwargs.setdefault("required", False)
+    if not kwargs["required"]:
+        kwargs.setdefault("default", list)
+    return serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=settings.RELATION_BATCH_MAX_SIZE,
+        **kwargs,
+    )
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    like = relation_ids_field()
+    unlike = relation_ids_field()
+
+
+class FollowBatchSerializer(serializers.Serializer):
+    follow = relation_ids_field()
+    unfollow = relation_ids_field()
+
+
+class RelationLookupSerializer(serializers.Serializer):
+    ids = relation_ids_field(required=True, min_length=1)
@@ -0,0 +1,166 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from social_media import images, profile_cache
+from social_media.hashtags import sync_hashtags
+from social_media.models import Post, Comment, Like
+from social_media.storage import MEDIA_FIELDS
+from social_media.tasks import fan_out_post, backfill_timeline, prune_timeline
+from user.models import Follow
+
+
+def deleted_along(origin, model) -> bool:
+    """Row is deleted in the cascade of model objects, with their counters"""
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+def follow_pairs(instance, reverse: bool, pk_set) -> list:
+    """(follower_id, followed_id) pairs touched by a User.followers change"""
+    if reverse:
+        return [(instance.pk, pk) for pk in pk_set]
+    return [(pk, instance.pk) for pk in pk_set]
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out_post.delay(instance.pk))
+
+
+@receiver(post_save, sender=Post)
+def post_content_saved(sender, instance, update_fields, **kwargs):
+    if update_fields is None or "content" in update_fields:
+        sync_hashtags([instance])
+
+
+def media_deleted(sender, instance, field_name, **kwargs):
+    # stored file and image variants of the row: files / blob references
+    file = getattr(instance, field_name)
+    if file:
+        transaction.on_commit(partial(file.storage.delete, file.name))
+    variants = getattr(instance, "image_variants", None)
+    if variants:
+        transaction.on_commit(partial(images.delete_variants, variants))
+
+
+for model_label, field_name in MEDIA_FIELDS:
+    post_delete.connect(
+        partial(media_deleted, field_name=field_name),
+        sender=model_label,
+        weak=False,
+        dispatch_uid=f"media_deleted:{model_label}",
+    )
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def likes_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # rows added by the m2m manager are bulk inserted without post_save,
+    # removed ones (remove, clear) are deleted one by one: see like_deleted
+    if action != "post_add" or not pk_set:
+        return
+    if reverse:
+        posts, delta = Post.objects.filter(pk__in=pk_set), 1
+    else:
+        posts, delta = Post.objects.filter(pk=instance.pk), len(pk_set)
+    posts.update(likes_count=F("likes_count") + delta, updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Like)
+def like_created(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            likes_count=F("likes_count") + 1, updated_at=timezone.now()
+        )
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, origin=None, **kwargs):
+    if deleted_along(origin, Post):
+        return
+    Post.objects.filter(pk=instance.post_id).update(
+        likes_count=F("likes_count") - 1, updated_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    # comments are embedded in post detail: an edit changes the post too
+    counters = {"comments_count": F("comments_count") + 1} if created else {}
+    Post.objects.filter(pk=instance.post_id).update(
+        updated_at=timezone.now(), **counters
+    )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    if deleted_along(origin, Post):
+        return
+    Post.objects.filter(pk=instance.post_id).update(
+        comments_count=F("comments_count") - 1, updated_at=timezone.now()
+    )
+
+
+@receiver(m2m_changed, sender=Follow)
+def followers_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # bulk inserted by the m2m manager, removed rows: see follow_deleted
+    if action != "post_add" or not pk_set:
+        return
+    own_counter, other_counter = "followers_count", "followed_by_count"
+    if reverse:
+        own_counter, other_counter = other_counter, own_counter
+    users = get_user_model().objects
+    now = timezone.now()
+    users.filter(pk=instance.pk).update(
+        **{own_counter: F(own_counter) + len(pk_set)}, updated_at=now
+    )
+    users.filter(pk__in=pk_set).update(
+        **{other_counter: F(other_counter) + 1}, updated_at=now
+    )
+
+    profile_cache.invalidate(instance.pk, *pk_set)
+    for follower_id, followed_id in follow_pairs(instance, reverse, pk_set):
+        transaction.on_commit(
+            lambda args=(follower_id, followed_id): backfill_timeline.delay(*args)
+        )
+
+
+def count_follow(follow: Follow, delta: int) -> None:
+    users = get_user_model().objects
+    now = timezone.now()
+    users.filter(pk=follow.from_user_id).update(
+        followers_count=F("followers_count") + delta, updated_at=now
+    )
+    users.filter(pk=follow.to_user_id).update(
+        followed_by_count=F("followed_by_count") + delta, updated_at=now
+    )
+    profile_cache.invalidate(follow.from_user_id, follow.to_user_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        count_follow(instance, 1)
+        args = (instance.to_user_id, instance.from_user_id)
+        transaction.on_commit(lambda: backfill_timeline.delay(*args))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    # also sent for m2m remove() / clear() and the follows of a deleted user
+    count_follow(instance, -1)
+    args = (instance.to_user_id, instance.from_user_id)
+    transaction.on_commit(lambda: prune_timeline.delay(*args))
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def profile_changed(sender, instance, **kwargs):
+    profile_cache.invalidate(instance.pk)
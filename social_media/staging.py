@@ -0,0 +1,95 @@
+import os
+import pathlib
+import shutil
+import uuid
+from datetime import datetime, timezone
+from functools import partial
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from social_media_api import settings
+
+STAGING_DIR = "upload/staging"
+
+
+def staged_image_path(instance, filename: str) -> str:
+    """
+    Staging path of an image of a scheduled post.
+    The publish time is a part of the name to find orphaned files later.
+    """
+    return (
+        f"{STAGING_DIR}/{int(instance.post_at.timestamp())}-{uuid.uuid4().hex}"
+        + pathlib.Path(filename).suffix.lower()
+    )
+
+
+def attach_staged_image(post, staged_name: str, original_name: str) -> None:
+    """
+    Give the staged file to the post image path without re-encoding it.
+    The staged file is only removed on commit: a rolled back publish
+    leaves it to its still pending scheduled post.
+    """
+    if getattr(default_storage, "content_addressed", False):
+        # blob is shared: the reference moves from scheduled post to post
+        post.image.name = staged_name
+        return
+
+    name = post.image.field.generate_filename(post, original_name)
+    try:
+        source, target = default_storage.path(staged_name), default_storage.path(name)
+    except NotImplementedError:
+        # remote storage: no rename, fall back to copy
+        with default_storage.open(staged_name) as staged:
+            post.image.save(original_name, File(staged), save=False)
+        transaction.on_commit(partial(default_storage.delete, staged_name))
+        return
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        # a second name of the same file, no copy
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+    post.image.name = name
+    transaction.on_commit(partial(os.remove, source))
+
+
+def cleanup_staged_uploads(batch_size: int = 1000) -> int:
+    """
+    Delete staged files long after their publish time
+    that no pending scheduled post refers to.
+
+    Content-addressed storage stages nothing under STAGING_DIR: the image
+    of a scheduled post is a blob reference, moved to the post, released
+    on cancel or delete, and unreferenced blobs are deleted by gc_media_blobs.
+    """
+    from social_media.models import ScheduledPost
+
+    if getattr(default_storage, "content_addressed", False):
+        return 0
+    if not default_storage.exists(STAGING_DIR):
+        return 0
+    deadline = datetime.now(timezone.utc) - settings.STAGED_UPLOAD_GRACE_PERIOD
+
+    expired = []
+    for filename in default_storage.listdir(STAGING_DIR)[1]:
+        publish_at = filename.split("-", 1)[0]
+        if publish_at.isdigit() and (
+            datetime.fromtimestamp(int(publish_at), timezone.utc) < deadline
+        ):
+            expired.append(f"{STAGING_DIR}/{filename}")
+
+    deleted = 0
+    for start in range(0, len(expired), batch_size):
+        names = expired[start : start + batch_size]
+        pending = set(
+            ScheduledPost.objects.filter(
+                image__in=names, status=ScheduledPost.Status.PENDING
+            ).values_list("image", flat=True)
+        )
+        for name in set(names) - pending:
+            default_storage.delete(name)
+            deleted += 1
+    return deleted
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import pathlib
+import tempfile
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+# (model, file field) of every stored media reference
+MEDIA_FIELDS = (
+    ("social_media.Post", "image"),
+    ("social_media.ScheduledPost", "image"),
+    ("user.User", "profile_picture"),
+)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage keeping every unique file once,
+    named by SHA-256 of its content: blobs/ab/cd/<digest><ext>.
+    Saving a file already stored only increments its reference count,
+    deleting one decrements it (rows release their files on delete);
+    unreferenced blobs are deleted by the gc_media_blobs command.
+    """
+
+    content_addressed = True
+    blob_dir = "blobs"
+
+    def blob_name(self, digest: str, name: str) -> str:
+        suffix = pathlib.PurePosixPath(name).suffix.lower()
+        return f"{self.blob_dir}/{digest[:2]}/{digest[2:4]}/{digest}{suffix}"
+
+    def is_blob(self, name: str) -> bool:
+        return str(name).startswith(self.blob_dir + "/")
+
+    def get_available_name(self, name, max_length=None):
+        # final name is computed from the content in _save()
+        return name
+
+    def _save(self, name, content):
+        os.makedirs(self.location, exist_ok=True)
+        digest, size = hashlib.sha256(), 0
+        with tempfile.NamedTemporaryFile(
+            dir=self.location, prefix=".upload-", delete=False
+        ) as temporary:
+            if hasattr(content, "seek") and content.seekable():
+                content.seek(0)
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temporary.write(chunk)
+                size += len(chunk)
+
+        blob_name = self.blob_name(digest.hexdigest(), name)
+        try:
+            self.retain(digest.hexdigest(), blob_name, size, temporary.name)
+        finally:
+            if os.path.exists(temporary.name):
+                os.unlink(temporary.name)
+        return blob_name
+
+    def retain(self, digest: str, blob_name: str, size: int, source: str) -> None:
+        """
+        Count a new reference to blob, write its file if not stored yet.
+        The row is rolled back with the caller, the file is not: gc sweeps it.
+        """
+        from social_media.models import MediaBlob
+
+        path = self.path(blob_name)
+        with transaction.atomic():
+            blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                digest=digest, defaults={"name": blob_name, "size": size}
+            )
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") + 1)
+            if created or not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._set_permissions(source)
+                os.replace(source, path)
+
+    def retain_name(self, name: str) -> None:
+        """Count one more reference to an already stored blob"""
+        from social_media.models import MediaBlob
+
+        MediaBlob.objects.filter(name=name).update(ref_count=F("ref_count") + 1)
+
+    def _set_permissions(self, path: str) -> None:
+        # temporary files are created owner-only
+        os.chmod(path, self.file_permissions_mode or 0o644)
+
+    def delete(self, name):
+        """Blobs are shared: release a reference, gc deletes the file"""
+        from social_media.models import MediaBlob
+
+        if not self.is_blob(name):
+            return super().delete(name)
+        MediaBlob.objects.filter(name=name, ref_count__gt=0).update(
+            ref_count=F("ref_count") - 1
+        )
+
+    def delete_blob(self, name: str) -> None:
+        """Delete the file of a blob: gc only, references are not checked"""
+        super().delete(name)
+
+
+def media_references(batch_size: int = 5000) -> Counter:
+    """
+    Count references to every stored file: file fields + image variants.
+    Full scan for audits: reference counts of blobs are kept by the storage.
+    """
+    references = Counter()
+    for model_label, field_name in MEDIA_FIELDS:
+        model = apps.get_model(model_label)
+        fields = [field_name]
+        if any(field.name == "image_variants" for field in model._meta.fields):
+            fields.append("image_variants")
+        rows = model.objects.exclude(**{field_name: ""}).values_list(*fields)
+        for row in rows.iterator(chunk_size=batch_size):
+            references[row[0]] += 1
+            for name in (row[1] if len(row) > 1 else {}).values():
+                references[name] += 1
+    references.pop(None, None)
+    return references
+
+
+def collect_garbage(grace_period: timedelta, dry_run: bool = False) -> tuple:
+    """
+    Delete blobs without references and blob files without a MediaBlob row
+    (saved in a rolled back transaction), both older than grace_period.
+    Reference counts are trusted: only retain() and delete() change them.
+    Returns (deleted, swept).
+    """
+    from social_media.models import MediaBlob
+
+    if not getattr(default_storage, "content_addressed", False):
+        return 0, 0
+    deadline = timezone.now() - grace_period
+    unreferenced = MediaBlob.objects.filter(ref_count=0, created_at__lt=deadline)
+    deleted = 0
+    for pk in unreferenced.values_list("pk", flat=True).iterator(chunk_size=5000):
+        if dry_run:
+            deleted += 1
+            continue
+        with transaction.atomic():
+            # retained meanwhile: kept
+            blob = unreferenced.select_for_update().filter(pk=pk).first()
+            if blob:
+                default_storage.delete_blob(blob.name)
+                blob.delete()
+                deleted += 1
+    return deleted, sweep_untracked(deadline.timestamp(), dry_run)
+
+
+def sweep_untracked(deadline: float, dry_run: bool = False) -> int:
+    """Delete blob files modified before deadline that no MediaBlob row names"""
+    from social_media.models import MediaBlob
+
+    root = default_storage.path(default_storage.blob_dir)
+    swept = 0
+    # one query per blobs/ab/cd directory
+    for directory, __, filenames in os.walk(root):
+        old = [
+            os.path.relpath(path, default_storage.location)
+            for path in (os.path.join(directory, filename) for filename in filenames)
+            if os.path.getmtime(path) < deadline
+        ]
+        if not old:
+            continue
+        tracked = set(
+            MediaBlob.objects.filter(name__in=old).values_list("name", flat=True)
+        )
+        for name in set(old) - tracked:
+            if not dry_run:
+                default_storage.delete_blob(name)
+            swept += 1
+    return swept
@@ -1,41 +1,122 @@
 import base64
-import io
-import os
 
-from PIL import Image
 from celery import shared_task
+from django.apps import apps
 from django.contrib.auth import get_user_model
-from django.core.files import File
-
+from django.db import transaction
+from django.utils import timezone
+from django.core.files.base import ContentFile
 
+from social_media import (
+    images,
+    profile_cache,
+    scheduling,
+    staging,
+    timeline,
+)
 from social_media.models import Post
+from social_media.staging import attach_staged_image
+from social_media.storage import collect_garbage
+from social_media_api import settings
 
 
 @shared_task
 def publish_post(content, image_data, user_id):
+    """Publish a post of ETA task queued before the scheduled post store"""
 
     creator = get_user_model().objects.get(pk=user_id)
 
-    if image_data:
-        byte_data = image_data["image"].encode(encoding="utf-8")
-        b = base64.b64decode(byte_data)
-        img = Image.open(io.BytesIO(b))
-        img.save(image_data["name"], format=img.format)
-
-        with open(image_data["name"], "rb") as file:
-            picture = File(file)
-            post = Post.objects.create(
-                content=content,
-                image=picture,
-                user=creator,
-            )
-        os.remove(image_data["name"])
-    else:
-        post = Post.objects.create(
-            content=content,
-            image=None,
-            user=creator,
-        )
+    post = Post(content=content, user=creator)
+    if image_data and "path" in image_data:
+        attach_staged_image(post, image_data["path"], image_data["name"])
+    elif image_data:
+        # payload of tasks scheduled before uploads were staged
+        image = ContentFile(base64.b64decode(image_data["image"]))
+        post.image.save(image_data["name"], image, save=False)
+    post.save()
+    if post.image:
+        schedule_image_variants(post, "image")
+
     result = f"Post #{post.pk} added"
     print(result)
     return result
+
+
+@shared_task
+def dispatch_scheduled_posts():
+    def fan_out(posts):
+        for post in posts:
+            fan_out_post.delay(post.pk)
+            if post.image:
+                generate_image_variants.delay("social_media.Post", post.pk, "image")
+
+    published = scheduling.dispatch_scheduled_posts(on_published=fan_out)
+    return f"Scheduled posts published: {published}"
+
+
+@shared_task
+def cleanup_staged_uploads():
+    return f"Staged uploads deleted: {staging.cleanup_staged_uploads()}"
+
+
+@shared_task
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return f"Post #{post_id} not found"
+    return f"Post #{post_id} added to {timeline.fan_out_post(post)} timelines"
+
+
+@shared_task
+def backfill_timeline(owner_id, author_id):
+    added = timeline.backfill_timeline(
+        owner_id, author_id, limit=settings.TIMELINE_BACKFILL_SIZE
+    )
+    return f"Timeline of user #{owner_id}: {added} posts of #{author_id} added"
+
+
+@shared_task
+def prune_timeline(owner_id, author_id):
+    deleted = timeline.prune_timeline(owner_id, author_id)
+    return f"Timeline of user #{owner_id}: {deleted} posts of #{author_id} deleted"
+
+
+@shared_task
+def gc_media_blobs():
+    deleted, swept = collect_garbage(settings.MEDIA_BLOB_GC_GRACE_PERIOD)
+    return f"Media blobs deleted: {deleted}, untracked files deleted: {swept}"
+
+
+@shared_task
+def generate_image_variants(model_label, pk, field_name):
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).only(field_name).first()
+    if instance is None or not getattr(instance, field_name):
+        return f"{model_label} #{pk}: no image"
+
+    name = getattr(instance, field_name).name
+    variants = images.render_variants(name)
+    rows = model.objects.filter(pk=pk, **{field_name: name})
+    with transaction.atomic():
+        # variants replaced by a concurrent run are released, not leaked
+        replaced = (
+            rows.select_for_update().values_list("image_variants", flat=True).first()
+        )
+        if replaced is not None:
+            rows.update(image_variants=variants, updated_at=timezone.now())
+    if replaced is not None:
+        images.delete_variants(replaced, keep=variants)
+        if model is get_user_model():
+            profile_cache.invalidate(pk)
+    else:
+        # image was replaced meanwhile
+        images.delete_variants(variants)
+    return f"{model_label} #{pk}: {len(variants)} image variants"
+
+
+def schedule_image_variants(instance, field_name):
+    transaction.on_commit(
+        lambda: generate_image_variants.delay(
+            instance._meta.label, instance.pk, field_name
+        )
+    )
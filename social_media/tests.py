@@ -1,3 +1,1798 @@
+import base64
+import datetime
+import decimal
+import io
+import json
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+from PIL import Image
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.fields.files import FieldFile
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from social_media import (
+    images,
+    post_cache,
+    profile_cache,
+    relations,
+    scheduling,
+    staging,
+    storage,
+    tasks,
+)
+from social_media.models import (
+    Comment,
+    Like,
+    MediaBlob,
+    Post,
+    PostTag,
+    ScheduledPost,
+    TimelineEntry,
+)
+from social_media.pagination import PostPagination, TimelinePagination
+from social_media.renderers import FastJSONRenderer
+from social_media.serializers import (
+    PostImageSerializer,
+    PostListSerializer,
+    UserProfileListSerializer,
+)
+from social_media.storage import collect_garbage
+from social_media.timeline import fan_out_post
+from social_media.views import PostViewSet, ScheduledPostViewSet, UserProfileViewSet
+from social_media_api import profiling, settings
+from social_media_api.celery import app
+from social_media_api.querybudget import (
+    TRANSACTION_CONTROL,
+    QueryBudgetTestMixin,
+    QueryLog,
+    query_log,
+)
+from user.authentication import CachedJWTAuthentication
+from user.models import Follow
+
+
+class FastListSerializationTests(TestCase):
+    """Fast path of list endpoints returns the same bytes as serializers"""
+
+    def setUp(self):
+        users = get_user_model().objects
+        self.viewer = users.create_user("viewer@test.com", "pass12345")
+        self.author = users.create_user(
+            "zoe@test.com", "pass12345", first_name="Zoë", last_name="李"
+        )
+        self.other = users.create_user("other@test.com", "pass12345", last_name="X")
+        users.filter(pk=self.author.pk).update(
+            profile_picture="upload/user/zoe.jpg",
+            image_variants={"thumbnail": "upload/user/variants/zoe-thumbnail.webp"},
+        )
+        relations.follow_user(self.viewer.id, self.author.id)
+        relations.follow_user(self.author.id, self.viewer.id)
+
+        contents = [
+            'quotes " \\ and\nnew\tlines #news',
+            "emoji 😀 é \u2028 \u2029 \x01",
+            "",
+        ]
+        for content in contents:
+            post = Post.objects.create(user=self.author, content=content)
+            fan_out_post(post)
+        post = Post.objects.create(
+            user=self.viewer,
+            content="with image #news",
+            image="upload/post/image.jpg",
+            image_variants={"small": "upload/post/variants/image-small.webp"},
+        )
+        fan_out_post(post)
+        relations.like_post(self.viewer.id, post.id)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def assert_same_bytes(self, viewset, serializer_class, url):
+        with mock.patch.object(viewset, "fast_list", False):
+            expected = self.client.get(url)
+        profile_cache.profile_cache().clear()
+        with mock.patch.object(viewset, "fast_list", True), mock.patch.object(
+            serializer_class, "to_representation", side_effect=AssertionError
+        ):
+            actual = self.client.get(url)
+        self.assertEqual(expected.status_code, 200)
+        self.assertEqual(actual.status_code, 200)
+        self.assertEqual(actual.content, expected.content)
+        return actual
+
+    def test_post_list(self):
+        for url in (
+            "/api/posts/",
+            "/api/posts/?tag=news",
+            "/api/posts/?fields=id,user,image",
+            "/api/posts/?exclude=liked_by_me,content",
+        ):
+            self.assert_same_bytes(PostViewSet, PostListSerializer, url)
+
+    def test_post_list_next_page(self):
+        response = self.assert_same_bytes(
+            PostViewSet, PostListSerializer, "/api/posts/?page_size=2"
+        )
+        self.assert_same_bytes(PostViewSet, PostListSerializer, response.data["next"])
+
+    def test_profile_list(self):
+        for url in (
+            "/api/profiles/",
+            "/api/profiles/?name=zo",
+            "/api/profiles/?fields=id,full_name,follows_me",
+        ):
+            self.assert_same_bytes(UserProfileViewSet, UserProfileListSerializer, url)
+
+    def test_anonymous_profile_list(self):
+        self.client.force_authenticate(None)
+        self.assert_same_bytes(
+            UserProfileViewSet, UserProfileListSerializer, "/api/profiles/"
+        )
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Read endpoints stay within budget with constant queries as data grows"""
+
+    def setUp(self):
+        users = get_user_model().objects
+        self.viewer = users.create_user("viewer@test.com", "pass12345")
+        self.author = users.create_user("author@test.com", "pass12345")
+        relations.follow_user(self.viewer.id, self.author.id)
+        self.post = Post.objects.create(user=self.author, content="first #news")
+        fan_out_post(self.post)
+        self.comment = Comment.objects.create(
+            post=self.post, user=self.viewer, message="first"
+        )
+        self.size = 0
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        # with the watermark queries of ETags
+        enabled = mock.patch.object(settings, "CONDITIONAL_GET", True)
+        enabled.start()
+        self.addCleanup(enabled.stop)
+
+    def grow(self, size):
+        users = get_user_model().objects
+        while self.size < size:
+            self.size += 1
+            user = users.create_user(f"user{self.size}@test.com", "pass12345")
+            post = Post.objects.create(
+                user=user if self.size % 2 else self.author,
+                content=f"post {self.size} #news",
+            )
+            fan_out_post(post)
+            relations.follow_user(user.id, self.author.id)
+            relations.follow_user(self.viewer.id, user.id)
+            relations.follow_user(user.id, self.viewer.id)
+            relations.like_post(user.id, self.post.id)
+            relations.like_post(self.viewer.id, post.id)
+            Comment.objects.create(post=self.post, user=user, message="comment")
+            Comment.objects.create(post=post, user=self.viewer, message="comment")
+
+    def test_post_endpoints(self):
+        urls = (
+            "/api/posts/",
+            "/api/posts/?tag=news",
+            f"/api/posts/{self.post.pk}/",
+            f"/api/posts/{self.post.pk}/comments/",
+            f"/api/posts/{self.post.pk}/likers/",
+            "/api/posts/liked_posts/",
+        )
+        with mock.patch.object(post_cache, "cached_payload") as cached:
+            cached.side_effect = lambda pk, version, request, build: (
+                build(),
+                "MISS",
+                False,
+            )
+            self.assertConstantQueries(urls, self.grow)
+
+    def test_profile_endpoints(self):
+        urls = (
+            "/api/profiles/",
+            "/api/profiles/?name=user",
+            f"/api/profiles/{self.author.pk}/",
+            f"/api/profiles/{self.author.pk}/followers/",
+            f"/api/profiles/{self.viewer.pk}/followed-by/",
+        )
+        with mock.patch.object(profile_cache, "cached_response") as cached:
+            cached.side_effect = lambda key, compute: compute()
+            self.assertConstantQueries(urls, self.grow)
+
+    def test_comment_endpoints(self):
+        urls = ("/api/comments/", f"/api/comments/{self.comment.pk}/")
+        self.assertConstantQueries(urls, self.grow)
+
+    def test_transaction_statements_not_counted(self):
+        log, execute = QueryLog(), mock.Mock()
+        statements = (
+            "BEGIN",
+            'SAVEPOINT "s1"',
+            'RELEASE SAVEPOINT "s1"',
+            'ROLLBACK TO SAVEPOINT "s2"',
+            "COMMIT",
+            "SELECT 1",
+        )
+        for sql in statements:
+            log(execute, sql, None, False, {})
+        self.assertEqual(log.shapes, {"SELECT 1": 1})
+        self.assertEqual(execute.call_count, len(statements))
+
+        with query_log() as log:
+            response = self.client.post("/api/posts/", {"content": "new #news"})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse([sql for sql in log.shapes if TRANSACTION_CONTROL.match(sql)])
+
+
+class HomeTimelineTests(TestCase):
+    def setUp(self):
+        users = get_user_model().objects
+        self.viewer = users.create_user("viewer@test.com", "pass12345")
+        self.author = users.create_user("author@test.com", "pass12345")
+        self.fan = users.create_user("fan@test.com", "pass12345")
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def feed(self) -> list:
+        response = self.client.get("/api/posts/")
+        self.assertEqual(response.status_code, 200)
+        return [post["id"] for post in response.data["results"]]
+
+    def post(self, user, content="post") -> Post:
+        post = Post.objects.create(user=user, content=content)
+        fan_out_post(post)
+        return post
+
+    def test_own_and_followed_posts(self):
+        relations.follow_user(self.viewer.id, self.author.id)
+        followed = self.post(self.author)
+        own = self.post(self.viewer)
+        self.post(self.fan)
+        self.assertEqual(self.feed(), [own.id, followed.id])
+
+    @mock.patch.object(settings, "TIMELINE_FANOUT_MAX_FOLLOWERS", 2)
+    def test_author_crossing_celebrity_threshold(self):
+        relations.follow_user(self.viewer.id, self.author.id)
+        relations.follow_user(self.fan.id, self.author.id)
+        # fanned out to the author, viewer and fan
+        before = self.post(self.author)
+
+        late_fan = get_user_model().objects.create_user("late@test.com", "pass12345")
+        relations.follow_user(late_fan.id, self.author.id)
+        # celebrity now: read from the author's posts on read
+        after = self.post(self.author)
+
+        self.assertEqual(self.feed(), [after.id, before.id])
+
+    @mock.patch.object(settings, "TIMELINE_FANOUT_MAX_FOLLOWERS", 2)
+    def test_author_dropping_below_celebrity_threshold(self):
+        late_fan = get_user_model().objects.create_user("late@test.com", "pass12345")
+        for follower in (self.viewer, self.fan, late_fan):
+            relations.follow_user(follower.id, self.author.id)
+        # not fanned out: read from the author's posts
+        during = self.post(self.author)
+
+        relations.unfollow_user(late_fan.id, self.author.id)
+        after = self.post(self.author)
+        self.assertEqual(self.feed(), [after.id, during.id])
+
+        self.client.force_authenticate(late_fan)
+        relations.follow_user(late_fan.id, self.author.id)
+        tasks.backfill_timeline(late_fan.id, self.author.id)
+        self.assertEqual(self.feed(), [after.id, during.id])
+
+    def test_feed_pages_the_timeline_index(self):
+        relations.follow_user(self.viewer.id, self.author.id)
+        posts = [self.post(self.author) for __ in range(3)]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.feed(), [post.id for post in reversed(posts)])
+        entries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if 'FROM "social_media_timelineentry"' in query["sql"]
+        ]
+        self.assertEqual(len(entries), 1)
+        self.assertIn("ORDER BY", entries[0])
+        self.assertIn("LIMIT", entries[0])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@test.com", "pass12345")
+        self.posts = [
+            Post.objects.create(user=self.user, content=f"post {index}")
+            for index in range(7)
+        ]
+        for post in self.posts:
+            fan_out_post(post)
+        # ties of the first key are ordered by id
+        same_time = datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc)
+        tied = [post.pk for post in self.posts[1:6]]
+        Post.objects.filter(pk__in=tied).update(created_at=same_time)
+        TimelineEntry.objects.filter(post__in=tied).update(created_at=same_time)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, link="next") -> list:
+        """Ids of every page from url following the link"""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([item["id"] for item in response.data["results"]])
+            url = response.data[link]
+        return pages
+
+    def test_pages_follow_key_order_with_ties(self):
+        expected = list(
+            Post.objects.order_by(*PostPagination.ordering).values_list("id", flat=True)
+        )
+        pages = self.walk("/api/posts/?page_size=2")
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_previous_links_return_the_same_pages(self):
+        forward = self.walk("/api/posts/?page_size=3")
+        last_page = self.client.get("/api/posts/?page_size=3")
+        while last_page.data["next"]:
+            last_page = self.client.get(last_page.data["next"])
+        backward = self.walk(last_page.data["previous"], link="previous")
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_page_size_is_capped(self):
+        response = self.client.get("/api/posts/?page_size=0")
+        self.assertEqual(len(response.data["results"]), 1)
+        with mock.patch.object(TimelinePagination, "max_page_size", 3):
+            response = self.client.get("/api/posts/?page_size=1000")
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_invalid_cursors(self):
+        for cursor in (
+            "garbage",
+            "eyJwIjpbMV0sInIiOjB9",  # {"p":[1],"r":0}: key of one value
+            "eyJyIjowfQ==",  # {"r":0}: no position
+        ):
+            response = self.client.get(f"/api/posts/?cursor={cursor}")
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_malformed_cursor_positions(self):
+        day = "2024-05-01T00:00:00+00:00"
+        positions = (
+            ["yesterday", 1],
+            ["2024-13-01T00:00:00", 1],
+            [{"at": day}, 1],
+            [day, {"id": 1}],
+            [day, [1]],
+            [day, "one"],
+            [day, None],
+            [day, 10**30],
+        )
+        for url in (
+            "/api/posts/",
+            "/api/posts/?tag=news",
+            f"/api/posts/{self.posts[0].pk}/comments/",
+            "/api/scheduled-posts/",
+        ):
+            for position in positions:
+                data = json.dumps({"p": position, "r": 0}).encode()
+                cursor = base64.urlsafe_b64encode(data).decode()
+                response = self.client.get(url, {"cursor": cursor})
+                self.assertEqual(response.status_code, 404, (url, position))
+
+    def test_scheduled_posts_ascending_by_post_at(self):
+        post_at = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+        scheduled = [
+            ScheduledPost.objects.create(
+                user=self.user,
+                content=f"later {index}",
+                post_at=post_at + datetime.timedelta(hours=index % 2),
+            )
+            for index in range(5)
+        ]
+        expected = [
+            item.pk for item in sorted(scheduled, key=lambda s: (s.post_at, s.pk))
+        ]
+        pages = self.walk("/api/scheduled-posts/?page_size=2")
+        self.assertEqual(sum(pages, []), expected)
+
+
+class PostCountersTests(TestCase):
+    """likes_count / comments_count follow every way of writing the rows"""
+
+    def setUp(self):
+        users = get_user_model().objects
+        self.author = users.create_user("author@test.com", "pass12345")
+        self.fans = [
+            users.create_user(f"fan{index}@test.com", "pass12345") for index in range(3)
+        ]
+        self.post = Post.objects.create(user=self.author, content="post")
+        self.other = Post.objects.create(user=self.author, content="other")
+
+    def assert_counts(self, post, likes, comments=0):
+        post.refresh_from_db()
+        self.assertEqual((post.likes_count, post.comments_count), (likes, comments))
+        self.assertFalse(Post.counters_drift().exists())
+
+    def test_m2m_add_remove_clear(self):
+        self.post.likes.add(*self.fans)
+        self.post.likes.add(self.fans[0])
+        self.assert_counts(self.post, 3)
+        self.post.likes.remove(self.fans[0], self.author)
+        self.assert_counts(self.post, 2)
+        self.post.likes.clear()
+        self.assert_counts(self.post, 0)
+
+    def test_reverse_m2m_add_remove_clear(self):
+        fan = self.fans[0]
+        fan.user_likes.add(self.post, self.other)
+        self.assert_counts(self.post, 1)
+        self.assert_counts(self.other, 1)
+        fan.user_likes.remove(self.post)
+        self.assert_counts(self.post, 0)
+        fan.user_likes.clear()
+        self.assert_counts(self.other, 0)
+
+    def test_like_rows(self):
+        like = Like.objects.create(post=self.post, user=self.fans[0])
+        Like.objects.create(post=self.post, user=self.fans[1])
+        self.assert_counts(self.post, 2)
+        like.delete()
+        self.assert_counts(self.post, 1)
+        Like.objects.filter(post=self.post).delete()
+        self.assert_counts(self.post, 0)
+
+    def test_relations_writes(self):
+        fan = self.fans[0]
+        self.assertEqual(relations.like_post(fan.id, self.post.id), (True, 1))
+        self.assertEqual(relations.like_post(fan.id, self.post.id), (True, 1))
+        self.assertEqual(relations.unlike_post(fan.id, self.post.id), (False, 0))
+        self.assertEqual(relations.unlike_post(fan.id, self.post.id), (False, 0))
+        relations.batch_likes(fan.id, [self.post.id, self.other.id], [])
+        relations.batch_likes(fan.id, [], [self.post.id])
+        self.assert_counts(self.post, 0)
+        self.assert_counts(self.other, 1)
+
+    def test_batch_counts_own_inserts(self):
+        fan = self.fans[0]
+        insert = relations._insert
+
+        def insert_after_concurrent_request(through, **fields):
+            # liked by a concurrent request meanwhile, counted by that one
+            insert(through, **fields)
+            return insert(through, **fields)
+
+        with mock.patch.object(
+            relations, "_insert", side_effect=insert_after_concurrent_request
+        ):
+            relations.batch_likes(fan.id, [self.post.id, self.other.id], [])
+
+        for post in (self.post, self.other):
+            post.refresh_from_db()
+            self.assertEqual(post.likes_count, 0)
+
+    def test_comments(self):
+        comment = Comment.objects.create(post=self.post, user=self.fans[0], message="a")
+        Comment.objects.create(post=self.post, user=self.fans[1], message="b")
+        comment.message = "edited"
+        comment.save()
+        self.assert_counts(self.post, 0, comments=2)
+        comment.delete()
+        self.assert_counts(self.post, 0, comments=1)
+
+    def test_deleted_user_leaves_counts(self):
+        fan = self.fans[0]
+        self.post.likes.add(fan, self.fans[1])
+        Comment.objects.create(post=self.post, user=fan, message="a")
+        fan.delete()
+        self.assert_counts(self.post, 1)
+
+    def test_deleted_post(self):
+        self.post.likes.add(*self.fans)
+        Comment.objects.create(post=self.post, user=self.fans[0], message="a")
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.other.delete()
+        self.assertFalse(Like.objects.exists())
+
+
+class FollowCountersTests(TestCase):
+    """followers_count / followed_by_count follow every way of writing follows"""
+
+    def setUp(self):
+        users = get_user_model().objects
+        self.star, self.first, self.second = (
+            users.create_user(f"{name}@test.com", "pass12345")
+            for name in ("star", "first", "second")
+        )
+
+    def assert_counts(self, user, followers, followed_by):
+        user.refresh_from_db()
+        self.assertEqual(
+            (user.followers_count, user.followed_by_count), (followers, followed_by)
+        )
+        self.assertFalse(get_user_model().follow_counters_drift().exists())
+
+    def test_m2m_add_remove_clear(self):
+        self.star.followers.add(self.first, self.second)
+        self.star.followers.add(self.first)
+        self.assert_counts(self.star, 2, 0)
+        self.assert_counts(self.first, 0, 1)
+        self.star.followers.remove(self.first)
+        self.assert_counts(self.star, 1, 0)
+        self.assert_counts(self.first, 0, 0)
+        self.star.followers.clear()
+        self.assert_counts(self.star, 0, 0)
+        self.assert_counts(self.second, 0, 0)
+
+    def test_reverse_m2m_add_remove_clear(self):
+        self.first.followed_by.add(self.star, self.second)
+        self.assert_counts(self.first, 0, 2)
+        self.assert_counts(self.star, 1, 0)
+        self.first.followed_by.remove(self.star)
+        self.assert_counts(self.star, 0, 0)
+        self.first.followed_by.clear()
+        self.assert_counts(self.first, 0, 0)
+        self.assert_counts(self.second, 0, 0)
+
+    def test_follow_rows(self):
+        follow = Follow.objects.create(from_user=self.star, to_user=self.first)
+        Follow.objects.create(from_user=self.star, to_user=self.second)
+        self.assert_counts(self.star, 2, 0)
+        follow.delete()
+        self.assert_counts(self.star, 1, 0)
+        Follow.objects.filter(from_user=self.star).delete()
+        self.assert_counts(self.star, 0, 0)
+        self.assert_counts(self.second, 0, 0)
+
+    def test_relations_writes(self):
+        first = self.first.id
+        self.assertEqual(relations.follow_user(first, self.star.id), (True, 1))
+        self.assertEqual(relations.follow_user(first, self.star.id), (True, 1))
+        self.assertEqual(relations.unfollow_user(first, self.star.id), (False, 0))
+        self.assertEqual(relations.unfollow_user(first, self.star.id), (False, 0))
+        relations.batch_follows(first, [self.star.id, self.second.id], [])
+        relations.batch_follows(first, [], [self.star.id])
+        self.assert_counts(self.first, 0, 1)
+        self.assert_counts(self.second, 1, 0)
+        self.assert_counts(self.star, 0, 0)
+
+    def test_deleted_user_leaves_counts(self):
+        self.star.followers.add(self.first, self.second)
+        self.first.followers.add(self.star)
+        self.first.delete()
+        self.assert_counts(self.star, 1, 0)
+        self.assert_counts(self.second, 0, 1)
+
+
+class ConditionalGetTests(TestCase):
+    """304 of unchanged posts & profiles, new ETags after writes"""
+
+    def setUp(self):
+        users = get_user_model().objects
+        self.viewer = users.create_user("viewer@test.com", "pass12345")
+        self.author = users.create_user("author@test.com", "pass12345")
+        self.post = Post.objects.create(user=self.viewer, content="post")
+        fan_out_post(self.post)
+        fan_out_post(Post.objects.create(user=self.author, content="by author"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        # celery tasks of on_commit callbacks run in process
+        self.addCleanup(
+            setattr, app.conf, "task_always_eager", app.conf.task_always_eager
+        )
+        app.conf.task_always_eager = True
+        enabled = mock.patch.object(settings, "CONDITIONAL_GET", True)
+        enabled.start()
+        self.addCleanup(enabled.stop)
+
+    def etag(self, url) -> str:
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def write(self, method, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 300)
+
+    def assert_changed(self, url, etag, changed=True):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200 if changed else 304, url)
+
+    def test_lists_not_modified_without_building(self):
+        # page keys of the post index & their watermark, profile list version
+        for url, queries in (("/api/posts/", 3), ("/api/profiles/", 0)):
+            etag = self.etag(url)
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_details_not_modified(self):
+        for url in (f"/api/posts/{self.post.pk}/", f"/api/profiles/{self.viewer.pk}/"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            for header in (
+                {"HTTP_IF_NONE_MATCH": response["ETag"]},
+                {"HTTP_IF_MODIFIED_SINCE": response["Last-Modified"]},
+            ):
+                self.assertEqual(self.client.get(url, **header).status_code, 304)
+
+    def test_post_list_etag_changes_after_writes(self):
+        url = "/api/posts/"
+        writes = [
+            ("post", url, {"content": "new post"}),
+            ("put", f"{url}{self.post.pk}/my-like/", None),
+            ("post", f"{url}{self.post.pk}/comment/", {"message": "comment"}),
+            ("put", f"/api/profiles/{self.author.pk}/my-follow/", None),
+            ("patch", f"/api/profiles/{self.viewer.pk}/", {"bio": "new bio"}),
+        ]
+        for method, write_url, data in writes:
+            etag = self.etag(url)
+            self.write(method, write_url, data)
+            self.assert_changed(url, etag)
+
+    def test_post_list_etag_kept_by_other_feeds(self):
+        url = "/api/posts/"
+        etag = self.etag(url)
+        stranger = get_user_model().objects.create_user("x@test.com", "pass12345")
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(user=stranger, content="elsewhere")
+            relations.like_post(self.author.id, post.id)
+            relations.follow_user(stranger.id, self.author.id)
+        self.assert_changed(url, etag, changed=False)
+
+    def test_profile_etags_change_after_edit(self):
+        urls = ("/api/profiles/", f"/api/profiles/{self.viewer.pk}/")
+        etags = [self.etag(url) for url in urls]
+        self.write("patch", f"/api/profiles/{self.viewer.pk}/", {"bio": "new bio"})
+        for url, etag in zip(urls, etags):
+            self.assert_changed(url, etag)
+
+    def test_detail_etags_cover_embedded_users(self):
+        Comment.objects.create(post=self.post, user=self.author, message="hi")
+        relations.follow_user(self.author.id, self.viewer.id)
+        urls = (f"/api/posts/{self.post.pk}/", f"/api/profiles/{self.viewer.pk}/")
+        etags = [self.etag(url) for url in urls]
+
+        # emails of commenters and followers are embedded
+        self.author.email = "renamed@test.com"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+        for url, etag in zip(urls, etags):
+            self.assert_changed(url, etag)
+        # previews skipped: their users are not in the watermark
+        url = f"/api/posts/{self.post.pk}/?embed=0"
+        etag = self.etag(url)
+        self.author.first_name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+        self.assert_changed(url, etag, changed=False)
+
+    def test_startup_needs_shared_cache(self):
+        config = django_apps.get_app_config("social_media")
+        # local memory profile cache of tests
+        with self.assertRaises(ImproperlyConfigured):
+            config.ready()
+        with mock.patch.object(profile_cache, "profile_cache", mock.Mock):
+            config.ready()
+        with mock.patch.object(settings, "CONDITIONAL_GET", False):
+            config.ready()
+
+
+class HashtagFilterTests(TestCase):
+    """?tag= lists timeline posts of a hashtag from the PostTag index"""
+
+    def setUp(self):
+        users = get_user_model().objects
+        self.viewer = users.create_user("viewer@test.com", "pass12345")
+        self.author = users.create_user("author@test.com", "pass12345")
+        stranger = users.create_user("stranger@test.com", "pass12345")
+        relations.follow_user(self.viewer.id, self.author.id)
+        contents = [
+            (self.author, "first #news"),
+            (self.viewer, "own #News"),
+            (self.author, "untagged"),
+            (stranger, "not followed #news"),
+            (self.author, "other #sport"),
+            (self.author, "last #news #sport"),
+        ]
+        self.posts = []
+        for user, content in contents:
+            post = Post.objects.create(user=user, content=content)
+            fan_out_post(post)
+            self.posts.append(post)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def walk(self, url, link="next") -> list:
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [item["id"] for item in response.data["results"]]
+            url = response.data[link]
+        return ids
+
+    def test_tag_pages_newest_first(self):
+        expected = [self.posts[index].id for index in (5, 1, 0)]
+        for fast_list in (False, True):
+            with mock.patch.object(PostViewSet, "fast_list", fast_list):
+                self.assertEqual(
+                    self.walk("/api/posts/?tag=news&page_size=1"), expected
+                )
+                self.assertEqual(self.walk("/api/posts/?tag=%23NEWS"), expected)
+
+    def test_previous_pages(self):
+        response = self.client.get("/api/posts/?tag=news&page_size=1")
+        last = self.client.get(response.data["next"]).data["next"]
+        self.assertEqual(
+            self.walk(last, link="previous"),
+            [self.posts[index].id for index in (0, 1, 5)],
+        )
+
+    def test_unknown_tag(self):
+        self.assertEqual(self.walk("/api/posts/?tag=missing"), [])
+
+
+class SchedulingTests(TestCase):
+    """Scheduled posts are claimed, published in batches, staged files kept"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@test.com", "pass12345")
+        self.now = timezone.now()
+
+    def schedule(self, minutes: int, **fields) -> ScheduledPost:
+        return ScheduledPost.objects.create(
+            user=self.user,
+            content=fields.pop("content", f"in {minutes} #news"),
+            post_at=self.now + datetime.timedelta(minutes=minutes),
+            **fields,
+        )
+
+    def test_claim_due_posts_in_order(self):
+        later, first = self.schedule(-1), self.schedule(-5)
+        self.schedule(5)
+        self.schedule(-10, status=ScheduledPost.Status.CANCELLED)
+        self.assertEqual(scheduling.claim_due_posts(10), [first, later])
+        self.assertEqual(scheduling.claim_due_posts(1), [first])
+
+    def test_publish_scheduled_posts(self):
+        due, future = self.schedule(-1), self.schedule(5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(scheduling.dispatch_scheduled_posts(), 1)
+
+        due.refresh_from_db()
+        future.refresh_from_db()
+        self.assertEqual(due.status, ScheduledPost.Status.PUBLISHED)
+        self.assertEqual(due.post.content, due.content)
+        self.assertEqual(
+            list(due.post.post_tags.values_list("tag__name", flat=True)), ["news"]
+        )
+        self.assertEqual(future.status, ScheduledPost.Status.PENDING)
+
+    @mock.patch.object(settings, "SCHEDULED_POSTS_BATCH_SIZE", 2)
+    def test_batches(self):
+        for minutes in range(-5, 0):
+            self.schedule(minutes)
+        on_published = mock.Mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(scheduling.dispatch_scheduled_posts(on_published), 5)
+
+        batches = [len(call.args[0]) for call in on_published.call_args_list]
+        self.assertEqual(batches, [2, 2, 1])
+        self.assertFalse(
+            ScheduledPost.objects.filter(status=ScheduledPost.Status.PENDING).exists()
+        )
+
+    def test_staged_image_kept_on_rollback(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage = FileSystemStorage(location=media.name)
+        staged = storage.save("upload/staging/1-image.jpg", ContentFile(b"image"))
+        scheduled = self.schedule(-1, image=staged, image_name="image.jpg")
+
+        with mock.patch.object(staging, "default_storage", storage):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                scheduling.publish_scheduled_posts([scheduled])
+                raise RuntimeError("rolled back")
+            self.assertTrue(storage.exists(staged))
+
+            scheduled.refresh_from_db()
+            with self.captureOnCommitCallbacks(execute=True):
+                (post,) = scheduling.publish_scheduled_posts([scheduled])
+
+        self.assertFalse(storage.exists(staged))
+        with storage.open(post.image.name) as image:
+            self.assertEqual(image.read(), b"image")
+
+    def test_cleanup_staged_uploads(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage = FileSystemStorage(location=media.name)
+        # publish times are a part of the names
+        old = int((self.now - datetime.timedelta(days=2)).timestamp())
+        recent = int(self.now.timestamp())
+        orphan = storage.save(f"upload/staging/{old}-a.jpg", ContentFile(b"a"))
+        pending = storage.save(f"upload/staging/{old}-b.jpg", ContentFile(b"b"))
+        fresh = storage.save(f"upload/staging/{recent}-c.jpg", ContentFile(b"c"))
+        self.schedule(-2 * 24 * 60, image=pending, image_name="b.jpg")
+
+        with mock.patch.object(staging, "default_storage", storage):
+            self.assertEqual(staging.cleanup_staged_uploads(), 1)
+
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(pending))
+        self.assertTrue(storage.exists(fresh))
+
+    def test_staged_blob_reclaimed_by_gc(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        scheduled = self.schedule(-1, image=ContentFile(b"image", "image.jpg"))
+        name = scheduled.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            scheduled.delete()
+
+        # content-addressed: nothing staged, the released blob is collected
+        self.assertEqual(staging.cleanup_staged_uploads(), 0)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 0)
+        self.assertEqual(collect_garbage(datetime.timedelta(0)), (1, 0))
+        self.assertFalse(default_storage.exists(name))
+
+    def cancel(self, scheduled: ScheduledPost, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.user)
+        return client.post(f"/api/scheduled-posts/{scheduled.pk}/cancel/")
+
+    def test_cancel(self):
+        scheduled = self.schedule(-1)
+        self.assertEqual(self.cancel(scheduled).status_code, 204)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(scheduling.dispatch_scheduled_posts(), 0)
+        scheduled.refresh_from_db()
+        self.assertEqual(scheduled.status, ScheduledPost.Status.CANCELLED)
+        self.assertIsNone(scheduled.post)
+
+    def test_cancel_by_other_user(self):
+        scheduled = self.schedule(5)
+        other = get_user_model().objects.create_user("other@test.com", "pass12345")
+        self.assertEqual(self.cancel(scheduled, other).status_code, 404)
+        scheduled.refresh_from_db()
+        self.assertEqual(scheduled.status, ScheduledPost.Status.PENDING)
+
+    def test_cancel_published(self):
+        scheduled = self.schedule(-1)
+        with self.captureOnCommitCallbacks(execute=True):
+            scheduling.dispatch_scheduled_posts()
+        self.assertEqual(self.cancel(scheduled).status_code, 404)
+
+        # published between the read of the pending post and the update
+        pending = self.schedule(-1)
+        get_object = ScheduledPostViewSet.get_object
+
+        def get_then_publish(view):
+            scheduled = get_object(view)
+            scheduling.publish_scheduled_posts(
+                [ScheduledPost.objects.get(pk=pending.pk)]
+            )
+            return scheduled
+
+        with mock.patch.object(ScheduledPostViewSet, "get_object", get_then_publish):
+            self.assertEqual(self.cancel(pending).status_code, 409)
+
+        for scheduled in (scheduled, pending):
+            scheduled.refresh_from_db()
+            self.assertEqual(scheduled.status, ScheduledPost.Status.PUBLISHED)
+            self.assertTrue(Post.objects.filter(pk=scheduled.post_id).exists())
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Uploads are stored once per content, gc deletes unreferenced blobs"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = get_user_model().objects.create_user("user@test.com", "pass12345")
+
+    def save(self, content: bytes, name="upload/post/image.jpg") -> str:
+        return default_storage.save(name, ContentFile(content))
+
+    def test_same_content_stored_once(self):
+        first, second = self.save(b"image"), self.save(b"image", "other.jpg")
+        other = self.save(b"other image")
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(
+            dict(MediaBlob.objects.values_list("name", "ref_count")),
+            {first: 2, other: 1},
+        )
+
+    def test_delete_releases_a_reference(self):
+        name = self.save(b"image")
+        self.save(b"image")
+        default_storage.delete(name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        default_storage.delete(name)
+        default_storage.delete(name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 0)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_collect_garbage(self):
+        image, variant = self.save(b"image"), self.save(b"variant", "small.webp")
+        post = Post.objects.create(
+            user=self.user,
+            content="post",
+            image=image,
+            image_variants={"small": variant},
+        )
+        unreferenced = self.save(b"unreferenced")
+        default_storage.delete(unreferenced)
+
+        self.assertEqual(collect_garbage(datetime.timedelta(hours=1)), (0, 0))
+        self.assertEqual(collect_garbage(datetime.timedelta(0), dry_run=True), (1, 0))
+        self.assertTrue(default_storage.exists(unreferenced))
+        self.assertEqual(collect_garbage(datetime.timedelta(0)), (1, 0))
+        self.assertFalse(default_storage.exists(unreferenced))
+        self.assertEqual(
+            dict(MediaBlob.objects.values_list("name", "ref_count")),
+            {image: 1, variant: 1},
+        )
+
+        # deleted rows release their image and variants
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertEqual(collect_garbage(datetime.timedelta(0)), (2, 0))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_rolled_back_save(self):
+        kept = self.save(b"kept")
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.save(b"kept")
+            name = self.save(b"image")
+            raise RuntimeError("rolled back")
+
+        # the file is written, its row and the references are rolled back
+        self.assertTrue(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertEqual(MediaBlob.objects.get(name=kept).ref_count, 1)
+
+        self.assertEqual(collect_garbage(datetime.timedelta(hours=1)), (0, 0))
+        self.assertEqual(collect_garbage(datetime.timedelta(0), dry_run=True), (0, 1))
+        self.assertEqual(collect_garbage(datetime.timedelta(0)), (0, 1))
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(kept))
+
+    def test_replaced_image_released(self):
+        old, variant = self.save(b"old"), self.save(b"variant", "small.webp")
+        post = Post.objects.create(
+            user=self.user,
+            content="post",
+            image=old,
+            image_variants={"small": variant},
+        )
+        buffer = io.BytesIO()
+        Image.new("RGB", (10, 10), "red").save(buffer, format="PNG")
+        upload = SimpleUploadedFile("new.png", buffer.getvalue(), "image/png")
+
+        serializer = PostImageSerializer(post, data={"image": upload})
+        serializer.is_valid(raise_exception=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+        self.assertEqual(
+            dict(MediaBlob.objects.values_list("name", "ref_count")),
+            {old: 0, variant: 1, post.image.name: 1},
+        )
+
+        # cleared: variants are released too
+        serializer = PostImageSerializer(post, data={"image": None})
+        serializer.is_valid(raise_exception=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, {})
+        self.assertFalse(MediaBlob.objects.filter(ref_count__gt=0).exists())
+
+
+class ImageVariantTests(TestCase):
+    """Resized WebP variants of stored images, oriented and without metadata"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = get_user_model().objects.create_user("user@test.com", "pass12345")
+
+    def store(self, image: Image.Image, image_format: str, **params) -> str:
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, **params)
+        return default_storage.save(
+            f"upload/post/image.{image_format.lower()}", ContentFile(buffer.getvalue())
+        )
+
+    @mock.patch.object(images, "avif_supported", return_value=False)
+    def test_post_variants(self, avif_supported):
+        exif = Image.Exif()
+        # rotated 90° by viewers: 1000 x 2000 as shown
+        exif[0x0112] = 6
+        name = self.store(
+            Image.new("RGB", (2000, 1000), "red"), "JPEG", exif=exif.tobytes()
+        )
+        post = Post.objects.create(user=self.user, content="post", image=name)
+
+        tasks.generate_image_variants("social_media.Post", post.pk, "image")
+
+        post.refresh_from_db()
+        self.assertEqual(set(post.image_variants), set(settings.IMAGE_VARIANT_SIZES))
+        for variant, size in settings.IMAGE_VARIANT_SIZES.items():
+            with default_storage.open(post.image_variants[variant]) as file:
+                with Image.open(file) as image:
+                    self.assertEqual(image.format, "WEBP")
+                    self.assertEqual(image.size, (size // 2, size))
+                    self.assertFalse(image.getexif())
+
+        # regenerated: old variants released, blob references still exact
+        tasks.generate_image_variants("social_media.Post", post.pk, "image")
+        self.assertEqual(collect_garbage(datetime.timedelta(0), dry_run=True), (0, 0))
+
+    @mock.patch.object(images, "avif_supported", return_value=False)
+    def test_transparency_kept(self, avif_supported):
+        name = self.store(Image.new("RGBA", (100, 50), (0, 0, 0, 0)), "PNG")
+        variants = images.render_variants(name)
+        with default_storage.open(variants["thumbnail"]) as file:
+            with Image.open(file) as image:
+                self.assertEqual(image.mode, "RGBA")
+                # never upscaled
+                self.assertEqual(image.size, (100, 50))
+
+    @mock.patch.object(images, "avif_supported", return_value=False)
+    def test_image_replaced_meanwhile(self, avif_supported):
+        name = self.store(Image.new("RGB", (400, 400), "red"), "JPEG")
+        post = Post.objects.create(user=self.user, content="post", image=name)
+        render_variants = images.render_variants
+
+        def render_and_replace(name):
+            Post.objects.filter(pk=post.pk).update(image="upload/post/other.jpg")
+            return render_variants(name)
+
+        with mock.patch.object(images, "render_variants", render_and_replace):
+            tasks.generate_image_variants("social_media.Post", post.pk, "image")
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, {})
+        self.assertFalse(
+            MediaBlob.objects.exclude(name=name).filter(ref_count__gt=0).exists()
+        )
+
+
+class PostMicroCacheTests(TestCase):
+    """Post detail micro-cache: HIT / STALE / MISS and coalesced rebuilds"""
+
+    def setUp(self):
+        post_cache.post_cache().clear()
+        users = get_user_model().objects
+        self.author = users.create_user("author@test.com", "pass12345")
+        self.fan = users.create_user("fan@test.com", "pass12345")
+        self.post = Post.objects.create(user=self.author, content="post")
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_missing_or_malformed_post(self):
+        for pk in (self.post.pk + 1, "abc"):
+            response = self.client.get(f"/api/posts/{pk}/")
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn("X-Cache", response)
+
+    def test_miss_then_hit_with_liked_by_me_of_viewer(self):
+        url = f"/api/posts/{self.post.pk}/"
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIs(response.data["liked_by_me"], False)
+
+        Like.objects.create(post=self.post, user=self.fan)
+        Post.objects.filter(pk=self.post.pk).update(updated_at=self.post.updated_at)
+        self.client.force_authenticate(self.fan)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertIs(response.data["liked_by_me"], True)
+
+    def test_stale_payload_while_locked(self):
+        cache = post_cache.post_cache()
+        build = mock.Mock(return_value={"content": "new"})
+        cache.set("post:latest", {"content": "old"})
+        cache.add("post:version:lock", True)
+
+        self.assertEqual(
+            post_cache.load_or_build("post:version", "post:latest", build),
+            ({"content": "old"}, "STALE"),
+        )
+        build.assert_not_called()
+
+    @mock.patch.object(settings, "POST_CACHE_LOCK_WAIT", 0)
+    def test_miss_without_stale_payload_and_stuck_lock(self):
+        post_cache.post_cache().add("post:version:lock", True)
+        build = mock.Mock(return_value={"content": "new"})
+
+        self.assertEqual(
+            post_cache.load_or_build("post:version", "post:latest", build),
+            ({"content": "new"}, "MISS"),
+        )
+        build.assert_called_once()
+
+    def test_concurrent_rebuilds_coalesced(self):
+        flights = post_cache.SingleFlight()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_build():
+            started.set()
+            release.wait(5)
+            return "payload"
+
+        leader = threading.Thread(target=flights.do, args=("key", slow_build, 5))
+        leader.start()
+        started.wait(5)
+        threading.Timer(0.05, release.set).start()
+        build = mock.Mock(return_value="other")
+
+        self.assertEqual(flights.do("key", build, 5), ("payload", True))
+        leader.join()
+        build.assert_not_called()
+
+
+class ProfileCacheTests(TestCase):
+    """Profile responses cached per viewer, invalidated on commit of changes"""
+
+    def setUp(self):
+        profile_cache.profile_cache().clear()
+        users = get_user_model().objects
+        self.viewer = users.create_user("viewer@test.com", "pass12345")
+        self.other = users.create_user("other@test.com", "pass12345")
+        self.target = users.create_user("target@test.com", "pass12345")
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        # celery tasks of on_commit callbacks run in process
+        self.addCleanup(
+            setattr, app.conf, "task_always_eager", app.conf.task_always_eager
+        )
+        app.conf.task_always_eager = True
+
+    def get(self, url, user=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_cached_per_viewer(self):
+        for url in (f"/api/profiles/{self.target.pk}/", "/api/profiles/"):
+            self.assertEqual(self.get(url)["X-Cache"], "MISS")
+            self.assertEqual(self.get(url)["X-Cache"], "HIT")
+            self.assertEqual(self.get(url, self.other)["X-Cache"], "MISS")
+            self.assertEqual(self.get(url, self.viewer)["X-Cache"], "HIT")
+
+    def test_follow_invalidates_on_commit(self):
+        url = f"/api/profiles/{self.target.pk}/"
+        for action, following in (("follow", True), ("unfollow", False)):
+            self.get(url)
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(f"{url}{action}/")
+            self.assertEqual(response.status_code, 200)
+            # not committed yet
+            self.assertEqual(self.get(url)["X-Cache"], "HIT")
+
+            for callback in callbacks:
+                callback()
+            response = self.get(url)
+            self.assertEqual(response["X-Cache"], "MISS")
+            self.assertIs(response.data["is_following"], following)
+            self.assertEqual(response.data["followers_count"], int(following))
+
+    def test_profile_save_invalidates_on_commit(self):
+        urls = (f"/api/profiles/{self.target.pk}/", "/api/profiles/")
+        for url in urls:
+            self.get(url)
+
+        self.target.bio = "new bio"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.target.save()
+
+        for url in urls:
+            self.assertEqual(self.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.get(urls[0]).data["bio"], "new bio")
+
+
+class AdminInlineCountersTests(TestCase):
+    """Likes & followers added / deleted in admin inlines keep the counters"""
+
+    def setUp(self):
+        users = get_user_model().objects
+        admin = users.create_superuser("admin@test.com", "pass12345")
+        self.author = users.create_user("author@test.com", "pass12345")
+        self.fan = users.create_user("fan@test.com", "pass12345")
+        self.post = Post.objects.create(user=self.author, content="post")
+        self.client.force_login(admin)
+
+    def submit(self, url, changes: dict):
+        """Post the admin change form at url as rendered, with changes"""
+        response = self.client.get(url)
+        forms = [response.context["adminform"].form]
+        for inline in response.context["inline_admin_formsets"]:
+            forms += [inline.formset.management_form, *inline.formset.forms]
+        data = {}
+        for field in (field for form in forms for field in form):
+            value = field.value()
+            if value is None or field.field.disabled or isinstance(value, FieldFile):
+                continue
+            if isinstance(value, datetime.datetime):
+                data[f"{field.html_name}_0"] = value.strftime("%Y-%m-%d")
+                data[f"{field.html_name}_1"] = value.strftime("%H:%M:%S")
+            else:
+                data[field.html_name] = value
+        response = self.client.post(url, {**data, **changes})
+        self.assertEqual(response.status_code, 302)
+
+    def test_like_inline(self):
+        url = f"/admin/social_media/post/{self.post.pk}/change/"
+        self.submit(
+            url, {"post_likes-TOTAL_FORMS": 1, "post_likes-0-user": self.fan.pk}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+
+        self.submit(url, {"post_likes-0-DELETE": "on"})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_follower_inline(self):
+        url = f"/admin/user/user/{self.author.pk}/change/"
+        self.submit(
+            url,
+            {"follower_links-TOTAL_FORMS": 1, "follower_links-0-to_user": self.fan.pk},
+        )
+        self.author.refresh_from_db()
+        self.fan.refresh_from_db()
+        self.assertEqual(
+            (self.author.followers_count, self.fan.followed_by_count), (1, 1)
+        )
+
+        self.submit(url, {"follower_links-0-DELETE": "on"})
+        self.author.refresh_from_db()
+        self.fan.refresh_from_db()
+        self.assertEqual(
+            (self.author.followers_count, self.fan.followed_by_count), (0, 0)
+        )
+        self.assertFalse(Follow.objects.exists())
+
+
+class RelationsTests(TestCase):
+    """Idempotent and batch likes / follows, bulk flags in one query"""
+
+    def setUp(self):
+        users = get_user_model().objects
+        self.viewer = users.create_user("viewer@test.com", "pass12345")
+        self.others = [
+            users.create_user(f"user{index}@test.com", "pass12345")
+            for index in range(3)
+        ]
+        self.posts = [
+            Post.objects.create(user=user, content="post") for user in self.others
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def test_like_status(self):
+        first, second, third = self.posts
+        relations.like_post(self.viewer.id, first.id)
+        relations.like_post(self.others[0].id, second.id)
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                f"/api/posts/like-status/?ids={third.id},{first.id}"
+                f"&ids={second.id}&ids=999"
+            )
+        self.assertEqual(
+            response.json(),
+            [
+                {"post": first.id, "liked_by_me": True},
+                {"post": second.id, "liked_by_me": False},
+                {"post": third.id, "liked_by_me": False},
+            ],
+        )
+        self.assertEqual(self.client.get("/api/posts/like-status/").status_code, 400)
+
+    def test_relationships(self):
+        followed, follower, stranger = self.others
+        relations.follow_user(self.viewer.id, followed.id)
+        relations.follow_user(follower.id, self.viewer.id)
+        ids = ",".join(str(user.id) for user in self.others)
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/profiles/relationships/?ids={ids}")
+        self.assertEqual(
+            response.json(),
+            [
+                {"user": followed.id, "is_following": True, "follows_me": False},
+                {"user": follower.id, "is_following": False, "follows_me": True},
+                {"user": stranger.id, "is_following": False, "follows_me": False},
+            ],
+        )
+
+    def test_idempotent_like(self):
+        url = f"/api/posts/{self.posts[0].id}/my-like/"
+        for __ in range(2):
+            response = self.client.put(url)
+            self.assertEqual(response.data["likes_count"], 1)
+        for __ in range(2):
+            response = self.client.delete(url)
+            self.assertEqual(
+                (response.data["liked"], response.data["likes_count"]), (False, 0)
+            )
+        self.assertEqual(self.client.put("/api/posts/999/my-like/").status_code, 404)
+
+    def test_batch_likes(self):
+        first, second, third = self.posts
+        relations.like_post(self.viewer.id, third.id)
+        data = {"like": [first.id, second.id, 999], "unlike": [third.id]}
+        for __ in range(2):
+            response = self.client.post("/api/posts/likes/", data, format="json")
+            self.assertEqual(
+                response.json(),
+                [
+                    {"post": first.id, "liked": True, "likes_count": 1},
+                    {"post": second.id, "liked": True, "likes_count": 1},
+                    {"post": third.id, "liked": False, "likes_count": 0},
+                ],
+            )
+        self.assertFalse(Post.counters_drift().exists())
+
+        too_many = {"like": list(range(1, settings.RELATION_BATCH_MAX_SIZE + 2))}
+        response = self.client.post("/api/posts/likes/", too_many, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_follows(self):
+        first, second, third = self.others
+        relations.follow_user(self.viewer.id, third.id)
+        data = {"follow": [first.id, second.id], "unfollow": [third.id, 999]}
+        for __ in range(2):
+            response = self.client.post("/api/profiles/follows/", data, format="json")
+            self.assertEqual(
+                response.json(),
+                [
+                    {"user": first.id, "following": True, "followers_count": 1},
+                    {"user": second.id, "following": True, "followers_count": 1},
+                    {"user": third.id, "following": False, "followers_count": 0},
+                ],
+            )
+        self.viewer.refresh_from_db()
+        self.assertEqual(self.viewer.followed_by_count, 2)
+        self.assertFalse(get_user_model().follow_counters_drift().exists())
+
+    def test_relations_not_written_by_updates(self):
+        ids = [user.id for user in self.others]
+        response = self.client.patch(
+            f"/api/profiles/{self.viewer.id}/",
+            {"bio": "bio", "followers": ids},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["followers"], [])
+
+        post = Post.objects.create(user=self.viewer, content="post")
+        response = self.client.patch(
+            f"/api/posts/{post.id}/",
+            {"content": "edited", "likes": ids},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["likes"], [])
+
+        self.viewer.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual((self.viewer.bio, self.viewer.followers_count), ("bio", 0))
+        self.assertEqual((post.content, post.likes_count), ("edited", 0))
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(Like.objects.exists())
+
+
+class SparseFieldsTests(TestCase):
+    """?fields= / ?exclude= / ?embed=0 trim responses and their queries"""
+
+    def setUp(self):
+        post_cache.post_cache().clear()
+        profile_cache.profile_cache().clear()
+        users = get_user_model().objects
+        self.viewer = users.create_user("viewer@test.com", "pass12345")
+        self.fans = [
+            users.create_user(f"fan{index}@test.com", "pass12345") for index in range(3)
+        ]
+        self.post = Post.objects.create(user=self.viewer, content="post")
+        fan_out_post(self.post)
+        for fan in self.fans:
+            relations.like_post(fan.id, self.post.id)
+            relations.follow_user(fan.id, self.viewer.id)
+            Comment.objects.create(post=self.post, user=fan, message=fan.email)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), " ".join(query["sql"] for query in queries)
+
+    def posts_sql(self, url) -> tuple:
+        """Page of url and the SQL of its posts query"""
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(url).json()
+        (sql,) = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('SELECT "social_media_post"')
+            and '"social_media_post"."id" IN (' in query["sql"]
+        ]
+        return page, sql
+
+    def test_fields_and_exclude(self):
+        page, sql = self.posts_sql("/api/posts/?fields=id,content")
+        self.assertEqual(set(page["results"][0]), {"id", "content"})
+        self.assertNotIn("user_user", sql)
+        self.assertNotIn("social_media_post_likes", sql)
+
+        page, sql = self.posts_sql("/api/posts/?exclude=liked_by_me,image_variants")
+        self.assertNotIn("liked_by_me", page["results"][0])
+        self.assertIn("user", page["results"][0])
+        self.assertNotIn("social_media_post_likes", sql)
+
+    @mock.patch.object(settings, "EMBED_PREVIEW_SIZE", 2)
+    def test_post_embeds(self):
+        post, sql = self.get(f"/api/posts/{self.post.pk}/")
+        newest = [fan.email for fan in reversed(self.fans)][:2]
+        self.assertEqual(post["likes"], newest)
+        self.assertEqual([comment["message"] for comment in post["comments"]], newest)
+        self.assertEqual((post["likes_count"], post["comments_count"]), (3, 3))
+        self.assertTrue(post["likes_url"].endswith(f"/posts/{self.post.pk}/likers/"))
+
+        post, sql = self.get(f"/api/posts/{self.post.pk}/?embed=0")
+        self.assertNotIn("likes", post)
+        self.assertNotIn("comments", post)
+        self.assertEqual(post["likes_count"], 3)
+        self.assertNotIn("social_media_comment", sql)
+
+    @mock.patch.object(settings, "EMBED_PREVIEW_SIZE", 2)
+    def test_profile_embeds(self):
+        profile, sql = self.get(f"/api/profiles/{self.viewer.pk}/")
+        self.assertEqual(
+            profile["followers"], [fan.email for fan in reversed(self.fans)][:2]
+        )
+        self.assertEqual(profile["followers_count"], 3)
+
+        profile, sql = self.get(
+            f"/api/profiles/{self.viewer.pk}/?embed=0&fields=id,followers"
+        )
+        self.assertEqual(profile, {"id": self.viewer.pk})
+        self.assertNotIn("user_user_followers", sql)
+
+
+class MetricsTests(TestCase):
+    """Request, cache and task metrics in the /metrics exposition"""
+
+    def setUp(self):
+        post_cache.post_cache().clear()
+        self.user = get_user_model().objects.create_user("user@test.com", "pass12345")
+        self.post = Post.objects.create(user=self.user, content="post")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def sample(name: str, **labels) -> float:
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_metrics(self):
+        labels = {"view": "PostViewSet", "action": "list"}
+        requests = self.sample(
+            "api_request_duration_seconds_count", method="GET", status="200", **labels
+        )
+        queries = self.sample("api_request_db_queries_sum", **labels)
+        sizes = self.sample("api_response_size_bytes_count", **labels)
+
+        self.client.get("/api/posts/")
+
+        self.assertEqual(
+            self.sample(
+                "api_request_duration_seconds_count",
+                method="GET",
+                status="200",
+                **labels,
+            ),
+            requests + 1,
+        )
+        self.assertGreater(self.sample("api_request_db_queries_sum", **labels), queries)
+        self.assertEqual(
+            self.sample("api_response_size_bytes_count", **labels), sizes + 1
+        )
+
+    def test_cache_lookups(self):
+        url = f"/api/posts/{self.post.pk}/"
+        misses = self.sample("cache_lookups_total", cache="posts", result="miss")
+        hits = self.sample("cache_lookups_total", cache="posts", result="hit")
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(
+            self.sample("cache_lookups_total", cache="posts", result="miss"),
+            misses + 1,
+        )
+        self.assertEqual(
+            self.sample("cache_lookups_total", cache="posts", result="hit"), hits + 1
+        )
+
+    def test_task_metrics(self):
+        task = tasks.generate_image_variants
+        runs = self.sample("celery_task_duration_seconds_count", task=task.name)
+        failures = self.sample("celery_task_failures_total", task=task.name)
+
+        task.apply(args=("social_media.Post", self.post.pk, "image"))
+        task.apply(args=("social_media.Missing", self.post.pk, "image"))
+
+        self.assertEqual(
+            self.sample("celery_task_duration_seconds_count", task=task.name),
+            runs + 2,
+        )
+        self.assertEqual(
+            self.sample("celery_task_failures_total", task=task.name), failures + 1
+        )
+        # start times go with the request contexts of the runs
+        self.assertFalse(hasattr(task.request, "metrics_started_at"))
+
+    def test_exposition(self):
+        self.client.get("/api/posts/")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], CONTENT_TYPE_LATEST)
+        self.assertIn(
+            b'api_request_duration_seconds_count{action="list",method="GET",'
+            b'status="200",view="PostViewSet"}',
+            response.content,
+        )
+
+
+class ProfilingTests(TestCase):
+    """Profiles of staff header requests and sampled ones, rotated"""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        for name, value in (
+            ("PROFILING_DIR", directory.name),
+            ("PROFILING_SAMPLE_RATE", 0),
+        ):
+            patcher = mock.patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        User = get_user_model()
+        self.staff = User.objects.create_user(
+            "staff@test.com", "pass12345", is_staff=True
+        )
+        self.user = User.objects.create_user("user@test.com", "pass12345")
+
+    def get(self, user=None, path="/api/posts/", **headers):
+        client = APIClient()
+        if user is not None:
+            token = RefreshToken.for_user(user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client.get(path, **headers)
+
+    def profiles(self) -> list[str]:
+        return sorted(path.stem for path in self.directory.glob("*.json"))
+
+    def test_header_of_staff(self):
+        response = self.get(self.staff, HTTP_X_PROFILE="1")
+
+        self.assertEqual(response.status_code, 200)
+        profile_id = response["X-Profile-Id"]
+        self.assertEqual(self.profiles(), [profile_id])
+        self.assertTrue((self.directory / f"{profile_id}.prof").exists())
+        meta = profiling.load_meta(profile_id)
+        self.assertEqual(meta["reason"], "header")
+        self.assertEqual(meta["path"], "/api/posts/")
+        self.assertEqual(meta["sql_count"], len(meta["queries"]))
+        self.assertGreater(meta["sql_count"], 0)
+
+    def test_token_authenticated_once(self):
+        with mock.patch.object(
+            CachedJWTAuthentication,
+            "get_cached_entry",
+            autospec=True,
+            side_effect=CachedJWTAuthentication.get_cached_entry,
+        ) as get_cached_entry:
+            response = self.get(self.staff, HTTP_X_PROFILE="1")
+        self.assertIn("X-Profile-Id", response)
+        self.assertEqual(get_cached_entry.call_count, 1)
+
+    def test_header_of_non_staff_ignored(self):
+        for user in (self.user, None):
+            response = self.get(user, HTTP_X_PROFILE="1")
+            self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(self.profiles(), [])
+
+    def test_no_header_not_profiled(self):
+        response = self.get(self.staff)
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(self.profiles(), [])
+
+    @mock.patch.object(settings, "PROFILING_SAMPLE_RATE", 1)
+    def test_sampled(self):
+        response = self.get(self.user, "/api/posts/?search=secret")
+        meta = profiling.load_meta(response["X-Profile-Id"])
+        self.assertEqual(meta["reason"], "sample")
+        self.assertEqual(meta["path"], "/api/posts/")
+
+    @mock.patch.object(settings, "PROFILING_KEEP", 2)
+    def test_rotation_keeps_latest(self):
+        profile_ids = [
+            self.get(self.staff, HTTP_X_PROFILE="1")["X-Profile-Id"] for _ in range(4)
+        ]
+        self.assertEqual(self.profiles(), profile_ids[-2:])
+        self.assertEqual(
+            sorted(path.stem for path in self.directory.glob("*.prof")),
+            profile_ids[-2:],
+        )
+
+    def test_admin_views(self):
+        profile_id = self.get(self.staff, HTTP_X_PROFILE="1")["X-Profile-Id"]
+        client = APIClient()
+        client.force_login(self.staff)
+
+        response = client.get("/admin/profiles/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, profile_id)
+        response = client.get(f"/admin/profiles/{profile_id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "/api/posts/")
+        for bad_id in ("20260101T000000000000-deadbeef", "..%2Fsettings"):
+            response = client.get(f"/admin/profiles/{bad_id}/")
+            self.assertEqual(response.status_code, 404)
+
+        client.force_login(self.user)
+        response = client.get("/admin/profiles/")
+        self.assertEqual(response.status_code, 302)
+
+
+class SeedSocialGraphTests(TestCase):
+    """Small seeded graphs: same rows by seed, counters match the rows"""
+
+    OPTIONS = {
+        "users": 30,
+        "posts": 60,
+        "follows_avg": 5,
+        "likes_avg": 3,
+        "comments_avg": 2,
+        "tags": 40,
+        "images": 0,
+        "batch_size": 25,
+    }
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def seed(self, **options) -> str:
+        stdout = io.StringIO()
+        call_command(
+            "seed_social_graph", seed=1, stdout=stdout, **{**self.OPTIONS, **options}
+        )
+        return stdout.getvalue()
+
+    @staticmethod
+    def snapshot() -> dict:
+        return {
+            "users": list(
+                get_user_model()
+                .objects.order_by("email")
+                .values_list("email", "followers_count", "followed_by_count")
+            ),
+            "follows": sorted(
+                Follow.objects.values_list("from_user__email", "to_user__email")
+            ),
+            "posts": list(
+                Post.objects.order_by("pk").values_list(
+                    "user__email", "content", "likes_count", "comments_count"
+                )
+            ),
+            "likes": sorted(Like.objects.values_list("post__content", "user__email")),
+            "comments": sorted(
+                Comment.objects.values_list("post__content", "user__email", "message")
+            ),
+        }
+
+    def test_deterministic_by_seed(self):
+        snapshots = []
+        for __ in range(2):
+            with transaction.atomic():
+                self.seed()
+                snapshots.append(self.snapshot())
+                transaction.set_rollback(True)
+
+        self.assertEqual(snapshots[0], snapshots[1])
+        self.assertEqual(len(snapshots[0]["users"]), 30)
+        self.assertEqual(len(snapshots[0]["posts"]), 60)
+
+    def test_counters_match_rows(self):
+        output = self.seed(images=0.5)
+
+        self.assertFalse(Post.counters_drift().exists())
+        self.assertFalse(get_user_model().follow_counters_drift().exists())
+        self.assertIn(
+            f"Seeded 30 users, {Follow.objects.count()} follows, 60 posts, "
+            f"{Like.objects.count()} likes, {Comment.objects.count()} comments, "
+            f"{TimelineEntry.objects.count()} timeline entries",
+            output,
+        )
+        for post in Post.objects.prefetch_related("post_tags__tag"):
+            self.assertEqual(
+                {f"#{post_tag.tag.name}" for post_tag in post.post_tags.all()},
+                {word for word in post.content.split() if word.startswith("#")},
+            )
+        references = storage.media_references()
+        self.assertTrue(references)
+        self.assertEqual(
+            dict(MediaBlob.objects.values_list("name", "ref_count")),
+            {
+                name: references[name]
+                for name in MediaBlob.objects.values_list("name", flat=True)
+            },
+        )
+
+
+class FastJSONRendererTests(TestCase):
+    def test_same_bytes_as_json_renderer(self):
+        data = {
+            "text": "\u2028 \u2029 \x00 \x1f \x7f 😀 é \"'\\/",
+            "none": None,
+            "flags": [True, False],
+            "numbers": [0, -1, 2**40, 1.5],
+            "decimal": decimal.Decimal("1.10"),
+            "date": datetime.datetime(2024, 5, 1, 12, 0, 0, 123456),
+            "nested": {"list": [], "dict": {}},
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
 
-# Create your tests here.
+    def test_indent_falls_back_to_json_renderer(self):
+        data = {"a": [1, 2]}
+        media_type = "application/json; indent=4"
+        self.assertEqual(
+            FastJSONRenderer().render(data, media_type),
+            JSONRenderer().render(data, media_type),
+        )
@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q
+
+from social_media.models import Post, TimelineEntry
+from social_media_api import settings
+
+
+def is_celebrity(author_id) -> bool:
+    """Authors with too many followers are fanned out on read, not on write"""
+    return (
+        get_user_model()
+        .objects.filter(
+            pk=author_id,
+            followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+        )
+        .exists()
+    )
+
+
+def read_on_the_fly(user):
+    """
+    Posts of user and of followed authors that are not fanned out: the
+    latest ones, or written while their author was a celebrity
+    """
+    return Post.objects.filter(fanned_out=False).filter(
+        Q(user=user) | Q(user__in=user.followed_by.values("id"))
+    )
+
+
+def home_timeline_sources(user) -> list:
+    """(created_at, post_id) rows of user's feed, each read from an index"""
+    return [
+        TimelineEntry.objects.filter(owner=user).values("created_at", "post_id"),
+        read_on_the_fly(user).values("created_at", post_id=F("id")),
+    ]
+
+
+def home_timeline_filter(user) -> Q:
+    """Posts of user's feed as a condition (ex. ?tag= lists of the feed)"""
+    return Q(pk__in=TimelineEntry.objects.filter(owner=user).values("post")) | Q(
+        pk__in=read_on_the_fly(user).values("pk")
+    )
+
+
+def _bulk_insert(entries: list) -> None:
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_post(post: Post) -> int:
+    """Write post into the timelines of its author and author's followers"""
+    owner_ids = [post.user_id]
+    celebrity = is_celebrity(post.user_id)
+    if not celebrity:
+        owner_ids += list(
+            get_user_model()
+            .followers.through.objects.filter(from_user_id=post.user_id)
+            .values_list("to_user_id", flat=True)
+        )
+
+    for start in range(0, len(owner_ids), settings.TIMELINE_FANOUT_BATCH_SIZE):
+        _bulk_insert(
+            [
+                TimelineEntry(
+                    owner_id=owner_id,
+                    post_id=post.pk,
+                    author_id=post.user_id,
+                    created_at=post.created_at,
+                )
+                for owner_id in owner_ids[
+                    start : start + settings.TIMELINE_FANOUT_BATCH_SIZE
+                ]
+            ]
+        )
+    if not celebrity:
+        Post.objects.filter(pk=post.pk).update(fanned_out=True)
+    return len(owner_ids)
+
+
+def backfill_timeline(owner_id, author_id, limit=None) -> int:
+    """Copy the latest posts of a newly followed author into owner's timeline"""
+    posts = Post.objects.filter(user_id=author_id)
+    if owner_id != author_id:
+        # the other posts are read on the fly
+        posts = posts.filter(fanned_out=True)
+    posts = posts.values_list("id", "created_at")
+    if limit:
+        posts = posts[:limit]
+    entries = [
+        TimelineEntry(
+            owner_id=owner_id,
+            post_id=post_id,
+            author_id=author_id,
+            created_at=created_at,
+        )
+        for post_id, created_at in posts
+    ]
+    _bulk_insert(entries)
+    return len(entries)
+
+
+def prune_timeline(owner_id, author_id) -> int:
+    """Drop posts of an unfollowed author from owner's timeline"""
+    deleted, __ = TimelineEntry.objects.filter(
+        owner_id=owner_id, author_id=author_id
+    ).delete()
+    return deleted
+
+
+def rebuild_timeline(user, limit=None) -> int:
+    """Recreate the whole timeline of user from own and followed posts"""
+    TimelineEntry.objects.filter(owner=user).delete()
+    author_ids = [user.id] + list(user.followed_by.values_list("id", flat=True))
+    return sum(
+        backfill_timeline(user.id, author_id, limit=limit) for author_id in author_ids
+    )
@@ -1,7 +1,12 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from social_media.views import UserProfileViewSet, PostViewSet, CommentViewSet
+from social_media.views import (
+    UserProfileViewSet,
+    PostViewSet,
+    CommentViewSet,
+    ScheduledPostViewSet,
+)
 
 app_name = "social_media"
 
@@ -9,6 +14,7 @@ router = routers.DefaultRouter()
 router.register("profiles", UserProfileViewSet, basename="profiles")
 router.register("posts", PostViewSet, basename="posts")
 router.register("comments", CommentViewSet, basename="comments")
+router.register("scheduled-posts", ScheduledPostViewSet, basename="scheduled-posts")
 
 urlpatterns = [
     path("", include(router.urls)),
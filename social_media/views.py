@@ -1,21 +1,43 @@
-import base64
+import calendar
+import hashlib
 from datetime import datetime, timezone
+from functools import partial
 
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q
+from django.db.models import Max, Prefetch
+from django.utils.cache import get_conditional_response
+from django.utils.functional import cached_property
+from django.utils.http import http_date
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import generics, viewsets, status, mixins
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from social_media.models import Post, Comment
+from social_media.fastpath import row_converter
+from social_media.hashtags import normalize_hashtag
+from social_media import post_cache, profile_cache, relations
+from social_media.models import Post, Comment, Like, ScheduledPost
+from social_media.pagination import (
+    PostPagination,
+    TagPostPagination,
+    TimelinePagination,
+    CommentPagination,
+    ScheduledPostPagination,
+    LikePagination,
+    FollowPagination,
+)
 from social_media.permissions import IsOwnerOrReadOnly, IsOwnerUserOrReadOnly
-from social_media.tasks import publish_post
+from social_media.tasks import schedule_image_variants
+from social_media.timeline import home_timeline_filter
+from social_media_api import settings
+from user.models import Follow
+from user.search import search_users
 from social_media.serializers import (
+    SparseFieldsMixin,
     UserProfileListSerializer,
     UserProfileDetailSerializer,
     UserProfileSerializer,
@@ -28,10 +50,171 @@ from social_media.serializers import (
     PostImageSerializer,
     CommentSerializer,
     PostLikeSerializer,
+    ScheduledPostSerializer,
+    LikeBatchSerializer,
+    FollowBatchSerializer,
+    RelationLookupSerializer,
 )
 
 
+SPARSE_PARAMETERS = [
+    OpenApiParameter(
+        "fields",
+        type=OpenApiTypes.STR,
+        description="Comma separated fields to return (ex. ?fields=id,content)",
+    ),
+    OpenApiParameter(
+        "exclude",
+        type=OpenApiTypes.STR,
+        description="Comma separated fields to skip (ex. ?exclude=image_variants)",
+    ),
+]
+
+EMBED_PARAMETER = OpenApiParameter(
+    "embed",
+    type=OpenApiTypes.BOOL,
+    description="Embed previews of related lists (default). "
+    "?embed=0 returns counts and links only",
+)
+
+
+IDS_PARAMETER = OpenApiParameter(
+    "ids",
+    type=OpenApiTypes.STR,
+    required=True,
+    description="Comma separated ids (ex. ?ids=1,2,3 or ?ids=1&ids=2)",
+)
+
+
+def lookup_ids(serializer_class, request) -> list:
+    """Validated ids of ?ids=1,2 / ?ids=1&ids=2 query"""
+    ids = [
+        value
+        for values in request.query_params.getlist("ids")
+        for value in values.split(",")
+        if value
+    ]
+    serializer = serializer_class(data={"ids": ids})
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data["ids"]
+
+
+def preview(lookup: str, queryset, ordering: tuple, to_attr: str) -> Prefetch:
+    """Prefetch of the first EMBED_PREVIEW_SIZE related rows of every object"""
+    return Prefetch(
+        lookup,
+        queryset=queryset.order_by(*ordering)[: settings.EMBED_PREVIEW_SIZE],
+        to_attr=to_attr,
+    )
+
+
+def weak_etag(request, watermark) -> str:
+    """Weak ETag of watermark in the representation requested by viewer"""
+    raw = repr(
+        (
+            watermark,
+            request.user.pk,
+            request.accepted_media_type,
+            request.get_host(),
+            sorted(request.query_params.lists()),
+        )
+    )
+    return f'W/"{hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()}"'
+
+
+class SparseFieldsViewMixin:
+    """Skip joins / annotations / prefetches of fields that are not returned"""
+
+    def field_requested(self, *names) -> bool:
+        serializer_class = self.get_serializer_class()
+        if self.request.method not in SAFE_METHODS or not issubclass(
+            serializer_class, SparseFieldsMixin
+        ):
+            return True
+        return bool(serializer_class.sparse_fields(self.request) & set(names))
+
+
+class FastListMixin:
+    """
+    List from .values() rows through a compiled row converter instead of
+    model & serializer instances (FAST_LIST_SERIALIZATION). The output is
+    the same, serializers the converter doesn't support use the usual path.
+    """
+
+    fast_list = settings.FAST_LIST_SERIALIZATION
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        converter = self.fast_list and row_converter(
+            serializer_class, frozenset(serializer_class.sparse_fields(request))
+        )
+        queryset = self.filter_queryset(self.get_queryset())
+        if not converter or not converter.supports(queryset):
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+
+        rows = converter.values(queryset, *getattr(self.paginator, "key_fields", ()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(converter.serialize(page, request))
+        return Response(converter.serialize(list(rows), request))
+
+
+class ConditionalGetMixin:
+    """
+    Weak ETag (+ Last-Modified) of a cheap watermark: updated_at of details
+    and of users of their previews, page keys of post lists, version counter
+    of profile lists. Requests with a matching If-None-Match /
+    If-Modified-Since get a 304 before the response is built.
+    """
+
+    def conditional_response(self, request, watermark, compute, last_modified=None):
+        if not settings.CONDITIONAL_GET or watermark is None:
+            return compute()
+        etag = weak_etag(request, watermark)
+        timestamp = last_modified and calendar.timegm(last_modified.utctimetuple())
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = compute()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response["ETag"] = etag
+        if timestamp:
+            response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    @staticmethod
+    def last_modified(queryset, pk, *fields):
+        """Latest of datetime fields of object pk, None if it doesn't exist"""
+        try:
+            row = queryset.filter(pk=pk).values_list(*fields).first()
+        except (TypeError, ValueError):
+            return None
+        return row and max(row)
+
+    def previews_modified(self, last_modified, previews: dict):
+        """
+        Latest of last_modified and updated_at of users embedded by requested
+        previews: {field: (rows, ordering, user field)}, ex. liker emails
+        """
+        for field_name, (rows, ordering, user_field) in previews.items():
+            if not self.field_requested(field_name):
+                continue
+            users_modified = rows.order_by(*ordering).values_list(
+                f"{user_field}__updated_at", flat=True
+            )[: settings.EMBED_PREVIEW_SIZE]
+            last_modified = max([last_modified, *users_modified])
+        return last_modified
+
+
 class UserProfileViewSet(
+    ConditionalGetMixin,
+    FastListMixin,
+    SparseFieldsViewMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
     mixins.ListModelMixin,
@@ -39,21 +222,14 @@ class UserProfileViewSet(
 ):
     """User Profile"""
 
-    queryset = (
-        get_user_model()
-        .objects.all()
-        .annotate(
-            followers_count=(Count("followers", distinct=True)),
-            followed_by_count=(Count("followed_by", distinct=True)),
-        )
-    )
+    queryset = get_user_model().objects.all()
     permission_classes = [IsOwnerUserOrReadOnly]
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
     def get_serializer_class(self):
-        if self.action == "list":
+        if self.action in ("list", "get_followers", "get_followed_by"):
             return UserProfileListSerializer
         if self.action == "retrieve":
             return UserProfileDetailSerializer
@@ -61,20 +237,40 @@ class UserProfileViewSet(
             return UserProfilePictureSerializer
         if self.action in ("follow", "unfollow"):
             return UserFollowSerializer
+        if self.action == "follows":
+            return FollowBatchSerializer
+        if self.action == "relationships":
+            return RelationLookupSerializer
         return UserProfileSerializer
 
     def get_queryset(self):
         queryset = self.queryset
-        if self.action == "retrieve":
-            queryset = queryset.prefetch_related("followers")
+        if self.action in ("list", "retrieve") and self.field_requested(
+            "is_following", "follows_me"
+        ):
+            queryset = relations.annotate_follow_flags(queryset, self.request.user)
+        if self.action == "retrieve" and self.field_requested("followers"):
+            queryset = queryset.prefetch_related(
+                preview(
+                    "follower_links",
+                    Follow.objects.select_related("to_user"),
+                    FollowPagination.ordering,
+                    "followers_preview",
+                )
+            )
+        if self.action == "retrieve" and self.field_requested("followed_by"):
+            queryset = queryset.prefetch_related(
+                preview(
+                    "followed_by_links",
+                    Follow.objects.select_related("from_user"),
+                    FollowPagination.ordering,
+                    "followed_by_preview",
+                )
+            )
         # filtering by email, first_name, last_name
         name = self.request.query_params.get("name")
         if name:
-            queryset = queryset.filter(
-                Q(email__icontains=name)
-                | Q(first_name__icontains=name)
-                | Q(last_name__icontains=name)
-            )
+            queryset = search_users(queryset, name)
         return queryset
 
     @action(
@@ -90,6 +286,8 @@ class UserProfileViewSet(
 
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        if user.profile_picture:
+            schedule_image_variants(user, "profile_picture")
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["POST"], permission_classes=[IsAuthenticated])
@@ -126,6 +324,54 @@ class UserProfileViewSet(
             status=status.HTTP_200_OK,
         )
 
+    @action(
+        detail=True,
+        methods=["PUT", "DELETE"],
+        url_path="my-follow",
+        permission_classes=[IsAuthenticated],
+    )
+    def my_follow(self, request, pk=None):
+        """Endpoint for idempotent follow (PUT) / unfollow (DELETE) of user"""
+        if request.method == "PUT":
+            write = relations.follow_user
+        else:
+            write = relations.unfollow_user
+        try:
+            following, followers_count = write(request.user.id, int(pk))
+        except (relations.TargetNotFound, ValueError):
+            raise NotFound
+        return Response(
+            {
+                "user": int(pk),
+                "following": following,
+                "followers_count": followers_count,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path="follows",
+        permission_classes=[IsAuthenticated],
+    )
+    def follows(self, request):
+        """Endpoint for follow / unfollow of many users at once"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = relations.batch_follows(
+            request.user.id,
+            serializer.validated_data["follow"],
+            serializer.validated_data["unfollow"],
+        )
+        return Response(
+            [
+                {"user": pk, "following": following, "followers_count": count}
+                for pk, (following, count) in results.items()
+            ],
+            status=status.HTTP_200_OK,
+        )
+
     @action(
         methods=["GET"],
         detail=True,
@@ -133,10 +379,10 @@ class UserProfileViewSet(
         permission_classes=[IsAuthenticated],
     )
     def get_followers(self, request, pk=None):
-        """List all followers"""
+        """List all followers, latest first"""
         user = self.get_object()
-        serializer = UserFollowSerializer(user.followers.all(), many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        follows = Follow.objects.filter(from_user=user).select_related("to_user")
+        return self.paginated_users(follows, "to_user")
 
     @action(
         methods=["GET"],
@@ -145,39 +391,100 @@ class UserProfileViewSet(
         permission_classes=[IsAuthenticated],
     )
     def get_followed_by(self, request, pk=None):
-        """List all users that followed by current user"""
+        """List all users that followed by current user, latest first"""
         user = self.get_object()
-        followed_by = user.followed_by.all()
-        serializer = UserFollowSerializer(followed_by, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        follows = Follow.objects.filter(to_user=user).select_related("from_user")
+        return self.paginated_users(follows, "from_user")
+
+    def paginated_users(self, follows, user_attr: str):
+        """Page of Follow rows by follow time, serialized as their users"""
+        paginator = FollowPagination()
+        page = paginator.paginate_queryset(follows, self.request, view=self)
+        users = [getattr(follow, user_attr) for follow in page]
+        if self.field_requested("is_following", "follows_me"):
+            relations.set_follow_flags(users, self.request.user)
+        serializer = self.get_serializer(users, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @extend_schema(parameters=[IDS_PARAMETER])
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="relationships",
+        permission_classes=[IsAuthenticated],
+    )
+    def relationships(self, request):
+        """Follow flags of current user and many users in one query"""
+        ids = lookup_ids(self.get_serializer_class(), request)
+        flags = relations.relationships(request.user, ids)
+        return Response(
+            [
+                {"user": pk, "is_following": is_following, "follows_me": follows_me}
+                for pk, (is_following, follows_me) in sorted(flags.items())
+            ],
+            status=status.HTTP_200_OK,
+        )
+
+    @extend_schema(parameters=[*SPARSE_PARAMETERS, EMBED_PARAMETER])
+    def retrieve(self, request, *args, **kwargs):
+        retrieve = partial(super().retrieve, request, *args, **kwargs)
+        last_modified = self.last_modified(self.queryset, kwargs["pk"], "updated_at")
+        if last_modified is None:
+            return retrieve()
+        last_modified = self.previews_modified(
+            last_modified,
+            {
+                "followers": (
+                    Follow.objects.filter(from_user_id=kwargs["pk"]),
+                    FollowPagination.ordering,
+                    "to_user",
+                ),
+                "followed_by": (
+                    Follow.objects.filter(to_user_id=kwargs["pk"]),
+                    FollowPagination.ordering,
+                    "from_user",
+                ),
+            },
+        )
+        return self.conditional_response(
+            request,
+            last_modified,
+            lambda: profile_cache.cached_response(
+                profile_cache.retrieve_key(kwargs["pk"], request), retrieve
+            ),
+            last_modified=last_modified,
+        )
 
     @extend_schema(
         parameters=[
+            *SPARSE_PARAMETERS,
             OpenApiParameter(
                 "name",
                 type=OpenApiTypes.STR,
                 description="Filter by part of email or first_name "
                 "or last_name (ex. ?name=value). "
-                "Case-insensitive lookup that contains value",
+                "Case-insensitive lookup that contains value, "
+                "prefix matches first",
             ),
         ]
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
-
-
-class PostPagination(PageNumberPagination):
-    page_size = 3
-    max_page_size = 100
+        list_profiles = partial(super().list, request, *args, **kwargs)
+        return self.conditional_response(
+            request,
+            profile_cache.list_version(),
+            lambda: profile_cache.cached_response(
+                profile_cache.list_key(request), list_profiles
+            ),
+        )
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(
+    ConditionalGetMixin, FastListMixin, SparseFieldsViewMixin, viewsets.ModelViewSet
+):
     """Post CRUD"""
 
-    queryset = Post.objects.annotate(
-        likes_count=Count("likes", distinct=True),
-        comments_count=Count("comments", distinct=True),
-    ).select_related("user")
+    queryset = Post.objects.all()
     serializer_class = PostSerializer
     pagination_class = PostPagination
     permission_classes = [
@@ -193,7 +500,7 @@ class PostViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def get_serializer_class(self):
-        if self.action == "list":
+        if self.action in ("list", "liked_posts"):
             return PostListSerializer
         if self.action == "update":
             return PostUpdateSerializer
@@ -201,27 +508,61 @@ class PostViewSet(viewsets.ModelViewSet):
             return PostDetailSerializer
         if self.action == "image":
             return PostImageSerializer
-        if self.action == "comment":
+        if self.action in ("comment", "comments"):
             return CommentSerializer
         if self.action in ("like", "unlike"):
             return PostLikeSerializer
+        if self.action == "likers":
+            return UserFollowSerializer
+        if self.action == "likes":
+            return LikeBatchSerializer
+        if self.action == "like_status":
+            return RelationLookupSerializer
 
         return PostSerializer
 
+    @cached_property
+    def tag(self) -> str:
+        """Normalized hashtag of ?tag=, "" without it"""
+        return normalize_hashtag(self.request.query_params.get("tag", ""))
+
+    @property
+    def paginator(self):
+        # lists are read from the PostTag / TimelineEntry indexes
+        if self.action == "list" and not hasattr(self, "_paginator"):
+            self._paginator = TagPostPagination() if self.tag else TimelinePagination()
+        return super().paginator
+
     def get_queryset(self):
         queryset = self.queryset
 
-        tag = self.request.query_params.get("tag")
-        if tag:
-            queryset = queryset.filter(content__icontains=tag)
-
-        if self.action == "list":
-            queryset = queryset.filter(
-                Q(user=self.request.user)
-                | Q(user__in=self.request.user.followed_by.values("id"))
+        if self.tag and self.action != "list":
+            queryset = queryset.filter(post_tags__tag__name=self.tag)
+
+        if self.action == "list" and self.tag:
+            queryset = queryset.filter(home_timeline_filter(self.request.user))
+        if self.field_requested("user"):
+            queryset = queryset.select_related("user")
+        if self.action in ("list", "retrieve") and self.field_requested("liked_by_me"):
+            queryset = relations.annotate_liked_by_me(queryset, self.request.user)
+        if self.action == "retrieve" and self.field_requested("likes"):
+            queryset = queryset.prefetch_related(
+                preview(
+                    "post_likes",
+                    Like.objects.select_related("user"),
+                    LikePagination.ordering,
+                    "likes_preview",
+                )
+            )
+        if self.action == "retrieve" and self.field_requested("comments"):
+            queryset = queryset.prefetch_related(
+                preview(
+                    "comments",
+                    Comment.objects.select_related("user"),
+                    CommentPagination.ordering,
+                    "comments_preview",
+                )
             )
-        if self.action == "retrieve":
-            queryset = queryset.prefetch_related("comments__user")
         return queryset
 
     def create(self, request, *args, **kwargs):
@@ -236,29 +577,24 @@ class PostViewSet(viewsets.ModelViewSet):
         post_at = request.data.get("post_at")
 
         if post_at:
-            image = self.request.FILES.get("image")
-            if image:
-                image = image.read()
-                byte = base64.b64encode(image)
-                image_data = {
-                    "image": byte.decode("utf-8"),
-                    "name": self.request.FILES.get("image").name,
-                }
-            else:
-                image_data = None
-
             post_at = datetime.strptime(post_at, "%Y-%m-%dT%H:%M").astimezone(
                 timezone.utc
             )
-            publish_post.apply_async(
-                args=[request.data.get("content"), image_data, request.user.id],
-                eta=post_at,
+            image = self.request.FILES.get("image")
+            ScheduledPost.objects.create(
+                user=user,
+                content=serializer.validated_data["content"],
+                image=image,
+                image_name=image.name if image else "",
+                post_at=post_at,
             )
             return Response(
                 f"Post will be published at {post_at} UTC", status=status.HTTP_200_OK
             )
 
-        serializer.save(user=user)
+        post = serializer.save(user=user)
+        if post.image:
+            schedule_image_variants(post, "image")
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(
@@ -274,6 +610,8 @@ class PostViewSet(viewsets.ModelViewSet):
 
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        if post.image:
+            schedule_image_variants(post, "image")
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(methods=["POST"], detail=True)
@@ -287,6 +625,34 @@ class PostViewSet(viewsets.ModelViewSet):
         )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="comments",
+        pagination_class=CommentPagination,
+    )
+    def comments(self, request, pk=None):
+        """Endpoint for list of comments of post"""
+        comments = Comment.objects.filter(post_id=pk)
+        if self.field_requested("user"):
+            comments = comments.select_related("user")
+        page = self.paginate_queryset(comments)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="likers",
+        pagination_class=LikePagination,
+    )
+    def likers(self, request, pk=None):
+        """Endpoint for list of users who liked post, latest first"""
+        likes = Like.objects.filter(post_id=pk).select_related("user")
+        page = self.paginate_queryset(likes)
+        serializer = self.get_serializer([like.user for like in page], many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=["POST"], permission_classes=[IsAuthenticated])
     def like(self, request, pk=None):
         """Endpoint for like of post"""
@@ -301,36 +667,158 @@ class PostViewSet(viewsets.ModelViewSet):
         post_to_like.likes.remove(self.request.user)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=True, methods=["PUT", "DELETE"], url_path="my-like")
+    def my_like(self, request, pk=None):
+        """Endpoint for idempotent like (PUT) / unlike (DELETE) of post"""
+        write = (
+            relations.like_post if request.method == "PUT" else relations.unlike_post
+        )
+        try:
+            liked, likes_count = write(request.user.id, int(pk))
+        except (relations.TargetNotFound, ValueError):
+            raise NotFound
+        return Response(
+            {"post": int(pk), "liked": liked, "likes_count": likes_count},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["POST"], url_path="likes")
+    def likes(self, request):
+        """Endpoint for like / unlike of many posts at once"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = relations.batch_likes(
+            request.user.id,
+            serializer.validated_data["like"],
+            serializer.validated_data["unlike"],
+        )
+        return Response(
+            [
+                {"post": pk, "liked": liked, "likes_count": count}
+                for pk, (liked, count) in results.items()
+            ],
+            status=status.HTTP_200_OK,
+        )
+
+    @extend_schema(parameters=[IDS_PARAMETER])
+    @action(detail=False, methods=["GET"], url_path="like-status")
+    def like_status(self, request):
+        """Endpoint for liked_by_me flags of many posts in one query"""
+        ids = lookup_ids(self.get_serializer_class(), request)
+        statuses = relations.like_statuses(request.user, ids)
+        return Response(
+            [
+                {"post": pk, "liked_by_me": liked_by_me}
+                for pk, liked_by_me in sorted(statuses.items())
+            ],
+            status=status.HTTP_200_OK,
+        )
+
     @action(
         detail=False,
         methods=["GET"],
         url_path="liked_posts",
         permission_classes=[IsAuthenticated],
+        pagination_class=LikePagination,
     )
     def liked_posts(self, request, pk=None):
-        """Endpoint for list of all liked post by current user"""
-        posts = Post.objects.filter(likes=self.request.user).select_related()
-        serializer = PostListSerializer(posts, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        """Endpoint for list of posts liked by current user, latest like first"""
+        likes = Like.objects.filter(user=self.request.user).select_related(
+            "post__user" if self.field_requested("user") else "post"
+        )
+        page = self.paginate_queryset(likes)
+        posts = [like.post for like in page]
+        for post in posts:
+            post.liked_by_me = True
+        serializer = self.get_serializer(posts, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(parameters=[*SPARSE_PARAMETERS, EMBED_PARAMETER])
+    def retrieve(self, request, *args, **kwargs):
+        last_modified = self.last_modified(
+            self.queryset, kwargs["pk"], "updated_at", "user__updated_at"
+        )
+        retrieve = partial(super().retrieve, request, *args, **kwargs)
+        if last_modified is None:
+            # missing post or malformed pk: the 404 of retrieve, nothing cached
+            return retrieve()
+        last_modified = self.previews_modified(
+            last_modified,
+            {
+                "likes": (
+                    Like.objects.filter(post_id=kwargs["pk"]),
+                    LikePagination.ordering,
+                    "user",
+                ),
+                "comments": (
+                    Comment.objects.filter(post_id=kwargs["pk"]),
+                    CommentPagination.ordering,
+                    "user",
+                ),
+            },
+        )
+        return self.conditional_response(
+            request,
+            last_modified,
+            lambda: self.cached_retrieve(
+                request, kwargs["pk"], last_modified, retrieve
+            ),
+            last_modified=last_modified,
+        )
+
+    def cached_retrieve(self, request, pk, version, retrieve) -> Response:
+        """Post detail from the coalesced micro-cache, liked_by_me of viewer"""
+        payload, source, shared = post_cache.cached_payload(
+            pk, version.isoformat(), request, lambda: retrieve().data
+        )
+        if "liked_by_me" in payload and (shared or source != "MISS"):
+            liked = relations.like_statuses(request.user, [int(pk)])
+            payload = {**payload, "liked_by_me": liked.get(int(pk), False)}
+        return Response(payload, headers={"X-Cache": source})
 
     @extend_schema(
         parameters=[
+            *SPARSE_PARAMETERS,
             OpenApiParameter(
                 "tag",
                 type=OpenApiTypes.STR,
-                description="Filter by tag (ex. ?tag=part-of-post-msg). "
-                "Case-insensitive lookup that contains tag",
+                description="Filter by hashtag of post content "
+                "(ex. ?tag=news or ?tag=%23news). Case-insensitive",
             ),
         ]
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        list_posts = partial(super().list, request, *args, **kwargs)
+        if not settings.CONDITIONAL_GET:
+            return list_posts()
+        return self.conditional_response(
+            request, self.list_watermark(request), list_posts
+        )
+
+    def list_watermark(self, request) -> tuple:
+        """
+        Page of the viewer: ids of its posts, its links and the latest
+        updated_at of the posts and authors (likes, comments, edits and
+        profile saves bump them). Index rows are reused by the list.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        ids = self.paginator.page_ids(queryset, request, self)
+        latest = Post.objects.filter(pk__in=ids).aggregate(
+            posts=Max("updated_at"), authors=Max("user__updated_at")
+        )
+        return (
+            ids,
+            self.paginator.has_next,
+            self.paginator.has_previous,
+            latest["posts"],
+            latest["authors"],
+        )
 
 
 class CommentViewSet(viewsets.ModelViewSet):
     """Comment CRUD"""
 
-    queryset = Comment.objects.select_related()
+    queryset = Comment.objects.select_related("user")
     permission_classes = [
         IsOwnerOrReadOnly,
     ]
@@ -343,3 +831,36 @@ class CommentViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = self.queryset.filter(user_id=self.request.user.id)
         return queryset
+
+
+class ScheduledPostViewSet(
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    GenericViewSet,
+):
+    """Pending scheduled posts of current user"""
+
+    serializer_class = ScheduledPostSerializer
+    pagination_class = ScheduledPostPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ScheduledPost.objects.filter(
+            user=self.request.user, status=ScheduledPost.Status.PENDING
+        )
+
+    @action(detail=True, methods=["POST"])
+    def cancel(self, request, pk=None):
+        """Endpoint for cancelling of scheduled post"""
+        scheduled_post = self.get_object()
+        cancelled = ScheduledPost.objects.filter(
+            pk=scheduled_post.pk, status=ScheduledPost.Status.PENDING
+        ).update(status=ScheduledPost.Status.CANCELLED, image=None)
+        if not cancelled:
+            return Response(
+                {"detail": "Post is already published"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if scheduled_post.image:
+            scheduled_post.image.delete(save=False)
+        return Response(status=status.HTTP_204_NO_CONTENT)
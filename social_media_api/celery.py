@@ -1,6 +1,7 @@
 import os
 from celery import Celery
 
+from social_media_api import metrics  # noqa: F401 celery task metrics
 from social_media_api import settings
 
 # Set the default Django settings module for the 'celery' program.
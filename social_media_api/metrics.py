@@ -0,0 +1,194 @@
+"""
+Prometheus metrics of API requests, ORM queries, caches and Celery tasks.
+
+For gunicorn / celery prefork workers set PROMETHEUS_MULTIPROC_DIR to an
+empty directory (cleaned on deploy) before the processes start: every
+process writes its samples there and /metrics aggregates all of them.
+"""
+
+import os
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from celery import signals as celery_signals
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+from social_media_api import settings
+
+REQUEST_LATENCY = Histogram(
+    "api_request_duration_seconds",
+    "API request latency",
+    ["view", "action", "method", "status"],
+)
+RESPONSE_SIZE = Histogram(
+    "api_response_size_bytes",
+    "API response body size",
+    ["view", "action"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+DB_QUERIES = Histogram(
+    "api_request_db_queries",
+    "SQL queries per API request",
+    ["view", "action"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+DB_DURATION = Histogram(
+    "api_request_db_duration_seconds",
+    "SQL time per API request",
+    ["view", "action"],
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Application cache lookups by result",
+    ["cache", "result"],
+)
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Celery task run time",
+    ["task"],
+)
+TASK_QUEUE_LAG = Histogram(
+    "celery_task_queue_lag_seconds",
+    "Delay between eta and start of scheduled Celery tasks",
+    ["task"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600),
+)
+TASK_FAILURES = Counter(
+    "celery_task_failures_total",
+    "Failed Celery tasks",
+    ["task"],
+)
+
+
+def multiprocess_mode() -> bool:
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def collector_registry():
+    if not multiprocess_mode():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Prometheus exposition of the metrics of all processes"""
+    return HttpResponse(
+        generate_latest(collector_registry()), content_type=CONTENT_TYPE_LATEST
+    )
+
+
+def record_cache_lookup(cache: str, result: str) -> None:
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def view_labels(request, view_func) -> tuple:
+    """(view, action): viewset class & action, view class or function name"""
+    view_class = getattr(view_func, "cls", None) or getattr(
+        view_func, "view_class", None
+    )
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}", ""
+    actions = getattr(view_func, "actions", None) or {}
+    return view_class.__name__, actions.get(request.method.lower(), "")
+
+
+class QueryStats:
+    """Execute wrapper counting and timing SQL queries"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """Latency, response size and SQL queries / time per view & action"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        queries = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view, action = getattr(request, "metrics_labels", ("unresolved", ""))
+        REQUEST_LATENCY.labels(
+            view, action, request.method, response.status_code
+        ).observe(duration)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view, action).observe(len(response.content))
+        DB_QUERIES.labels(view, action).observe(queries.count)
+        DB_DURATION.labels(view, action).observe(queries.duration)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_labels = view_labels(request, view_func)
+
+
+def parse_eta(eta):
+    if isinstance(eta, str):
+        eta = datetime.fromisoformat(eta)
+    if eta.tzinfo is None:
+        eta = eta.replace(tzinfo=timezone.utc)
+    return eta
+
+
+@celery_signals.task_prerun.connect
+def task_started(task_id, task, **kwargs):
+    # kept on the request context of the run: dropped with it, postrun or not
+    task.request.metrics_started_at = time.perf_counter()
+    eta = task.request.eta
+    if eta:
+        lag = datetime.now(timezone.utc) - parse_eta(eta)
+        TASK_QUEUE_LAG.labels(task.name).observe(max(lag.total_seconds(), 0))
+
+
+@celery_signals.task_postrun.connect
+def task_finished(task_id, task, **kwargs):
+    started = getattr(task.request, "metrics_started_at", None)
+    if started is not None:
+        TASK_DURATION.labels(task.name).observe(time.perf_counter() - started)
+
+
+@celery_signals.task_failure.connect
+def task_failed(sender=None, **kwargs):
+    TASK_FAILURES.labels(sender.name).inc()
+
+
+@celery_signals.worker_init.connect
+def start_worker_metrics_server(**kwargs):
+    """Workers run no web server: expose their metrics on a port of their own"""
+    if settings.CELERY_METRICS_PORT:
+        start_http_server(settings.CELERY_METRICS_PORT, registry=collector_registry())
+
+
+@celery_signals.worker_process_shutdown.connect
+def worker_process_exited(pid=None, **kwargs):
+    if multiprocess_mode():
+        multiprocess.mark_process_dead(pid or os.getpid())
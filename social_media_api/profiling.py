@@ -0,0 +1,195 @@
+"""
+On-demand profiling of single requests.
+
+A request is profiled when a staff user sends PROFILING_HEADER or it is
+sampled (PROFILING_SAMPLE_RATE, saved without query string). cProfile stats
+and the SQL timeline are written to PROFILING_DIR, which keeps the latest
+PROFILING_KEEP profiles, and are browsed in the admin under admin/profiles/.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import random
+import re
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import Http404
+from django.template.response import TemplateResponse
+from rest_framework.exceptions import APIException
+
+from social_media_api import settings
+from user.authentication import CachedJWTAuthentication
+
+PROFILE_ID = re.compile(r"^\d{8}T\d{12}-[0-9a-f]{8}$")
+
+
+class SQLTimeline:
+    """Execute wrapper recording offset, duration and SQL of every query"""
+
+    def __init__(self, start: float):
+        self.start = start
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                {
+                    "at_ms": round((started - self.start) * 1000, 3),
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "sql": sql,
+                }
+            )
+
+
+def is_staff_request(request) -> bool:
+    """
+    Staff of the admin session or of the JWT of the request, the
+    authentication is kept on the request and reused by DRF
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_staff:
+        return True
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except APIException:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def profile_reason(request):
+    """Why request is profiled: "header", "sample" or None"""
+    header = "HTTP_" + settings.PROFILING_HEADER.upper().replace("-", "_")
+    if request.META.get(header):
+        return "header" if is_staff_request(request) else None
+    if random.random() < settings.PROFILING_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def profiles_dir() -> Path:
+    return Path(settings.PROFILING_DIR)
+
+
+def rotate(directory: Path) -> None:
+    """
+    Delete all but the latest PROFILING_KEEP profiles. Lists the directory:
+    ~PROFILING_KEEP entries per saved profile, i.e. per header request and
+    per PROFILING_SAMPLE_RATE of the traffic
+    """
+    for meta in sorted(directory.glob("*.json"))[: -settings.PROFILING_KEEP]:
+        meta.with_suffix(".prof").unlink(missing_ok=True)
+        meta.unlink(missing_ok=True)
+
+
+def save_profile(request, response, profiler, timeline, duration, reason) -> str:
+    directory = profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    captured_at = datetime.now(timezone.utc)
+    profile_id = f"{captured_at:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+
+    profiler.dump_stats(directory / f"{profile_id}.prof")
+    meta = {
+        "id": profile_id,
+        "captured_at": captured_at.isoformat(),
+        "reason": reason,
+        "method": request.method,
+        # sampled requests of any user: no query strings (searches, tokens)
+        "path": request.get_full_path() if reason == "header" else request.path,
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 3),
+        "sql_count": len(timeline.queries),
+        "sql_ms": round(sum(query["duration_ms"] for query in timeline.queries), 3),
+        "queries": timeline.queries,
+    }
+    (directory / f"{profile_id}.json").write_text(json.dumps(meta))
+    rotate(directory)
+    return profile_id
+
+
+class ProfilingMiddleware:
+    """cProfile + SQL timeline of requests of staff header or sampled ones"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason = profile_reason(request)
+        if reason is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        timeline = SQLTimeline(start)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timeline))
+            try:
+                profiler.enable()
+            except ValueError:
+                # another profiler is active in this thread
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        response["X-Profile-Id"] = save_profile(
+            request, response, profiler, timeline, duration, reason
+        )
+        return response
+
+
+def load_meta(profile_id: str) -> dict:
+    path = profiles_dir() / f"{profile_id}.json"
+    if not PROFILE_ID.match(profile_id) or not path.exists():
+        raise Http404("Profile not found")
+    return json.loads(path.read_text())
+
+
+def hotspots(profile_id: str, sort: str, limit: int = 30) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(str(profiles_dir() / f"{profile_id}.prof"), stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+@staff_member_required
+def profiles_view(request):
+    """Captured request profiles, latest first"""
+    profiles = [
+        json.loads(path.read_text())
+        for path in sorted(profiles_dir().glob("*.json"), reverse=True)
+    ]
+    context = {
+        **admin.site.each_context(request),
+        "title": "Request profiles",
+        "profiles": profiles,
+    }
+    return TemplateResponse(request, "admin/request_profiles.html", context)
+
+
+@staff_member_required
+def profile_view(request, profile_id):
+    """Top hotspots and SQL timeline of a captured request"""
+    meta = load_meta(profile_id)
+    context = {
+        **admin.site.each_context(request),
+        "title": f"{meta['method']} {meta['path']}",
+        "profile": meta,
+        "cumulative": hotspots(profile_id, "cumulative"),
+        "tottime": hotspots(profile_id, "tottime"),
+    }
+    return TemplateResponse(request, "admin/request_profile.html", context)
@@ -0,0 +1,142 @@
+"""
+Query budgets per view & action and N+1 detection.
+
+Every SQL statement of a request is reduced to its shape (placeholders
+only, IN lists collapsed). A request over the budget of its action
+(QUERY_BUDGETS) or repeating a shape QUERY_REPEAT_THRESHOLD times is
+logged, or raises QueryBudgetExceeded with QUERY_BUDGET_MODE = "raise".
+Transaction control (BEGIN, COMMIT, SAVEPOINT ...) is not counted.
+
+The budget is checked once the response is built, when the writes of
+the request are already committed: "raise" is meant for tests and
+development, where it fails the request loudly, not for production.
+"""
+
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+from social_media_api import settings
+from social_media_api.metrics import view_labels
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+TRANSACTION_CONTROL = re.compile(
+    r"\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|START TRANSACTION|END)\b",
+    re.IGNORECASE,
+)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def sql_shape(sql: str) -> str:
+    return IN_LIST.sub("IN (...)", sql)
+
+
+class QueryLog:
+    """Execute wrapper counting SQL shapes"""
+
+    def __init__(self):
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not TRANSACTION_CONTROL.match(sql):
+            self.shapes[sql_shape(sql)] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self) -> int:
+        return sum(self.shapes.values())
+
+    def repeated(self, threshold: int) -> dict:
+        return {shape: n for shape, n in self.shapes.items() if n >= threshold}
+
+
+@contextmanager
+def query_log():
+    """QueryLog of the queries on all database connections of the thread"""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
+
+
+def get_budget(view: str, action: str):
+    """Budget of view.action, then of view, then QUERY_BUDGET_DEFAULT"""
+    budgets = settings.QUERY_BUDGETS
+    return budgets.get(
+        f"{view}.{action}", budgets.get(view, settings.QUERY_BUDGET_DEFAULT)
+    )
+
+
+def problems(view: str, action: str, log: QueryLog) -> list:
+    found = []
+    budget = get_budget(view, action)
+    if budget is not None and log.count > budget:
+        found.append(f"{log.count} queries over budget of {budget}")
+    for shape, repeats in log.repeated(settings.QUERY_REPEAT_THRESHOLD).items():
+        found.append(f"N+1: {repeats} x {shape}")
+    return found
+
+
+class QueryBudgetMiddleware:
+    """Logs / raises on views over their query budget or with N+1 queries"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.QUERY_BUDGET_MODE == "off":
+            return self.get_response(request)
+
+        with query_log() as log:
+            response = self.get_response(request)
+
+        labels = getattr(request, "query_budget_labels", None)
+        found = labels and problems(*labels, log)
+        if found:
+            message = f"{request.method} {request.path} ({'.'.join(labels)}): " + (
+                "; ".join(found)
+            )
+            if settings.QUERY_BUDGET_MODE == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget_labels = view_labels(request, view_func)
+
+
+class QueryBudgetTestMixin:
+    """TestCase assertions of query budgets and constant query counts"""
+
+    def assertQueryBudget(self, url: str, client=None):
+        """GET url within the budget of its view action, without N+1 queries"""
+        with query_log() as log:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200, url)
+        match = response.resolver_match
+        view, action = view_labels(response.wsgi_request, match.func)
+        found = problems(view, action, log)
+        self.assertFalse(found, f"{url} ({view}.{action}): {found}")
+        return log.count
+
+    def assertConstantQueries(self, urls, grow, sizes=(1, 5, 20), client=None):
+        """
+        Query counts of GET urls are the same for every data size:
+        grow(size) brings the data up to size before the requests
+        """
+        counts = {url: {} for url in urls}
+        for size in sizes:
+            grow(size)
+            for url in urls:
+                counts[url][size] = self.assertQueryBudget(url, client)
+        for url, url_counts in counts.items():
+            self.assertEqual(len(set(url_counts.values())), 1, f"{url}: {url_counts}")
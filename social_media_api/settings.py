@@ -27,6 +27,8 @@ SECRET_KEY = os.environ.get(
 )
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
+# debug toolbar is useless under load: on by default only with DEBUG
+DEBUG_TOOLBAR = os.environ.get("DEBUG_TOOLBAR", "1" if DEBUG else "0") == "1"
 
 ALLOWED_HOSTS = []
 
@@ -39,7 +41,6 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "debug_toolbar",
     "rest_framework",
     "rest_framework_simplejwt.token_blacklist",
     "drf_spectacular",
@@ -48,16 +49,22 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "social_media_api.metrics.MetricsMiddleware",
+    "social_media_api.querybudget.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "social_media_api.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.append("debug_toolbar.middleware.DebugToolbarMiddleware")
+
 ROOT_URLCONF = "social_media_api.urls"
 
 TEMPLATES = [
@@ -124,6 +131,53 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Shared cache: Redis when CACHE_REDIS_URL is set, else per-process memory
+# (version counters of cached responses / ETags need it with several processes)
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+PROFILE_CACHE_REDIS_URL = os.environ.get("PROFILE_CACHE_REDIS_URL", CACHE_REDIS_URL)
+CACHES = {
+    "default": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+        if CACHE_REDIS_URL
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    ),
+    "profiles": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": PROFILE_CACHE_REDIS_URL,
+            "KEY_PREFIX": "profiles",
+        }
+        if PROFILE_CACHE_REDIS_URL
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "profiles",
+        }
+    ),
+}
+
+# Versioned response cache of profile endpoints
+PROFILE_CACHE_ALIAS = "profiles"
+PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", 300))
+
+# ETags of posts & profiles (304 Not Modified). Versions of profile lists
+# live in the profile cache: a process-local one fails at startup
+CONDITIONAL_GET = (
+    os.environ.get("CONDITIONAL_GET", "1" if PROFILE_CACHE_REDIS_URL else "0") == "1"
+)
+
+# Coalesced micro-cache of post detail payloads (seconds)
+POST_CACHE_ALIAS = "default"
+POST_CACHE_TTL = float(os.environ.get("POST_CACHE_TTL", 5))
+POST_CACHE_STALE_TTL = 60
+POST_CACHE_LOCK_TTL = 10
+POST_CACHE_LOCK_WAIT = 2.0
+POST_CACHE_POLL_INTERVAL = 0.05
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
@@ -132,6 +186,28 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+STORAGES = {
+    # uploads are deduplicated by content, see social_media.storage
+    "default": {
+        "BACKEND": "social_media.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+# unreferenced media blobs and untracked blob files younger than that
+# are kept by gc_media_blobs
+MEDIA_BLOB_GC_GRACE_PERIOD = timedelta(hours=6)
+
+# max width / height of resized renditions of uploaded images
+IMAGE_VARIANT_SIZES = {
+    "thumbnail": 150,
+    "small": 320,
+    "medium": 640,
+    "large": 1280,
+}
+IMAGE_VARIANT_QUALITY = 80
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -139,19 +215,85 @@ MEDIA_ROOT = BASE_DIR / "media"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("user.authentication.CachedJWTAuthentication",),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": (
+        "social_media.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+}
+
+# Keyset pagination of API lists
+PAGINATION_PAGE_SIZE = int(os.environ.get("PAGINATION_PAGE_SIZE", 10))
+PAGINATION_MAX_PAGE_SIZE = 100
+
+# SQL queries per request of view actions ("View.action" or "View"),
+# repeated query shapes reported as N+1. Mode: log | raise | off
+# (raise fails requests after their writes are committed: tests / dev only)
+QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "log")
+QUERY_BUDGET_DEFAULT = None
+QUERY_REPEAT_THRESHOLD = 5
+QUERY_BUDGETS = {
+    # + 1 for the user of JWT authentication on a user cache miss
+    "PostViewSet.list": 5,
+    "PostViewSet.retrieve": 7,
+    "PostViewSet.comments": 2,
+    "PostViewSet.likers": 2,
+    "PostViewSet.liked_posts": 2,
+    "UserProfileViewSet.list": 3,
+    "UserProfileViewSet.retrieve": 7,
+    "UserProfileViewSet.get_followers": 4,
+    "UserProfileViewSet.get_followed_by": 4,
+    "CommentViewSet.list": 2,
+    "CommentViewSet.retrieve": 2,
 }
 
+# On-demand request profiles: staff requests with the header or sampled ones
+PROFILING_HEADER = "X-Profile"
+# every saved profile lists PROFILING_DIR to rotate it: keep the rate low
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+PROFILING_DIR = os.environ.get("PROFILING_DIR", BASE_DIR / "profiles")
+PROFILING_KEEP = 200
+
+# max number of targets of batch like / follow requests
+RELATION_BATCH_MAX_SIZE = 100
+
+# max number of likes / comments / followers embedded in detail responses,
+# full lists are served by paginated sub-resources
+EMBED_PREVIEW_SIZE = int(os.environ.get("EMBED_PREVIEW_SIZE", 5))
+
+# serialize post / profile lists from .values() rows (social_media.fastpath),
+# opt-in: FAST_LIST_SERIALIZATION=1
+FAST_LIST_SERIALIZATION = os.environ.get("FAST_LIST_SERIALIZATION", "0") == "1"
+
+# users of JWT authenticated requests: shared cache & in-process LRU
+JWT_USER_CACHE_TTL = int(os.environ.get("JWT_USER_CACHE_TTL", 60))
+JWT_USER_CACHE_LOCAL_TTL = int(os.environ.get("JWT_USER_CACHE_LOCAL_TTL", 5))
+JWT_USER_CACHE_LOCAL_SIZE = 1024
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=9000),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=14),
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
+    "TOKEN_REFRESH_SERIALIZER": "user.serializers.TokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER": "user.serializers.TokenVerifySerializer",
 }
 
+# Bloom filter of blacklisted refresh tokens (user.blacklist): rebuilt by
+# celery beat, tokens blacklisted since the last build are kept in the cache
+# until they expire (REFRESH_TOKEN_LIFETIME at most)
+JWT_BLACKLIST_FILTER_ERROR_RATE = 0.001
+JWT_BLACKLIST_FILTER_REBUILD_INTERVAL = timedelta(minutes=5)
+# older filter is not trusted: lookups go to the database
+JWT_BLACKLIST_FILTER_MAX_AGE = 3 * int(
+    JWT_BLACKLIST_FILTER_REBUILD_INTERVAL.total_seconds()
+)
+JWT_BLACKLIST_FILTER_LOCAL_TTL = 30
+
+# expired outstanding / blacklisted tokens deleted per statement
+TOKEN_PRUNE_BATCH_SIZE = 1000
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
@@ -162,8 +304,49 @@ CELERY_RESULT_BACKEND = os.environ.get(
     "CELERY_RESULT_BACKEND", "redis://localhost:6379"
 )
 CELERY_TIMEZONE = "UTC"
+# port of the Prometheus metrics of celery workers, 0: not exposed
+CELERY_METRICS_PORT = int(os.environ.get("CELERY_METRICS_PORT", 0))
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+CELERY_BEAT_SCHEDULE = {
+    "dispatch-scheduled-posts": {
+        "task": "social_media.tasks.dispatch_scheduled_posts",
+        "schedule": timedelta(seconds=30),
+    },
+    "cleanup-staged-uploads": {
+        "task": "social_media.tasks.cleanup_staged_uploads",
+        "schedule": timedelta(hours=1),
+    },
+    "gc-media-blobs": {
+        "task": "social_media.tasks.gc_media_blobs",
+        "schedule": timedelta(days=1),
+    },
+    "rebuild-blacklist-filter": {
+        "task": "user.tasks.rebuild_blacklist_filter",
+        "schedule": JWT_BLACKLIST_FILTER_REBUILD_INTERVAL,
+    },
+    "prune-expired-tokens": {
+        "task": "user.tasks.prune_expired_tokens",
+        "schedule": timedelta(hours=6),
+    },
+}
+
+# scheduled posts published by one dispatcher run: batches * batch size
+SCHEDULED_POSTS_BATCH_SIZE = 500
+SCHEDULED_POSTS_MAX_BATCHES = 20
+
+# staged images of scheduled posts are deleted this long after publish time
+# (content-addressed blobs are reclaimed by gc_media_blobs instead)
+STAGED_UPLOAD_GRACE_PERIOD = timedelta(days=1)
+
+# Home timeline (fan-out on write)
+# authors with more followers are merged into feeds on read instead
+TIMELINE_FANOUT_MAX_FOLLOWERS = int(
+    os.environ.get("TIMELINE_FANOUT_MAX_FOLLOWERS", 10000)
+)
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+# number of latest posts copied into the timeline on follow
+TIMELINE_BACKFILL_SIZE = 200
 
 SPECTACULAR_SETTINGS = {
     "TITLE": "Social Media Service API",
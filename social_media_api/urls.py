@@ -25,8 +25,12 @@ from drf_spectacular.views import (
 )
 
 from social_media_api import settings
+from social_media_api.metrics import metrics_view
+from social_media_api.profiling import profile_view, profiles_view
 
 urlpatterns = [
+    path("admin/profiles/", profiles_view, name="request-profiles"),
+    path("admin/profiles/<str:profile_id>/", profile_view, name="request-profile"),
     path("admin/", admin.site.urls),
     path("api/user/", include("user.urls", namespace="user")),
     path("api/", include("social_media.urls", namespace="social_media")),
@@ -39,5 +43,8 @@ urlpatterns = [
     path(
         "api/doc/redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"
     ),
-    path("__debug__/", include("debug_toolbar.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if settings.DEBUG_TOOLBAR:
+    urlpatterns.append(path("__debug__/", include("debug_toolbar.urls")))
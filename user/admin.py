@@ -2,13 +2,33 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.utils.translation import gettext as _
 
-from .models import User
+from .models import Follow, User
+
+
+class FollowerInline(admin.TabularInline):
+    """
+    Followers of the user (to_user of its Follow rows). Rows are only
+    added or deleted, so the follow counters are kept by the Follow signals.
+    """
+
+    model = Follow
+    fk_name = "from_user"
+    verbose_name = _("follower")
+    verbose_name_plural = _("followers")
+    extra = 0
+    raw_id_fields = ("to_user", )
+    readonly_fields = ("created_at", )
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(User)
 class UserAdmin(DjangoUserAdmin):
     """Define admin model for custom User model with no email field."""
 
+    inlines = (FollowerInline, )
+
     fieldsets = (
         (None, {"fields": ("email", "password")}),
         (_("Personal info"), {"fields": (
@@ -17,7 +37,6 @@ class UserAdmin(DjangoUserAdmin):
             "bio",
             "location",
             "profile_picture",
-            "followers",
         )}),
         (
             _("Permissions"),
@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from social_media_api import metrics, settings
+
+
+class LocalUserCache:
+    """Bounded in-process LRU of users, entries expire after ttl seconds"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user) -> None:
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.ttl, user)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, user_id) -> None:
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+local_users = LocalUserCache(
+    settings.JWT_USER_CACHE_LOCAL_SIZE, settings.JWT_USER_CACHE_LOCAL_TTL
+)
+
+# the only fields of cached users, the others are loaded on access
+AUTH_USER_FIELDS = ("id", "email", "is_active", "is_staff", "is_superuser")
+
+
+def user_version_key(user_id) -> str:
+    return f"jwt-user-version:{user_id}"
+
+
+def user_cache_key(user_id, version) -> str:
+    return f"jwt-user:{user_id}:{version}"
+
+
+def user_version(user_id) -> int:
+    key = user_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # a new counter never reuses versions of an evicted one
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def forget_user(user_id) -> None:
+    """Drop cached user in every process: the next request reads the database"""
+    local_users.delete(user_id)
+    key = user_version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication resolving the user from the in-process LRU,
+    then the shared cache, then the database. Entries are keyed by the
+    shared version of the user, bumped on user save / delete and logout
+    (user.signals), and hold AUTH_USER_FIELDS only, no password hash.
+    """
+
+    def authenticate(self, request):
+        # once per request: the profiling middleware may ask before DRF does
+        http_request = getattr(request, "_request", request)
+        try:
+            outcome = http_request.jwt_authentication
+        except AttributeError:
+            try:
+                outcome = super().authenticate(request)
+            except APIException as error:
+                outcome = error
+            http_request.jwt_authentication = outcome
+        if isinstance(outcome, APIException):
+            raise outcome
+        return outcome
+
+    def get_cached_entry(self, user_id) -> dict:
+        version = user_version(user_id)
+        local = local_users.get(user_id)
+        if local is not None and local[0] == version:
+            metrics.record_cache_lookup("jwt_users", "local")
+            return local[1]
+
+        key = user_cache_key(user_id, version)
+        entry = cache.get(key)
+        result = "hit"
+        if entry is None:
+            *values, password = (
+                self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+                .values_list(*AUTH_USER_FIELDS, "password")
+                .get()
+            )
+            entry = {
+                "fields": dict(zip(AUTH_USER_FIELDS, values)),
+                "revoke": (
+                    get_md5_hash_password(password)
+                    if api_settings.CHECK_REVOKE_TOKEN
+                    else None
+                ),
+            }
+            cache.set(key, entry, settings.JWT_USER_CACHE_TTL)
+            result = "miss"
+        local_users.set(user_id, (version, entry))
+        metrics.record_cache_lookup("jwt_users", result)
+        return entry
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            entry = self.get_cached_entry(user_id)
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        # every request gets its own instance, other fields are deferred
+        fields = entry["fields"]
+        names = [
+            field.attname
+            for field in self.user_model._meta.concrete_fields
+            if field.attname in fields
+        ]
+        user = self.user_model.from_db(
+            router.db_for_read(self.user_model),
+            names,
+            [fields[name] for name in names],
+        )
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != entry["revoke"]:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."),
+                    code="password_changed",
+                )
+
+        return user
@@ -0,0 +1,161 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from social_media_api import settings
+
+FILTER_KEY = "jwt-blacklist:filter"
+
+
+def recent_key(jti: str) -> str:
+    return f"jwt-blacklist:jti:{jti}"
+
+
+class BloomFilter:
+    """Set of strings with false positives only: `not in` is exact"""
+
+    MIN_SIZE = 1024
+
+    def __init__(self, size: int, hashes: int, bits: bytes = None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(bits if bits is not None else (size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float) -> "BloomFilter":
+        capacity = max(capacity, 1)
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        # power of two: odd steps of positions() visit distinct bits;
+        # positions of tiny filters are correlated: MIN_SIZE bits at least
+        size = 1 << (max(size, cls.MIN_SIZE) - 1).bit_length()
+        hashes = max(1, round(-math.log2(error_rate)))
+        return cls(size, hashes)
+
+    def positions(self, item: str):
+        # double hashing: k positions from two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(item)
+        )
+
+
+class SharedBlacklistFilter:
+    """
+    Process copy of the filter published in the shared cache,
+    re-read every JWT_BLACKLIST_FILTER_LOCAL_TTL seconds
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.built_at = 0.0
+        self.loaded_at = -math.inf
+
+    def current(self):
+        """Filter built less than JWT_BLACKLIST_FILTER_MAX_AGE ago or None"""
+        now = time.time()
+        if now - self.loaded_at > settings.JWT_BLACKLIST_FILTER_LOCAL_TTL:
+            data = cache.get(FILTER_KEY)
+            with self.lock:
+                self.loaded_at = now
+                if data and data["built_at"] != self.built_at:
+                    self.set(data)
+        if now - self.built_at > settings.JWT_BLACKLIST_FILTER_MAX_AGE:
+            return None
+        return self.bloom
+
+    def set(self, data: dict) -> None:
+        self.bloom = BloomFilter(data["size"], data["hashes"], data["bits"])
+        self.built_at = data["built_at"]
+
+
+blacklist_filter = SharedBlacklistFilter()
+
+
+def remember_blacklisted(jti: str, expires_at=None) -> None:
+    """
+    Blacklisted after the current filter was built: kept until the token
+    expires (REFRESH_TOKEN_LIFETIME at most), a filter built from a read
+    that missed the row may be trusted long after the blacklisting
+    """
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    if expires_at is not None:
+        lifetime = min(lifetime, (expires_at - timezone.now()).total_seconds())
+    cache.set(recent_key(jti), True, max(math.ceil(lifetime), 1))
+
+
+def may_be_blacklisted(jti: str) -> bool:
+    """False only when the token is surely not blacklisted: no SQL needed"""
+    bloom = blacklist_filter.current()
+    if bloom is None or jti in bloom:
+        return True
+    return cache.get(recent_key(jti)) is not None
+
+
+def rebuild_blacklist_filter(chunk_size: int = 10000) -> int:
+    """Publish filter of blacklisted unexpired tokens to the shared cache"""
+    # taken before reading: tokens blacklisted meanwhile have recent keys
+    built_at = time.time()
+    jtis = BlacklistedToken.objects.filter(
+        token__expires_at__gt=timezone.now()
+    ).values_list("token__jti", flat=True)
+
+    bloom = BloomFilter.for_capacity(
+        jtis.count(), settings.JWT_BLACKLIST_FILTER_ERROR_RATE
+    )
+    count = 0
+    for jti in jtis.iterator(chunk_size=chunk_size):
+        bloom.add(jti)
+        count += 1
+
+    data = {
+        "built_at": built_at,
+        "size": bloom.size,
+        "hashes": bloom.hashes,
+        "bits": bytes(bloom.bits),
+    }
+    cache.set(FILTER_KEY, data, settings.JWT_BLACKLIST_FILTER_MAX_AGE)
+    with blacklist_filter.lock:
+        blacklist_filter.set(data)
+    return count
+
+
+def prune_expired_tokens(batch_size: int = 1000) -> int:
+    """
+    Delete expired outstanding tokens and their blacklist rows batch by batch.
+    Ids grow with expiry, so the oldest (expired) rows come first in id order.
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:39
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_follows(apps, schema_editor):
+    User = apps.get_model("user", "User")
+    follows = User.followers.through.objects
+
+    def count(field):
+        return Coalesce(
+            models.Subquery(
+                follows.filter(**{field: models.OuterRef("pk")})
+                .values(field)
+                .annotate(count=models.Count("*"))
+                .values("count")
+            ),
+            0,
+        )
+
+    User.objects.update(
+        followers_count=count("from_user"),
+        followed_by_count=count("to_user"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="followed_by_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="followers_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_follows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:40
+
+import unicodedata
+
+from django.db import migrations, models
+
+TRIGRAM_INDEX = "user_user_search_name_trgm"
+
+
+def build_search_name(first_name: str, last_name: str, email: str) -> str:
+    """
+    Frozen copy of user.search.build_search_name of this migration:
+    later changes of the app code must not change what it writes
+    """
+    text = f"{first_name} {last_name} {email.split('@')[0]}"
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())
+
+
+def fill_search_name(apps, schema_editor):
+    User = apps.get_model("user", "User")
+    users = User.objects.only("first_name", "last_name", "email").order_by("id")
+    batch = []
+    for user in users.iterator(chunk_size=2000):
+        user.search_name = build_search_name(
+            user.first_name, user.last_name, user.email
+        )
+        batch.append(user)
+        if len(batch) == 2000:
+            User.objects.bulk_update(batch, ["search_name"])
+            batch = []
+    User.objects.bulk_update(batch, ["search_name"])
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} "
+        "ON user_user USING gin (search_name gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {TRIGRAM_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0002_user_follow_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="search_name",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=512
+            ),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        # trigram index for substring search, PostgreSQL only
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
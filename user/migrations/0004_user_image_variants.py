@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0003_user_search_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0004_user_image_variants"),
+    ]
+
+    operations = [
+        # the table of the auto-created through model is kept as is:
+        # only the state gets an explicit model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="Follow",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "from_user",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="follower_links",
+                                to=settings.AUTH_USER_MODEL,
+                            ),
+                        ),
+                        (
+                            "to_user",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="followed_by_links",
+                                to=settings.AUTH_USER_MODEL,
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "user_user_followers",
+                        "unique_together": {("from_user", "to_user")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="user",
+                    name="followers",
+                    field=models.ManyToManyField(
+                        blank=True,
+                        related_name="followed_by",
+                        through="user.Follow",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="follow",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["from_user", "-created_at"], name="follow_from_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["to_user", "-created_at"], name="follow_to_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.4 on 2026-10-18 04:20
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def build_search_name(first_name: str, last_name: str, email: str) -> str:
+    """
+    Frozen copy of user.search.build_search_name of this migration:
+    later changes of the app code must not change what it writes
+    """
+    text = f"{first_name} {last_name} {email}"
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())[:600]
+
+
+def fill_search_name(apps, schema_editor):
+    # the whole email is searched, the domain too
+    User = apps.get_model("user", "User")
+    users = User.objects.only("first_name", "last_name", "email").order_by("id")
+    batch = []
+    for user in users.iterator(chunk_size=2000):
+        user.search_name = build_search_name(
+            user.first_name, user.last_name, user.email
+        )
+        batch.append(user)
+        if len(batch) == 2000:
+            User.objects.bulk_update(batch, ["search_name"])
+            batch = []
+    User.objects.bulk_update(batch, ["search_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0006_user_updated_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="search_name",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=600
+            ),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+    ]
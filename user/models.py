@@ -2,12 +2,14 @@ import pathlib
 import uuid
 
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils.text import slugify
 from django.utils.translation import gettext as _
 
 from django.contrib.auth.models import AbstractUser
 
 from user.managers import UserManager
+from user.search import SEARCH_NAME_MAX_LENGTH, build_search_name
 
 
 def set_filename(new_filename, filename: str) -> pathlib.Path:
@@ -33,12 +35,32 @@ class User(AbstractUser):
         blank=True,
         upload_to=profile_picture_path
     )
+    # {variant: storage name} of resized renditions of profile_picture
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False
+    )
     followers = models.ManyToManyField(
         "self",
+        through="Follow",
+        through_fields=("from_user", "to_user"),
         symmetrical=False,
         related_name="followed_by",
         blank=True
     )
+    # normalized names & email for profile search
+    search_name = models.CharField(
+        max_length=SEARCH_NAME_MAX_LENGTH,
+        blank=True,
+        editable=False,
+        db_index=True
+    )
+    # denormalized counters, kept in sync by social_media.signals
+    followers_count = models.IntegerField(default=0, editable=False)
+    followed_by_count = models.IntegerField(default=0, editable=False)
+    # bumped on counter updates too: watermark of conditional GETs
+    updated_at = models.DateTimeField(auto_now=True)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
@@ -51,3 +73,65 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.email
+
+    def save(self, *args, **kwargs):
+        self.search_name = build_search_name(
+            self.first_name, self.last_name, self.email
+        )
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {
+            "first_name", "last_name", "email"
+        } & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "search_name"}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def follow_counters_drift(cls):
+        """Users annotated with real counts where stored counters differ"""
+        follows = cls.followers.through.objects
+
+        def count(field):
+            return Coalesce(models.Subquery(
+                follows.filter(**{field: models.OuterRef("pk")})
+                .values(field)
+                .annotate(count=models.Count("*"))
+                .values("count")
+            ), 0)
+
+        return cls.objects.annotate(
+            real_followers_count=count("from_user"),
+            real_followed_by_count=count("to_user"),
+        ).exclude(
+            followers_count=models.F("real_followers_count"),
+            followed_by_count=models.F("real_followed_by_count"),
+        )
+
+
+class Follow(models.Model):
+    """Row of User.followers: `to_user` follows `from_user` since created_at"""
+
+    from_user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="follower_links"
+    )
+    to_user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="followed_by_links"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # table & unique index of the former auto-created through model
+        db_table = "user_user_followers"
+        unique_together = ("from_user", "to_user")
+        indexes = [
+            models.Index(
+                fields=["from_user", "-created_at"],
+                name="follow_from_created_idx"
+            ),
+            models.Index(
+                fields=["to_user", "-created_at"],
+                name="follow_to_created_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"follow {self.to_user_id} -> {self.from_user_id}"
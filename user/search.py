@@ -0,0 +1,50 @@
+import unicodedata
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+
+def normalize_search_text(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())
+
+
+# first_name + last_name + email of AbstractUser / EmailField, spaces
+SEARCH_NAME_MAX_LENGTH = 600
+
+
+def build_search_name(first_name: str, last_name: str, email: str) -> str:
+    """Words searched by profile name filter: names + email"""
+    text = normalize_search_text(f"{first_name} {last_name} {email}")
+    # accents stripped by NFKD may expand a character
+    return text[:SEARCH_NAME_MAX_LENGTH]
+
+
+def search_users(queryset, query: str):
+    """
+    Filter users by prefix / substring of their names or email,
+    best matches first: whole text prefix, word prefix, then substring.
+    On PostgreSQL the substring lookup is served by a trigram GIN index.
+    """
+    term = normalize_search_text(query)
+    if not term:
+        return queryset
+    queryset = queryset.filter(search_name__contains=term).annotate(
+        search_rank=Case(
+            When(search_name__startswith=term, then=Value(0)),
+            When(search_name__contains=" " + term, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )
+    )
+    ordering = ["search_rank"]
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = queryset.annotate(
+            search_similarity=TrigramWordSimilarity(term, "search_name")
+        )
+        ordering.append("-search_similarity")
+    return queryset.order_by(*ordering, "id")
@@ -1,5 +1,13 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import UntypedToken
+
+from user.authentication import forget_user
+from user.blacklist import may_be_blacklisted
+from user.tokens import FilteredRefreshToken
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -22,3 +30,33 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
 
         return user
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
+class TokenVerifySerializer(jwt_serializers.TokenVerifySerializer):
+    def validate(self, attrs):
+        token = UntypedToken(attrs["token"])
+        jti = token.get(api_settings.JTI_CLAIM)
+        if (
+            may_be_blacklisted(jti)
+            and BlacklistedToken.objects.filter(token__jti=jti).exists()
+        ):
+            raise serializers.ValidationError("Token is blacklisted")
+        return {}
+
+
+class LogoutSerializer(jwt_serializers.TokenBlacklistSerializer):
+    token_class = FilteredRefreshToken
+
+    def validate(self, attrs):
+        """Blacklist refresh token and drop its user from the auth cache"""
+        refresh = self.token_class(attrs["refresh"])
+        try:
+            refresh.blacklist()
+        except AttributeError:
+            pass
+        forget_user(refresh.get(api_settings.USER_ID_CLAIM))
+        return {}
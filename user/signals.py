@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from user.authentication import forget_user
+from user.blacklist import remember_blacklisted
+from user.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """Saved (password, is_active ...) or deleted user leaves the auth cache"""
+    transaction.on_commit(lambda: forget_user(instance.pk))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def blacklisted(sender, instance, created, **kwargs):
+    """Visible to the blacklist filter lookups before its next rebuild"""
+    if created:
+        remember_blacklisted(instance.token.jti, instance.token.expires_at)
@@ -0,0 +1,15 @@
+from celery import shared_task
+
+from user import blacklist
+from social_media_api import settings
+
+
+@shared_task
+def rebuild_blacklist_filter():
+    return f"Blacklist filter rebuilt: {blacklist.rebuild_blacklist_filter()} tokens"
+
+
+@shared_task
+def prune_expired_tokens():
+    deleted = blacklist.prune_expired_tokens(settings.TOKEN_PRUNE_BATCH_SIZE)
+    return f"Expired tokens deleted: {deleted}"
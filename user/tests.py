@@ -1,3 +1,200 @@
+import importlib
+import math
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from social_media_api import settings
+from user import blacklist
+from user.authentication import (
+    local_users,
+    user_cache_key,
+    user_version,
+    user_version_key,
+)
+from user.search import build_search_name, search_users
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        # primary keys are reused by tests, not by the database
+        cache.clear()
+        local_users.clear()
+        self.user = get_user_model().objects.create_user("user@test.com", "pass12345")
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}"
+        )
+
+    def test_cached_entry_without_password(self):
+        self.assertEqual(self.client.get("/api/user/me/").status_code, 200)
+
+        entry = cache.get(user_cache_key(self.user.pk, user_version(self.user.pk)))
+        self.assertEqual(entry["fields"]["email"], "user@test.com")
+        self.assertNotIn("password", entry["fields"])
+        self.assertNotIn(self.user.password, repr(entry))
+
+    def test_cached_user_without_queries(self):
+        self.client.get("/api/user/me/")
+        # the row of the profile only
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/user/me/")
+        self.assertEqual(response.data["email"], "user@test.com")
+
+    def test_version_bumped_by_other_process(self):
+        self.assertEqual(self.client.get("/api/user/me/").status_code, 200)
+        # saved without signals, then forgotten in another process:
+        # the local LRU of this one still holds the user
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.incr(user_version_key(self.user.pk))
+
+        self.assertEqual(self.client.get("/api/user/me/").status_code, 401)
+
+    def test_user_save_drops_cached_user(self):
+        self.assertEqual(self.client.get("/api/user/me/").status_code, 200)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.assertEqual(self.client.get("/api/user/me/").status_code, 401)
+
+
+class BlacklistTests(TestCase):
+    """Rotated and logged out refresh tokens are refused, filter or not"""
+
+    def setUp(self):
+        cache.clear()
+        blacklist.blacklist_filter.bloom = None
+        blacklist.blacklist_filter.built_at = 0.0
+        blacklist.blacklist_filter.loaded_at = -math.inf
+        get_user_model().objects.create_user("user@test.com", "pass12345")
+        self.client = APIClient()
+        response = self.client.post(
+            "/api/user/token/", {"email": "user@test.com", "password": "pass12345"}
+        )
+        self.refresh = response.data["refresh"]
+
+    def refresh_token(self, refresh: str):
+        return self.client.post("/api/user/token/refresh/", {"refresh": refresh})
+
+    def test_rotated_token_refused(self):
+        response = self.refresh_token(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 401)
+        self.assertEqual(self.refresh_token(response.data["refresh"]).status_code, 200)
+
+    def test_logged_out_token_refused(self):
+        response = self.client.post("/api/user/logout/", {"refresh": self.refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 401)
+
+    def test_blacklisted_token_in_rebuilt_filter(self):
+        self.client.post("/api/user/logout/", {"refresh": self.refresh})
+        fresh = RefreshToken.for_user(get_user_model().objects.get())
+        self.assertEqual(blacklist.rebuild_blacklist_filter(), 1)
+        cache.clear()
+
+        self.assertFalse(blacklist.may_be_blacklisted(fresh["jti"]))
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 401)
+
+    def test_filter_error_rate(self):
+        for capacity in (1, 3, 100):
+            bloom = blacklist.BloomFilter.for_capacity(capacity, 0.001)
+            for index in range(capacity):
+                bloom.add(f"blacklisted-{index}")
+            false_positives = sum(f"fresh-{index}" in bloom for index in range(10000))
+            self.assertLess(false_positives, 30)
+
+    def test_blacklisted_token_kept_while_valid(self):
+        jti = RefreshToken(self.refresh)["jti"]
+        self.client.post("/api/user/logout/", {"refresh": self.refresh})
+        # built from a read that missed the blacklisting, trusted much later
+        later = time.time() + 10 * settings.JWT_BLACKLIST_FILTER_MAX_AGE
+        bloom = blacklist.BloomFilter.for_capacity(1, 0.001)
+        blacklist.blacklist_filter.set(
+            {
+                "built_at": later,
+                "size": bloom.size,
+                "hashes": bloom.hashes,
+                "bits": bytes(bloom.bits),
+            }
+        )
+        blacklist.blacklist_filter.loaded_at = math.inf
+
+        with mock.patch("time.time", return_value=later):
+            self.assertTrue(blacklist.may_be_blacklisted(jti))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        users = get_user_model().objects
+        self.anna = users.create_user(
+            "a.smith@test.com", "pass12345", first_name="Ánna", last_name="Smith"
+        )
+        self.joanna = users.create_user(
+            "jo@test.com", "pass12345", first_name="Joanna", last_name="Brown"
+        )
+        self.bob = users.create_user(
+            "bob@test.com", "pass12345", first_name="Bob", last_name="Annaly"
+        )
+        users.create_user("eve@test.com", "pass12345", first_name="Eve")
+
+    def test_search_name(self):
+        self.assertEqual(
+            build_search_name("  Émile ", "Zola\tJr", "E.Zola@mail.com"),
+            "emile zola jr e.zola@mail.com",
+        )
+        self.assertEqual(self.anna.search_name, "anna smith a.smith@test.com")
+        self.assertEqual(len(build_search_name("\ufdfa" * 150, "", "x@y.z")), 600)
+
+    def test_migration_writes_the_same_search_name(self):
+        migration = importlib.import_module("user.migrations.0007_user_search_email")
+        for names in (
+            ("Émile", "Zola", "E.Zola@mail.com"),
+            ("", "", "x@y.z"),
+            ("\ufdfa" * 150, "", "x@y.z"),
+        ):
+            self.assertEqual(
+                migration.build_search_name(*names), build_search_name(*names)
+            )
+
+    def test_rename_with_update_fields(self):
+        self.bob.last_name = "Brownie"
+        self.bob.save(update_fields=["last_name"])
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.search_name, "bob brownie bob@test.com")
+
+    def test_best_matches_first(self):
+        found = search_users(get_user_model().objects.all(), " ANNA ")
+        self.assertEqual(list(found), [self.anna, self.bob, self.joanna])
+        self.assertEqual(
+            list(search_users(get_user_model().objects.all(), "brown")),
+            [self.joanna],
+        )
+
+    def test_profiles_name_filter(self):
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        response = client.get("/api/profiles/?name=anna")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [profile["id"] for profile in response.data],
+            [self.anna.id, self.bob.id, self.joanna.id],
+        )
+
+    def test_email_domain(self):
+        users = get_user_model().objects
+        other = users.create_user("zed@example.org", "pass12345", first_name="Zed")
+        self.assertEqual(list(search_users(users.all(), "EXAMPLE.org")), [other])
+        self.assertEqual(list(search_users(users.all(), "zed@ex")), [other])
+        self.assertEqual(len(search_users(users.all(), "@test.com")), 4)
 
-# Create your tests here.
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        response = client.get("/api/profiles/?name=example.org")
+        self.assertEqual([profile["id"] for profile in response.data], [other.id])
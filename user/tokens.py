@@ -0,0 +1,12 @@
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from user.blacklist import may_be_blacklisted
+
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken asking the blacklist filter before the blacklist table"""
+
+    def check_blacklist(self) -> None:
+        if may_be_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
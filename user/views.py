@@ -1,8 +1,10 @@
+from django.contrib.auth import get_user_model
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.views import TokenBlacklistView
 
-from user.serializers import UserSerializer
+from user.authentication import CachedJWTAuthentication
+from user.serializers import UserSerializer, LogoutSerializer
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -13,8 +15,14 @@ class CreateUserView(generics.CreateAPIView):
 class ManageUserView(generics.RetrieveUpdateAPIView):
     '''Manage the authenticated user'''
     serializer_class = UserSerializer
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        # request.user may come from the auth cache: update a fresh row
+        return get_user_model().objects.get(pk=self.request.user.pk)
+
+
+class LogoutView(TokenBlacklistView):
+    '''Blacklist refresh token'''
+    serializer_class = LogoutSerializer